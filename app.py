@@ -1,62 +1,342 @@
 # app.py
 
 import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
+from types import SimpleNamespace
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from rag_pipeline.query_pipeline import (
     load_chunks,
     load_embedding_model,
     load_faiss_index,
-    load_llm,
+    load_async_llm,
+    load_streaming_llm,
     load_tokenizer,
-    query_rag_pipeline
+    load_answer_cache,
+    load_query_batcher,
+    load_lexical_index,
+    load_reranker,
+    load_session_store,
+    build_retrieval_options,
+    prepare_query,
+    aquery_rag_pipeline,
+    astream_rag_pipeline,
+    shutdown_retrieval_executor
 )
+from rag_pipeline.source_filter import parse_filter
+from rag_pipeline.batch_runner import BATCH_CONCURRENCY, BATCH_RATE, arun_batch, normalise_records
+from rag_pipeline.telemetry import REQUESTS, configure_logging, logger, render_metrics, span
+from call_llm import aclose_async_client
 
-# --- App Setup ---
-app = FastAPI()
 ROOT_DIR = Path(__file__).resolve().parent
-app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# --- Load RAG Components ---
-print("🔧 Initialising RAG pipeline...")
+# --- RAG Components (filled in by the background loader) ---
+rag = SimpleNamespace(query_batcher=None, answer_cache=None, session_store=None)
+startup = {"status": "loading", "seconds": {}, "error": None}
+
+
+def warm_up():
+    # One dummy encode + search + prompt assembly, so the first real request
+    # doesn't pay for lazy initialisation and cold kernels
+    prepare_query("warm up", rag.embedding_model, rag.faiss_index, rag.chunks, rag.tokenizer,
+                  retrieval_options=rag.retrieval_options)
+
+
+async def load_components():
+    """
+    Load the independent components concurrently on worker threads (disk reads
+    and model loads overlap), then build what depends on them and warm up.
+    """
+    loop = asyncio.get_running_loop()
+    t_start = time.perf_counter()
+
+    async def load(name, fn):
+        t0 = time.perf_counter()
+        setattr(rag, name, await loop.run_in_executor(None, fn))
+        startup["seconds"][name] = round(time.perf_counter() - t0, 2)
+
+    try:
+        await asyncio.gather(
+            load("chunks", load_chunks),
+            load("embedding_model", load_embedding_model),
+            load("faiss_index", load_faiss_index),
+            load("tokenizer", load_tokenizer),
+            load("answer_cache", load_answer_cache),
+            load("lexical_index", load_lexical_index),
+            load("reranker", load_reranker),
+        )
+        rag.llm_pipeline = load_async_llm(mode="cloud")
+        rag.llm_stream = load_streaming_llm(mode="cloud")
+        rag.query_batcher = load_query_batcher(rag.embedding_model, rag.faiss_index)
+        rag.session_store = load_session_store()
+        rag.retrieval_options = build_retrieval_options(rag.chunks, rag.lexical_index, rag.reranker)
+        rag.metadata = rag.retrieval_options["metadata"]
+        await load("warm_up", warm_up)
+    except Exception as e:
+        startup["status"], startup["error"] = "failed", repr(e)
+        logger.exception("startup failed")
+        return
+
+    startup["status"] = "ready"
+    startup["seconds"]["total"] = round(time.perf_counter() - t_start, 2)
+    print(f"✅ Loaded {len(rag.chunks)} chunks.")
+    print(f"✅ Components ready in {startup['seconds']['total']} s: {startup['seconds']}")
+
+
+async def release_resources():
+    if rag.query_batcher is not None:
+        await rag.query_batcher.close()
+    await aclose_async_client()
+    shutdown_retrieval_executor()
+    if rag.answer_cache is not None:
+        rag.answer_cache.save()
+
 
-chunks = load_chunks()
-embedding_model = load_embedding_model()
-faiss_index = load_faiss_index()
-llm_pipeline = load_llm(mode="cloud")  
-tokenizer = load_tokenizer()
+@asynccontextmanager
+async def lifespan(app):
+    # Bind the port straight away; traffic is gated on /readyz instead
+    configure_logging()
+    print("🔧 Initialising RAG pipeline in the background...")
+    loader = asyncio.create_task(load_components())
+    yield
+    loader.cancel()
+    await release_resources()
 
-print(f"✅ Loaded {len(chunks)} chunks.")
-print("✅ Components ready.")
+
+def not_ready():
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={"answer": "⏳ The assistant is still starting up. Please try again in a moment.",
+                 "status": startup["status"]},
+    )
+
+
+# --- App Setup ---
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", StaticFiles(directory="static"), name="static")
+
+# --- Health Probes ---
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is serving; only a failed load warrants a restart
+    if startup["status"] == "failed":
+        return JSONResponse(status_code=500, content={"status": "failed", "error": startup["error"]})
+    return JSONResponse(content={"status": "ok"})
+
+@app.get("/readyz")
+def readyz():
+    # Readiness: every component loaded and warmed up
+    code = 200 if startup["status"] == "ready" else 503
+    return JSONResponse(status_code=code, content=startup)
 
 # --- Serve Frontend ---
 @app.get("/")
 def serve_frontend():
     return FileResponse(ROOT_DIR / "static" / "index.html")
 
+def get_session(body):
+    # Optional: clients that send a session_id get follow-up aware retrieval
+    session_id = body.get("session_id")
+    if rag.session_store is None or not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+        return None
+    return rag.session_store.get(session_id)
+
+def get_retrieval_options(body):
+    """
+    Retrieval options for this request: the defaults, plus a source filter when
+    the body has "filters" ({"source_type": ..., "sources": [...]}).
+    Returns (options, None), or (None, a 400 response) for a bad filter.
+    """
+    try:
+        source_filter = parse_filter(body.get("filters"))
+    except ValueError as e:
+        return None, JSONResponse(status_code=400, content={"answer": f"⚠️ {e}"})
+    if source_filter is None:
+        return rag.retrieval_options, None
+    unknown = rag.metadata.unknown(source_filter)
+    if unknown:
+        return None, JSONResponse(status_code=400, content={
+            "answer": f"⚠️ Unknown filter values: {', '.join(unknown)}",
+            "known": rag.metadata.catalog(),
+        })
+    return {**rag.retrieval_options, "source_filter": source_filter}, None
+
 # --- Query Endpoint ---
 @app.post("/query")
 async def handle_query(request: Request):
+    REQUESTS.inc(endpoint="/query")
+    if startup["status"] != "ready":
+        return not_ready()
     body = await request.json()
     question = body.get("question", "").strip()
 
     if not question:
         return JSONResponse(content={"answer": "⚠️ Please provide a valid question."})
+    retrieval_options, error = get_retrieval_options(body)
+    if error is not None:
+        return error
 
-    answer = query_rag_pipeline(
-        question,
-        embedding_model,
-        faiss_index,
-        chunks,
-        llm_pipeline,
-        tokenizer
-    )
+    with span("total"):
+        answer = await aquery_rag_pipeline(
+            question,
+            rag.embedding_model,
+            rag.faiss_index,
+            rag.chunks,
+            rag.llm_pipeline,
+            rag.tokenizer,
+            answer_cache=rag.answer_cache,
+            batcher=rag.query_batcher,
+            retrieval_options=retrieval_options,
+            session=get_session(body)
+        )
     return JSONResponse(content={"answer": answer})
 
 
+# --- Streaming Query Endpoint (Server-Sent Events) ---
+def sse_event(data, event=None):
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def handle_query_stream(request: Request):
+    REQUESTS.inc(endpoint="/query/stream")
+    if startup["status"] != "ready":
+        return not_ready()
+    body = await request.json()
+    question = body.get("question", "").strip()
+    retrieval_options, error = get_retrieval_options(body)
+    if error is not None:
+        return error
+    session = get_session(body)
+
+    async def events():
+        if not question:
+            yield sse_event({"token": "⚠️ Please provide a valid question."})
+            yield sse_event({}, event="done")
+            return
+        try:
+            async for token in astream_rag_pipeline(
+                question,
+                rag.embedding_model,
+                rag.faiss_index,
+                rag.chunks,
+                rag.llm_stream,
+                rag.tokenizer,
+                answer_cache=rag.answer_cache,
+                batcher=rag.query_batcher,
+                retrieval_options=retrieval_options,
+                session=session
+            ):
+                yield sse_event({"token": token})
+        except Exception as e:
+            logger.warning("stream failed error=%r", e)
+            yield sse_event({"message": "Error getting response."}, event="error")
+            return
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- Batch Query Endpoint (JSON Lines) ---
+def valid_batch_record(item):
+    # A non-empty question string; question_id, when given, a string or integer
+    if not isinstance(item, dict):
+        return False
+    question, question_id = item.get("question"), item.get("question_id")
+    if not isinstance(question, str) or not question.strip():
+        return False
+    return question_id is None or (isinstance(question_id, (str, int)) and not isinstance(question_id, bool))
+
+def get_batch_request(body):
+    """
+    (questions, concurrency, None), or (None, None, a 400 response). Checked
+    before the NDJSON stream starts, since a 200 can't be taken back.
+    """
+    questions = body.get("questions") if isinstance(body, dict) else None
+    if (not isinstance(questions, list) or not questions
+            or not all(isinstance(q, str) or valid_batch_record(q) for q in questions)):
+        return None, None, JSONResponse(status_code=400, content={
+            "answer": "⚠️ questions must be a non-empty list of strings or {question_id, question} objects"})
+    concurrency = body.get("concurrency", BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+        return None, None, JSONResponse(status_code=400, content={"answer": "⚠️ concurrency must be an integer"})
+    # Callers may ask for less concurrency than the server allows, never more
+    return questions, max(1, min(concurrency, BATCH_CONCURRENCY)), None
+
+@app.post("/query/batch")
+async def handle_query_batch(request: Request):
+    REQUESTS.inc(endpoint="/query/batch")
+    if startup["status"] != "ready":
+        return not_ready()
+    body = await request.json()
+    questions, concurrency, error = get_batch_request(body)
+    if error is not None:
+        return error
+
+    async def lines():
+        async for result in arun_batch(
+            normalise_records(questions),
+            rag.embedding_model,
+            rag.faiss_index,
+            rag.chunks,
+            rag.llm_pipeline,
+            rag.tokenizer,
+            answer_cache=rag.answer_cache,
+            retrieval_options=rag.retrieval_options,
+            concurrency=concurrency,
+            rate=BATCH_RATE
+        ):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# --- Metrics (Prometheus text format, per worker process) ---
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# --- Cache Stats ---
+@app.get("/cache/stats")
+def cache_stats():
+    if rag.answer_cache is None:
+        return not_ready()
+    return JSONResponse(content=rag.answer_cache.stats())
+
+
+# --- Sources (what /query filters can name) ---
+@app.get("/sources")
+def list_sources():
+    if startup["status"] != "ready":
+        return not_ready()
+    return JSONResponse(content=rag.metadata.catalog())
+
+
+# --- Sessions ---
+@app.get("/sessions/stats")
+def session_stats():
+    if rag.session_store is None:
+        return JSONResponse(content={"enabled": False})
+    return JSONResponse(content=rag.session_store.stats())
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str):
+    dropped = rag.session_store.drop(session_id) if rag.session_store is not None else False
+    return JSONResponse(content={"dropped": dropped})
+
+
 # --- Start the App ---
 if __name__ == "__main__":
     import uvicorn
@@ -1,27 +1,349 @@
 import os
+import json
+import time
+import random
+import asyncio
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
+import httpx
+from requests.adapters import HTTPAdapter
 
-def llm_pipeline(prompt, max_new_tokens=150):
-    headers = {
-        "Authorization": f"Bearer {os.environ['GROQ_API_KEY']}",
-        "Content-Type": "application/json"
-    }
+from rag_pipeline.telemetry import LLM_EVENTS, logger
+
+# Any OpenAI-compatible chat-completions server (Groq by default; point it at
+# rag_pipeline/tools/mock_llm_server.py for load testing)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+LLM_CHAT_URL = f"{LLM_BASE_URL}/chat/completions"
+LLM_MODEL = os.environ.get("LLM_MODEL", "mistral-7b-instruct")
+
+# --- HTTP client knobs ---
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_KEEPALIVE_CONNECTIONS", "10"))
+
+# --- Resilience knobs ---
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))             # extra attempts on 429/5xx/transport errors
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))       # seconds; full jitter up to base * 2**attempt
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "8"))
+LLM_RETRY_AFTER_MAX = float(os.environ.get("LLM_RETRY_AFTER_MAX", "30"))  # a longer Retry-After gives up (and fails over)
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_DELAY_MS = float(os.environ.get("LLM_HEDGE_DELAY_MS", "0"))     # 0 = adaptive: p95 of recent latencies
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))  # no adaptive hedging until this many
+# Failover once the primary has exhausted its retries: "" (off), "ollama", or
+# "openai" for any OpenAI-compatible stand-in at LLM_FALLBACK_BASE_URL
+LLM_FALLBACK = os.environ.get("LLM_FALLBACK", "").lower()
+LLM_FALLBACK_BASE_URL = os.environ.get("LLM_FALLBACK_BASE_URL", "http://127.0.0.1:9000/v1").rstrip("/")
+LLM_FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", LLM_MODEL)
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "mistral")
+
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
 
-    payload = {
-        "model": "mistral-7b-instruct",
+Endpoint = namedtuple("Endpoint", "url model api_key")
+# The mock server needs no key; Groq answers 401 without one
+PRIMARY = Endpoint(LLM_CHAT_URL, LLM_MODEL, os.environ.get("LLM_API_KEY") or os.environ.get("GROQ_API_KEY"))
+FALLBACK = Endpoint(f"{LLM_FALLBACK_BASE_URL}/chat/completions", LLM_FALLBACK_MODEL,
+                    os.environ.get("LLM_FALLBACK_API_KEY"))
+
+_session = None
+_async_client = None
+_latencies = deque(maxlen=200)   # seconds, recent successful primary calls (hedge delay estimate)
+
+
+def _headers(api_key=None):
+    # Only the endpoint's own key: never forward the primary's key to the fallback
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers
+
+
+def _payload(prompt, max_new_tokens, stream=False, model=LLM_MODEL):
+    return {
+        "model": model,
         "messages": [
             {"role": "system", "content": "You are an expert dissertation assistant."},
             {"role": "user", "content": prompt}
         ],
         "temperature": 0.7,
-        "max_tokens": max_new_tokens
+        "max_tokens": max_new_tokens,
+        "stream": stream
     }
 
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers,
-        json=payload
-    )
 
-    response.raise_for_status()  # Catch API errors
-    return [{"generated_text": response.json()["choices"][0]["message"]["content"]}]
+def _messages(prompt):
+    return [{"role": "user", "content": prompt}]
+
+
+# --- Retry policy ---
+def _retry_after(headers):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt, retry_after=None):
+    # Honour the server's Retry-After (plus a little jitter so callers don't
+    # return in lockstep); otherwise exponential backoff with full jitter
+    if retry_after is not None:
+        return retry_after + random.uniform(0, LLM_BACKOFF_BASE)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _next_delay(attempt, status=None, headers=None):
+    """Delay before the next attempt, or None to stop retrying."""
+    if attempt >= LLM_MAX_RETRIES:
+        return None
+    delay = _backoff(attempt, _retry_after(headers) if headers is not None else None)
+    if delay > LLM_RETRY_AFTER_MAX:
+        return None
+    LLM_EVENTS.inc(event="retry")
+    logger.debug("llm retry attempt=%d status=%s delay_s=%.2f", attempt + 1, status, delay)
+    return delay
+
+
+def hedge_delay():
+    """Seconds to wait before hedging, or None while there is no p95 estimate yet."""
+    if LLM_HEDGE_DELAY_MS > 0:
+        return LLM_HEDGE_DELAY_MS / 1000
+    if len(_latencies) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(_latencies)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+# --- Sync client (pooled session, explicit timeouts) ---
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=LLM_MAX_CONNECTIONS)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _post(endpoint, payload):
+    session = get_session()
+    attempt = 0
+    while True:
+        t0 = time.perf_counter()
+        try:
+            response = session.post(endpoint.url, headers=_headers(endpoint.api_key), json=payload,
+                                    timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = _next_delay(attempt, type(e).__name__)
+            if delay is None:
+                raise
+        else:
+            delay = None
+            if response.status_code in RETRY_STATUSES:
+                delay = _next_delay(attempt, response.status_code, response.headers)
+            if delay is None:
+                response.raise_for_status()  # Catch API errors
+                if endpoint is PRIMARY:
+                    _latencies.append(time.perf_counter() - t0)
+                return response.json()
+        time.sleep(delay)
+        attempt += 1
+
+
+def _complete_fallback(prompt, max_new_tokens):
+    if LLM_FALLBACK == "ollama":
+        import ollama
+        response = ollama.chat(model=OLLAMA_MODEL, messages=_messages(prompt))
+        return response["message"]["content"]
+    body = _post(FALLBACK, _payload(prompt, max_new_tokens, model=FALLBACK.model))
+    return body["choices"][0]["message"]["content"]
+
+
+def llm_pipeline(prompt, max_new_tokens=150):
+    try:
+        body = _post(PRIMARY, _payload(prompt, max_new_tokens))
+        text = body["choices"][0]["message"]["content"]
+    except requests.RequestException as e:
+        if not LLM_FALLBACK:
+            raise
+        LLM_EVENTS.inc(event="failover")
+        logger.warning("llm failover backend=%s error=%r", LLM_FALLBACK, e)
+        text = _complete_fallback(prompt, max_new_tokens)
+    return [{"generated_text": text}]
+
+
+# --- Async client (shared connection pool, keep-alive, explicit timeouts) ---
+def get_async_client():
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _async_client
+
+
+async def aclose_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def _asend(endpoint, payload, stream=False):
+    """
+    POST with retries; returns the httpx response (still open when `stream`,
+    so the caller must close it). Only the request/headers are retried; a
+    stream that fails part-way through is not.
+    """
+    client = get_async_client()
+    attempt = 0
+    while True:
+        t0 = time.perf_counter()
+        request = client.build_request("POST", endpoint.url, headers=_headers(endpoint.api_key), json=payload)
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            delay = _next_delay(attempt, type(e).__name__)
+            if delay is None:
+                raise
+        else:
+            delay = None
+            if response.status_code in RETRY_STATUSES:
+                delay = _next_delay(attempt, response.status_code, response.headers)
+            if delay is None:
+                if response.is_error:
+                    await response.aclose()
+                    response.raise_for_status()  # Catch API errors
+                if endpoint is PRIMARY and not stream:
+                    _latencies.append(time.perf_counter() - t0)
+                return response
+            await response.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _hedged(make_call):
+    """
+    Run make_call(); if it hasn't returned after hedge_delay(), start a second
+    identical call and take whichever succeeds first, cancelling the other.
+    Waiting for the p95 keeps the extra load to roughly 5% of requests.
+    """
+    delay = hedge_delay() if LLM_HEDGE else None
+    if delay is None:
+        return await make_call()
+
+    tasks = {asyncio.ensure_future(make_call())}
+    primary = next(iter(tasks))
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            LLM_EVENTS.inc(event="hedge")
+            tasks.add(asyncio.ensure_future(make_call()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        LLM_EVENTS.inc(event="hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let the losers finish cancelling, so no exception or response is left unretrieved
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _acomplete_primary(prompt, max_new_tokens):
+    response = await _asend(PRIMARY, _payload(prompt, max_new_tokens))
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def _acomplete_fallback(prompt, max_new_tokens):
+    if LLM_FALLBACK == "ollama":
+        import ollama
+        response = await ollama.AsyncClient().chat(model=OLLAMA_MODEL, messages=_messages(prompt))
+        return response["message"]["content"]
+    response = await _asend(FALLBACK, _payload(prompt, max_new_tokens, model=FALLBACK.model))
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def allm_pipeline(prompt, max_new_tokens=150):
+    try:
+        text = await _hedged(lambda: _acomplete_primary(prompt, max_new_tokens))
+    except httpx.HTTPError as e:
+        if not LLM_FALLBACK:
+            raise
+        LLM_EVENTS.inc(event="failover")
+        logger.warning("llm failover backend=%s error=%r", LLM_FALLBACK, e)
+        text = await _acomplete_fallback(prompt, max_new_tokens)
+    return [{"generated_text": text}]
+
+
+async def _iter_sse(response):
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        delta = json.loads(data)["choices"][0].get("delta", {})
+        if delta.get("content"):
+            yield delta["content"]
+
+
+async def _astream_fallback(prompt, max_new_tokens):
+    if LLM_FALLBACK == "ollama":
+        import ollama
+        parts = await ollama.AsyncClient().chat(model=OLLAMA_MODEL, messages=_messages(prompt), stream=True)
+        async for part in parts:
+            if part["message"]["content"]:
+                yield part["message"]["content"]
+        return
+    response = await _asend(FALLBACK, _payload(prompt, max_new_tokens, stream=True, model=FALLBACK.model),
+                            stream=True)
+    try:
+        async for delta in _iter_sse(response):
+            yield delta
+    finally:
+        await response.aclose()
+
+
+async def astream_llm_pipeline(prompt, max_new_tokens=150):
+    """
+    Yield completion text deltas as they arrive from the OpenAI-compatible
+    chat endpoint (Server-Sent Events, terminated by `data: [DONE]`).
+    Retries and failover happen before the first token only; restarting a
+    half-sent answer would duplicate text on the client.
+    """
+    try:
+        response = await _asend(PRIMARY, _payload(prompt, max_new_tokens, stream=True), stream=True)
+    except httpx.HTTPError as e:
+        if not LLM_FALLBACK:
+            raise
+        LLM_EVENTS.inc(event="failover")
+        logger.warning("llm failover backend=%s error=%r", LLM_FALLBACK, e)
+        async for delta in _astream_fallback(prompt, max_new_tokens):
+            yield delta
+        return
+    try:
+        async for delta in _iter_sse(response):
+            yield delta
+    finally:
+        await response.aclose()
@@ -8,12 +8,16 @@ RAG_DIR = ROOT / "rag_pipeline"
 FINE_DIR = ROOT / "fine_tune"
 OUT_DIR = ROOT / "outputs"
 
-CHUNKS_PKL = RAG_DIR / "chunks.pkl"             # primary
+DATA_DIR = ROOT / "data"
+
+CHUNK_STORE = DATA_DIR / "chunk_store"          # primary (memory-mapped, see rag_pipeline/chunk_store.py)
+CHUNKS_PKL = DATA_DIR / "chunks.pkl"            # legacy
 CHUNKS_JSON = FINE_DIR / "chunks.json"          # fallback (optional)
 AUTHORING_CSV = FINE_DIR / "authoring.csv"
 OUT_CSV = OUT_DIR / "authoring_mapped.csv"
 
 OUT_DIR.mkdir(exist_ok=True)
+sys.path.append(str(ROOT))
 
 # --- Retrieval knobs ---
 EMBED_MODEL = "multi-qa-MiniLM-L6-cos-v1"       # set to SAME model as your RAG retriever
@@ -37,8 +41,12 @@ def preview(txt: str, n: int = 160) -> str:
 
 
 def load_chunks():
-    # Prefer PKL, fallback to JSON
-    if CHUNKS_PKL.exists():
+    # Prefer the chunk store, then PKL, fallback to JSON
+    if (CHUNK_STORE / "meta.json").exists():
+        from rag_pipeline.chunk_store import ChunkStore
+        raw = ChunkStore(CHUNK_STORE)
+        hint = str(CHUNK_STORE)
+    elif CHUNKS_PKL.exists():
         raw = pickle.load(open(CHUNKS_PKL, "rb"))
         hint = str(CHUNKS_PKL)
     elif CHUNKS_JSON.exists():
@@ -48,7 +56,7 @@ def load_chunks():
         sys.exit(f"No chunks at {CHUNKS_PKL} or {CHUNKS_JSON}.")
 
     normed = []
-    if isinstance(raw, dict):
+    if hasattr(raw, "items"):
         it = raw.items()
     else:
         it = enumerate(raw)
@@ -68,10 +76,95 @@ def load_chunks():
     return normed
 
 
+# ---------- Embedding (model loaded once) ----------
+_model = None
+
+def load_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(EMBED_MODEL)
+    return _model
+
+
 def embed_texts(texts):
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(EMBED_MODEL)
-    return model.encode(texts, normalize_embeddings=True, batch_size=64, show_progress_bar=False)
+    # Content-addressed on-disk cache: unchanged chunks/questions skip the model entirely
+    from rag_pipeline.embedding_cache import cached_encode
+    encode = lambda missing: load_model().encode(missing, normalize_embeddings=True, batch_size=64,
+                                                 show_progress_bar=False)
+    return cached_encode(texts, encode, EMBED_MODEL, normalize=True)
+
+
+# ---------- Exact answer anchors ----------
+def find_anchors(patterns, texts_norm):
+    """
+    For each pattern, the sorted indices of the normalised chunks containing it.
+    One Aho-Corasick pass over the corpus when pyahocorasick is installed;
+    otherwise a word index narrows each pattern to a few candidate chunks, and
+    single/two-word patterns fall back to str.find over one joined blob.
+    """
+    hits = {p: set() for p in patterns}
+    if not patterns:
+        return {}
+
+    try:
+        import ahocorasick
+    except ImportError:
+        ahocorasick = None
+
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for p in hits:
+            automaton.add_word(p, p)
+        automaton.make_automaton()
+        for i, t in enumerate(texts_norm):
+            for _, p in automaton.iter(t):
+                hits[p].add(i)
+    else:
+        # Word index: a pattern's interior words (its edge words may be partial)
+        # must occur as whole words in any chunk containing it
+        postings = {}
+        for i, t in enumerate(texts_norm):
+            for word in set(t.split(" ")):
+                postings.setdefault(word, []).append(i)
+        blob = "".join(texts_norm)
+        ends = np.cumsum([len(t) for t in texts_norm])
+        for p in hits:
+            interior = p.split(" ")[1:-1]
+            if interior:
+                lists = sorted((postings.get(word, ()) for word in set(interior)), key=len)
+                candidates = set(lists[0]).intersection(*lists[1:])
+                hits[p].update(i for i in candidates if p in texts_norm[i])
+                continue
+            pos = blob.find(p)
+            while pos != -1:
+                i = int(np.searchsorted(ends, pos, side="right"))
+                if pos + len(p) <= ends[i]:
+                    hits[p].add(i)
+                    pos = blob.find(p, ends[i])  # next chunk
+                else:
+                    pos = blob.find(p, pos + 1)  # straddles a chunk boundary
+    return {p: sorted(ix) for p, ix in hits.items()}
+
+
+# ---------- Embedding top-k ----------
+def top_k_similar(Q, C, k, block=1024):
+    """
+    Row-wise top-k of Q @ C.T (cosine on normalised vectors) via argpartition,
+    best first, in row blocks so the score matrix stays small.
+    Returns (indices, sims) of shape (len(Q), k).
+    """
+    k = min(k, C.shape[0])
+    idx = np.empty((len(Q), k), dtype=np.int64)
+    sims = np.empty((len(Q), k), dtype=np.float32)
+    for s in range(0, len(Q), block):
+        S = Q[s:s + block] @ C.T
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        part_sims = np.take_along_axis(S, part, axis=1)
+        order = np.argsort(-part_sims, axis=1, kind="stable")
+        idx[s:s + block] = np.take_along_axis(part, order, axis=1)
+        sims[s:s + block] = np.take_along_axis(part_sims, order, axis=1)
+    return idx, sims
 
 
 def main():
@@ -93,8 +186,18 @@ def main():
     if not rows or "question" not in reader.fieldnames:
         sys.exit("authoring.csv must contain a 'question' column.")
 
-    # Embed chunks once
+    # 1) Exact answer anchors for every row in one pass (skip tiny answers)
+    answers_norm = [norm(r.get("answer", "")) for r in rows]
+    anchors = find_anchors({a for a in answers_norm if a and len(a) >= 12}, texts_norm)
+
+    # 2) Embed chunks once and all anchor-less questions in one batch
     C = embed_texts(texts)  # normalized
+    fallback = [n for n, a in enumerate(answers_norm) if not anchors.get(a)]
+    if fallback:
+        Q = embed_texts([rows[n]["question"] for n in fallback])
+        top_idx, top_sims = top_k_similar(Q, C, TOP_K * 4)
+    fallback_pos = {n: j for j, n in enumerate(fallback)}
+
     out_fields = list(rows[0].keys())
     for col in ["chunk_ids", "scores", "chunk_sources", "chunk_preview", "needs_review"]:
         if col not in out_fields:
@@ -105,17 +208,8 @@ def main():
         w.writeheader()
 
         processed, flagged = 0, 0
-        for r in rows:
-            q = r["question"]
-            a = r.get("answer", "")
-
-            # 1) Exact answer anchor (prefer dissertation if multiple hits)
-            ans_norm = norm(a)
-            exact_idxs = []
-            if ans_norm and len(ans_norm) >= 12:  # skip tiny answers
-                for i, t in enumerate(texts_norm):
-                    if ans_norm in t:
-                        exact_idxs.append(i)
+        for n, r in enumerate(rows):
+            exact_idxs = list(anchors.get(answers_norm[n], []))
             if exact_idxs:
                 # stable dissertation-first ordering
                 exact_idxs.sort(key=lambda i: 0 if src_types[i] == "dissertation" else 1)
@@ -129,13 +223,11 @@ def main():
                 processed += 1
                 continue
 
-            # 2) Embedding fallback with dissertation boost
-            q_emb = embed_texts([q])[0]
-            sims = C @ q_emb  # cosine (normalized)
-            order = np.argsort(-sims)[:TOP_K * 4]
+            # Embedding fallback with dissertation boost
+            j = fallback_pos[n]
+            sims = {int(i): float(s) for i, s in zip(top_idx[j], top_sims[j])}
             boosted = []
-            for i in order:
-                s = float(sims[i])
+            for i, s in sims.items():
                 if src_types[i] == "dissertation":
                     s += DISSERTATION_BOOST
                 boosted.append((s, i))
@@ -146,9 +238,9 @@ def main():
                 r.update({"chunk_ids": "", "scores": "", "chunk_sources": "", "chunk_preview": "", "needs_review": "yes"})
                 flagged += 1
             else:
-                best = max(float(sims[i]) for i in final_idx)
+                best = max(sims[i] for i in final_idx)
                 r["chunk_ids"] = ";".join(str(ids[i]) for i in final_idx)
-                r["scores"] = ";".join(f"{float(sims[i]):.3f}" for i in final_idx)
+                r["scores"] = ";".join(f"{sims[i]:.3f}" for i in final_idx)
                 r["chunk_sources"] = ";".join(sources[i] for i in final_idx)
                 r["chunk_preview"] = " || ".join(f"[{ids[i]}] {preview(texts[i])}" for i in final_idx)
                 r["needs_review"] = "yes" if best < SCORE_FLOOR else "no"
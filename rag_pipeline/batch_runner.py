@@ -0,0 +1,246 @@
+# rag_pipeline/batch_runner.py
+# Bulk answering: a window of questions is embedded in one batched encode and
+# searched with one FAISS call, then the LLM calls run concurrently under a
+# concurrency cap and a rate limit. Results stream out one JSON line each, so
+# neither the input nor the output has to fit in memory.
+#
+#   python -m rag_pipeline.batch_runner fine_tune/authoring.csv --out data/answers.jsonl
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from .query_pipeline import dense_fetch_k, get_retrieval_executor, prepare_query
+from .telemetry import LLM_ERRORS, logger, span
+
+# --- Batch knobs ---
+BATCH_CONCURRENCY = int(os.environ.get("RAG_BATCH_CONCURRENCY", "4"))   # LLM calls in flight
+BATCH_RATE = float(os.environ.get("RAG_BATCH_RATE", "0"))              # LLM calls per second; 0 = unlimited
+BATCH_WINDOW = int(os.environ.get("RAG_BATCH_WINDOW", "64"))            # questions per encode + search
+
+
+# --- Input ---
+def iter_questions(path: Path) -> Iterator[Dict]:
+    """
+    Yields {"question_id", "question"} from a CSV with a `question` column
+    (e.g. fine_tune/authoring.csv) or a JSONL file, one row at a time.
+    """
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8-sig") as f:
+        if path.suffix == ".jsonl":
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for n, row in enumerate(rows, 1):
+            question = (row.get("question") or "").strip()
+            if question:
+                yield {"question_id": row.get("question_id") or row.get("id") or f"q{n}", "question": question}
+
+
+def normalise_records(items: Iterable) -> Iterator[Dict]:
+    # Accepts plain strings or {"question_id", "question"} dicts
+    for n, item in enumerate(items, 1):
+        if isinstance(item, str):
+            item = {"question": item}
+        question = (item.get("question") or "").strip()
+        yield {"question_id": item.get("question_id") or item.get("id") or f"q{n}", "question": question}
+
+
+def windows(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    it = iter(records)
+    while True:
+        window = list(islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+# --- Rate limiting ---
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across all tasks.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# --- Retrieval for a window ---
+def prepare_window(window, embedding_model, faiss_index, chunks, tokenizer, k=3, answer_cache=None,
+                   retrieval_options=None):
+    """
+    One encode + one FAISS search for the whole window, then per-question
+    cache lookup and prompt assembly on the shared results.
+    Returns [(record, query_embedding, cached_answer, prompt)].
+    """
+    questions = [r["question"] for r in window]
+    with span("embed"):
+        embeddings = embedding_model.encode(questions, convert_to_numpy=True, normalize_embeddings=True)
+    with span("search"):
+        distances, indices = faiss_index.search(embeddings, dense_fetch_k(k, **(retrieval_options or {})))
+
+    prepared = []
+    for i, record in enumerate(window):
+        batched = (embeddings[i:i + 1], distances[i:i + 1], indices[i:i + 1])
+        query_embedding, cached, prompt = prepare_query(
+            record["question"], embedding_model, faiss_index, chunks, tokenizer, k, answer_cache, batched,
+            retrieval_options=retrieval_options
+        )
+        prepared.append((record, query_embedding, cached, prompt))
+    return prepared
+
+
+# --- Runner ---
+async def arun_batch(records, embedding_model, faiss_index, chunks, allm_pipeline, tokenizer, k=3, max_tokens=150,
+                     answer_cache=None, retrieval_options=None, concurrency=BATCH_CONCURRENCY, rate=BATCH_RATE,
+                     window_size=BATCH_WINDOW):
+    """
+    Async generator of result dicts in completion order:
+      {"question_id", "question", "answer", "cached", "latency_ms"[, "error"]}
+    The next window is retrieved while the previous one's LLM calls are still
+    in flight; at most `window_size + concurrency` questions are held at once.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(rate)
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    async def answer(record, query_embedding, prompt, started):
+        result = {"question_id": record["question_id"], "question": record["question"], "cached": False}
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                with span("llm"):
+                    response = await allm_pipeline(prompt, max_new_tokens=max_tokens)
+                result["answer"] = response[0]["generated_text"].strip()
+            except Exception as e:
+                LLM_ERRORS.inc(kind=type(e).__name__)
+                logger.warning("batch llm_error question_id=%s error=%r", record["question_id"], e)
+                result["answer"] = None
+                result["error"] = str(e)
+        if answer_cache is not None and result["answer"]:
+            answer_cache.store(query_embedding[0], record["question"], result["answer"])
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    try:
+        for window in windows(records, window_size):
+            started = time.perf_counter()
+            valid = [r for r in window if r["question"]]
+            for r in window:
+                if not r["question"]:
+                    yield {"question_id": r["question_id"], "question": "", "answer": None, "cached": False,
+                           "latency_ms": 0.0, "error": "empty question"}
+            if not valid:
+                continue
+
+            prepared = await loop.run_in_executor(
+                get_retrieval_executor(),
+                partial(prepare_window, valid, embedding_model, faiss_index, chunks, tokenizer, k, answer_cache,
+                        retrieval_options),
+            )
+            for record, query_embedding, cached, prompt in prepared:
+                if cached is not None:
+                    yield {"question_id": record["question_id"], "question": record["question"], "answer": cached,
+                           "cached": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+                else:
+                    pending.add(asyncio.ensure_future(answer(record, query_embedding, prompt, started)))
+
+            # Drain down to `concurrency` in flight before retrieving the next window
+            while len(pending) > concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # The consumer stopped early (client disconnect, aclose): don't leave
+        # LLM calls running with nobody to read their results
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+# --- CLI ---
+async def amain(args):
+    from .query_pipeline import (
+        build_retrieval_options, load_answer_cache, load_async_llm, load_chunks, load_embedding_model,
+        load_faiss_index, load_lexical_index, load_reranker, load_tokenizer, shutdown_retrieval_executor,
+    )
+    from call_llm import aclose_async_client
+
+    print("🔧 Loading components...")
+    chunks = load_chunks()
+    embedding_model = load_embedding_model()
+    faiss_index = load_faiss_index()
+    tokenizer = load_tokenizer()
+    llm = load_async_llm(mode=args.mode)
+    answer_cache = None if args.no_cache else load_answer_cache()
+    retrieval_options = build_retrieval_options(chunks, load_lexical_index(), load_reranker())
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    done = failed = 0
+    t0 = time.perf_counter()
+    try:
+        async for result in arun_batch(
+            iter_questions(args.questions), embedding_model, faiss_index, chunks, llm, tokenizer,
+            k=args.k, max_tokens=args.max_tokens, answer_cache=answer_cache,
+            retrieval_options=retrieval_options, concurrency=args.concurrency, rate=args.rate,
+            window_size=args.window,
+        ):
+            line = json.dumps(result, ensure_ascii=False)
+            if out:
+                out.write(line + "\n")
+                out.flush()
+            else:
+                print(line, flush=True)
+            done += 1
+            failed += "error" in result
+    finally:
+        if out:
+            out.close()
+        await aclose_async_client()
+        shutdown_retrieval_executor()
+        if answer_cache is not None:
+            answer_cache.save()
+    print(f"✅ {done} answered ({failed} failed) in {time.perf_counter() - t0:.1f} s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Answer a question set (CSV or JSONL) to JSONL.")
+    ap.add_argument("questions", type=Path, help="CSV with a `question` column, or JSONL")
+    ap.add_argument("--out", type=Path, default=None, help="output JSONL (default: stdout)")
+    ap.add_argument("--mode", choices=["local", "cloud"], default="cloud")
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--max-tokens", type=int, default=150)
+    ap.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    ap.add_argument("--rate", type=float, default=BATCH_RATE, help="LLM calls per second; 0 = unlimited")
+    ap.add_argument("--window", type=int, default=BATCH_WINDOW, help="questions per batched encode + search")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the semantic answer cache")
+    asyncio.run(amain(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
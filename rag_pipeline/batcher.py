@@ -0,0 +1,113 @@
+import asyncio
+
+import numpy as np
+
+from .telemetry import span
+
+
+# --- Dynamic micro-batching of query embeddings + FAISS search ---
+class QueryBatcher:
+    """
+    Coalesces questions that arrive within `max_wait_ms` of each other (or until
+    `max_batch_size` are queued) into one batched `encode` and one batched
+    `faiss_index.search`, then fans the rows back to each waiting request.
+
+    While a batch is running on the executor new questions keep queueing, so
+    batches grow with load and a lone request only pays `max_wait_ms`.
+    """
+
+    def __init__(self, embedding_model, faiss_index, max_batch_size=16, max_wait_ms=5.0, executor=None):
+        self.embedding_model = embedding_model
+        self.faiss_index = faiss_index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue = None
+        self._worker = None
+
+    async def search(self, question, k):
+        """
+        Returns (query_embedding (1, d), distances (1, k), indices (1, k)).
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((question, k, future))
+        return await future
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            while not self._queue.empty() and len(batch) < self.max_batch_size:
+                batch.append(self._queue.get_nowait())
+            remaining = deadline - loop.time()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                break
+            # poll in short slices so a full batch leaves before the deadline
+            await asyncio.sleep(min(remaining, self.max_wait / 4))
+        return batch
+
+    def _encode_and_search(self, questions, k):
+        with span("embed"):
+            embeddings = self.embedding_model.encode(questions, convert_to_numpy=True, normalize_embeddings=True)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with span("search"):
+            distances, indices = self.faiss_index.search(embeddings, k)
+        return embeddings, distances, indices
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            live = [item for item in batch if not item[2].cancelled()]
+            if not live:
+                continue
+            questions = [q for q, _, _ in live]
+            k = max(item_k for _, item_k, _ in live)
+            try:
+                embeddings, distances, indices = await loop.run_in_executor(
+                    self.executor, self._encode_and_search, questions, k
+                )
+            except Exception as e:
+                for _, _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(live)
+            for row, (_, item_k, future) in enumerate(live):
+                if not future.done():
+                    future.set_result((
+                        embeddings[row:row + 1],
+                        distances[row:row + 1, :item_k],
+                        indices[row:row + 1, :item_k],
+                    ))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
@@ -0,0 +1,279 @@
+# rag_pipeline/chunk_store.py
+import os, sys, json, mmap, pickle
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# --- Paths ---
+ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
+DATA_DIR = ROOT_DIR / "data"
+CHUNK_STORE_DIR = DATA_DIR / "chunk_store"
+LEGACY_CHUNKS_FILE = DATA_DIR / "chunks.pkl"
+
+# --- On-disk layout (one directory) ---
+#   text.bin          UTF-8 chunk texts, back to back
+#   offsets.npy       int64 (n + 1) byte offsets into text.bin
+#   ids.npy           int64 (n) chunk ids, ascending
+#   source.npy        int32 (n) codes into meta["sources"]
+#   source_type.npy   int8  (n) codes into meta["source_types"]
+#   meta.json         column vocabularies + count; written last, so its
+#                     mtime marks a complete store
+TEXT_FILE = "text.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.npy"
+SOURCE_FILE = "source.npy"
+SOURCE_TYPE_FILE = "source_type.npy"
+META_FILE = "meta.json"
+
+
+class ChunkStore(Mapping):
+    """
+    Read-only, memory-mapped chunk table keyed by chunk id. Pages are shared
+    between processes through the OS page cache, and a chunk dict is only
+    materialised when it's looked up, so `chunks[idx]["text"]` keeps working
+    without unpickling the corpus in every worker.
+    """
+
+    def __init__(self, path: Path = CHUNK_STORE_DIR):
+        self.path = Path(path)
+        with open(self.path / META_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.sources: List[str] = self.meta["sources"]
+        self.source_types: List[str] = self.meta["source_types"]
+
+        self.offsets = np.load(self.path / OFFSETS_FILE, mmap_mode="r")
+        self.ids = np.load(self.path / IDS_FILE, mmap_mode="r")
+        self.source_codes = np.load(self.path / SOURCE_FILE, mmap_mode="r")
+        self.source_type_codes = np.load(self.path / SOURCE_TYPE_FILE, mmap_mode="r")
+
+        self._text_file = open(self.path / TEXT_FILE, "rb")
+        size = os.fstat(self._text_file.fileno()).st_size
+        self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    # --- Mapping protocol (by chunk id) ---
+    def position(self, chunk_id) -> int:
+        pos = int(np.searchsorted(self.ids, chunk_id))
+        if pos >= len(self.ids) or self.ids[pos] != chunk_id:
+            raise KeyError(chunk_id)
+        return pos
+
+    def __getitem__(self, chunk_id) -> Dict:
+        return self.row(self.position(chunk_id))
+
+    def __contains__(self, chunk_id) -> bool:
+        try:
+            self.position(chunk_id)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return (int(i) for i in self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --- Positional access ---
+    def text_at(self, pos: int) -> str:
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def row(self, pos: int) -> Dict:
+        return {
+            "id": int(self.ids[pos]),
+            "source": self.sources[self.source_codes[pos]],
+            "source_type": self.source_types[self.source_type_codes[pos]],
+            "text": self.text_at(pos),
+        }
+
+    def text(self, chunk_id) -> str:
+        return self.text_at(self.position(chunk_id))
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._text_file.close()
+
+
+# --- Writing ---
+def _atomic_save_npy(path: Path, array: np.ndarray):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def write_chunk_store(items: Iterable[Dict], path: Path = CHUNK_STORE_DIR) -> int:
+    """
+    Write chunk dicts ({"id", "source", "source_type", "text"}) as a columnar
+    store, sorted by id. Each file is replaced atomically and meta.json goes
+    last; processes that already mapped the old files keep reading them.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    rows = sorted(items, key=lambda ch: ch["id"])
+
+    sources: Dict[str, int] = {}
+    source_types: Dict[str, int] = {}
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    ids = np.zeros(len(rows), dtype=np.int64)
+    source_codes = np.zeros(len(rows), dtype=np.int32)
+    source_type_codes = np.zeros(len(rows), dtype=np.int8)
+
+    tmp_text = path / (TEXT_FILE + ".tmp")
+    with open(tmp_text, "wb") as f:
+        for i, ch in enumerate(rows):
+            data = ch["text"].encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+            ids[i] = ch["id"]
+            source_codes[i] = sources.setdefault(ch.get("source", ""), len(sources))
+            source_type_codes[i] = source_types.setdefault(ch.get("source_type", "reference"), len(source_types))
+    os.replace(tmp_text, path / TEXT_FILE)
+
+    _atomic_save_npy(path / OFFSETS_FILE, offsets)
+    _atomic_save_npy(path / IDS_FILE, ids)
+    _atomic_save_npy(path / SOURCE_FILE, source_codes)
+    _atomic_save_npy(path / SOURCE_TYPE_FILE, source_type_codes)
+
+    meta = {"count": len(rows), "sources": list(sources), "source_types": list(source_types)}
+    tmp_meta = path / (META_FILE + ".tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, path / META_FILE)
+    return len(rows)
+
+
+# --- Appending (streaming ingestion) ---
+# Staging layout: text.bin as above, plus raw per-row columns that grow by
+# appending (no header to rewrite): ends (int64 byte end of each text), ids
+# (int64), source (int32) and source_type (int8) codes.
+STAGED_COLUMNS = (("ends.i64", np.int64), ("ids.i64", np.int64), ("source.i32", np.int32),
+                  ("source_type.i8", np.int8))
+
+
+class ChunkStoreAppender:
+    """
+    Append-only staging area for a chunk store. Texts go straight to disk and
+    only the vocabularies stay in memory, so memory doesn't grow with the
+    corpus. Rows must arrive in ascending id order. Reopening with a saved
+    state() truncates anything appended after it (resume after a crash);
+    commit() installs the result with the layout write_chunk_store produces.
+    """
+
+    def __init__(self, staging: Path, state: Dict = None):
+        state = state or {}
+        self.staging = Path(staging)
+        self.staging.mkdir(parents=True, exist_ok=True)
+        self.rows = int(state.get("rows", 0))
+        self.text_bytes = int(state.get("text_bytes", 0))
+        self.sources = {s: i for i, s in enumerate(state.get("sources", []))}
+        self.source_types = {s: i for i, s in enumerate(state.get("source_types", []))}
+
+        self._files = {}
+        for name, size in [(TEXT_FILE, self.text_bytes)] + [
+            (col, self.rows * np.dtype(dtype).itemsize) for col, dtype in STAGED_COLUMNS
+        ]:
+            f = open(self.staging / name, "ab")
+            f.truncate(size)
+            self._files[name] = f
+        ids = np.fromfile(self.staging / "ids.i64", dtype=np.int64, count=self.rows) if self.rows else []
+        self.last_id = int(ids[-1]) if len(ids) else None
+
+    def append(self, rows: Iterable[Dict]):
+        ends, ids, source_codes, source_type_codes = [], [], [], []
+        text = self._files[TEXT_FILE]
+        for ch in rows:
+            if self.last_id is not None and ch["id"] <= self.last_id:
+                raise ValueError(f"chunk id {ch['id']} arrived after {self.last_id}; ids must ascend")
+            data = ch["text"].encode("utf-8")
+            text.write(data)
+            self.text_bytes += len(data)
+            self.last_id = ch["id"]
+            ends.append(self.text_bytes)
+            ids.append(ch["id"])
+            source_codes.append(self.sources.setdefault(ch.get("source", ""), len(self.sources)))
+            source_type_codes.append(
+                self.source_types.setdefault(ch.get("source_type", "reference"), len(self.source_types)))
+        for (col, dtype), values in zip(STAGED_COLUMNS, (ends, ids, source_codes, source_type_codes)):
+            self._files[col].write(np.asarray(values, dtype=dtype).tobytes())
+        self.rows += len(ids)
+
+    def state(self) -> Dict:
+        """Flush to disk and return what reopening at this point needs."""
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        return {"rows": self.rows, "text_bytes": self.text_bytes,
+                "sources": list(self.sources), "source_types": list(self.source_types)}
+
+    def ids(self) -> np.ndarray:
+        self.state()
+        return np.fromfile(self.staging / "ids.i64", dtype=np.int64, count=self.rows)
+
+    def commit(self, path: Path = CHUNK_STORE_DIR) -> int:
+        # Same file order as write_chunk_store: text, columns, meta.json last
+        self.state()
+        for f in self._files.values():
+            f.close()
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        columns = [np.fromfile(self.staging / col, dtype=dtype, count=self.rows) for col, dtype in STAGED_COLUMNS]
+        ends, ids, source_codes, source_type_codes = columns
+
+        os.replace(self.staging / TEXT_FILE, path / TEXT_FILE)
+        _atomic_save_npy(path / OFFSETS_FILE, np.concatenate([np.zeros(1, dtype=np.int64), ends]))
+        _atomic_save_npy(path / IDS_FILE, ids)
+        _atomic_save_npy(path / SOURCE_FILE, source_codes)
+        _atomic_save_npy(path / SOURCE_TYPE_FILE, source_type_codes)
+
+        meta = {"count": self.rows, "sources": list(self.sources), "source_types": list(self.source_types)}
+        tmp_meta = path / (META_FILE + ".tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta, path / META_FILE)
+        return self.rows
+
+
+# --- Loading ---
+def chunk_store_exists(path: Path = CHUNK_STORE_DIR) -> bool:
+    return (Path(path) / META_FILE).exists()
+
+
+def open_chunks(path: Path = CHUNK_STORE_DIR, legacy_path: Path = LEGACY_CHUNKS_FILE):
+    """
+    Chunks keyed by id: the memory-mapped store when present, otherwise the
+    legacy chunks.pkl (as a dict keyed by id).
+    """
+    if chunk_store_exists(path):
+        return ChunkStore(path)
+    if not Path(legacy_path).exists():
+        raise FileNotFoundError(f"❌ No chunk store at {path} (or legacy {legacy_path})")
+    with open(legacy_path, "rb") as f:
+        items = pickle.load(f)
+    if items and isinstance(items[0], dict) and "id" in items[0]:
+        return {ch["id"]: ch for ch in items}
+    return items
+
+
+def convert_pickle(pkl_path: Path = LEGACY_CHUNKS_FILE, path: Path = CHUNK_STORE_DIR) -> int:
+    with open(pkl_path, "rb") as f:
+        items = pickle.load(f)
+    rows = [
+        ch if isinstance(ch, dict) else {"id": i, "source": "", "source_type": "reference", "text": str(ch)}
+        for i, ch in enumerate(items)
+    ]
+    for i, ch in enumerate(rows):
+        ch.setdefault("id", i)
+    return write_chunk_store(rows, path)
+
+
+# --- One-shot converter: chunks.pkl -> chunk_store/ ---
+if __name__ == "__main__":
+    src = Path(sys.argv[1]) if len(sys.argv) > 1 else LEGACY_CHUNKS_FILE
+    n = convert_pickle(src)
+    store = ChunkStore()
+    print(f"✅ Converted {n} chunks from {src} to {CHUNK_STORE_DIR}")
+    print(f"   text: {int(store.offsets[-1]) / 1e6:.1f} MB | sources: {len(store.sources)}")
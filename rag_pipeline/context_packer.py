@@ -0,0 +1,92 @@
+# rag_pipeline/context_packer.py
+import os
+from typing import Callable, Dict, List
+
+# --- Budget knobs ---
+# Mistral-7B-Instruct reads the prompt; its window is far larger than what we
+# want to pay for per query, so the effective budget is the smaller of the two.
+MODEL_CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", "8192"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKENS", "700"))
+PROMPT_OVERHEAD_TOKENS = 80          # instructions + question framing
+CHARS_PER_TOKEN = 3.5                # conservative for English/maths under a SentencePiece vocab
+
+CHUNK_OVERLAP = 300                  # keep in sync with data_ingestion.CHUNK_OVERLAP
+OVERLAP_PROBE = 32                   # chars of the next chunk used to locate the overlap
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def load_token_counter(tokenizer_name: str = None) -> Callable[[str], int]:
+    """
+    Cheap character estimator by default. With a name (e.g. a Mistral
+    tokenizer.json repo) uses the Rust `tokenizers` fast tokenizer instead;
+    no transformers/torch import either way.
+    """
+    if not tokenizer_name:
+        return estimate_tokens
+    from tokenizers import Tokenizer
+    tok = Tokenizer.from_pretrained(tokenizer_name)
+    return lambda text: len(tok.encode(text, add_special_tokens=False).ids)
+
+
+def overlap_length(prev: str, nxt: str, max_overlap: int = CHUNK_OVERLAP) -> int:
+    """
+    Length of the longest suffix of `prev` that is also a prefix of `nxt`,
+    looking only in the last `max_overlap` (+ slack) chars of `prev`.
+    """
+    probe = nxt[:OVERLAP_PROBE]
+    if len(probe) < OVERLAP_PROBE:
+        return 0
+    window_start = max(0, len(prev) - max_overlap - OVERLAP_PROBE)
+    pos = prev.find(probe, window_start)
+    while pos != -1:
+        tail = prev[pos:]
+        if nxt.startswith(tail):
+            return len(tail)
+        pos = prev.find(probe, pos + 1)
+    return 0
+
+
+def _is_next(a: Dict, b: Dict) -> bool:
+    # Chunk ids are consecutive within a document (see data_ingestion.rebuild)
+    return a.get("source") == b.get("source") and b.get("id") == a.get("id", -2) + 1
+
+
+def pack_context(chunks: List[Dict], count_tokens: Callable[[str], int] = estimate_tokens,
+                 budget: int = CONTEXT_TOKEN_BUDGET, max_new_tokens: int = 150) -> List[str]:
+    """
+    Pack retrieved chunks, in rank order, as whole chunks into the token
+    budget. Text repeated between neighbouring chunks of the same document
+    (the splitter's CHUNK_OVERLAP) is sent once. A chunk that doesn't fit is
+    skipped in favour of smaller lower-ranked ones; only a lone oversized
+    first chunk is cut.
+    """
+    count_tokens = count_tokens or estimate_tokens
+    budget = max(0, min(budget, MODEL_CONTEXT_TOKENS - PROMPT_OVERHEAD_TOKENS - max_new_tokens))
+    packed: List[Dict] = []
+    texts: List[str] = []
+    used = 0
+    for ch in chunks:
+        text = ch["text"] if isinstance(ch, dict) else str(ch)
+        if isinstance(ch, dict):
+            for prev in packed:
+                if _is_next(prev, ch):
+                    text = text[overlap_length(prev["text"], text):]
+                elif _is_next(ch, prev):
+                    text = text[:len(text) - overlap_length(text, prev["text"])]
+            text = text.strip()
+            if not text:
+                continue
+
+        cost = count_tokens(text)
+        if used + cost > budget:
+            if not texts and budget > 0:
+                texts.append(text[:int(budget * CHARS_PER_TOKEN)])
+                packed.append(ch if isinstance(ch, dict) else {"text": text})
+            continue
+        texts.append(text)
+        packed.append(ch if isinstance(ch, dict) else {"text": text})
+        used += cost
+    return texts
@@ -1,16 +1,28 @@
 # Code/rag_pipeline/data_ingestion.py
-import os, re, pickle
-
+# Run from the repo root: python -m rag_pipeline.data_ingestion [--full] [--serial]
+# (or python -m rag_pipeline.stream_ingest for chunks + embeddings + index in one
+# bounded-memory, resumable pass)
+import os, re, sys, json, hashlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
-import pickle, re
+from typing import List, Dict, Optional
+
+from .chunk_store import CHUNK_STORE_DIR, LEGACY_CHUNKS_FILE, chunk_store_exists, open_chunks, write_chunk_store
+from .dedup import dedup_chunks
+from .lexical_index import LEXICAL_INDEX_DIR, LexicalIndex
 
 # --- Paths (works no matter where you run from) ---
 ROOT = Path(__file__).resolve().parents[1]     # .../Code
 DOCS_DIR = ROOT / "docs"                       # dissertation + references
-OUT_PATH = ROOT / "data" / "chunks.pkl"
+OUT_PATH = CHUNK_STORE_DIR                     # memory-mapped columnar store (was data/chunks.pkl)
+MANIFEST_PATH = ROOT / "data" / "manifest.json"  # per-document content hash -> chunk ids
+PAGE_CACHE_DIR = ROOT / "data" / "page_cache"    # <file sha256>.json -> normalised text per page
 OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# --- Extraction knobs ---
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.environ.get("INGEST_PAGES_PER_TASK", "16"))
+
 # --- Chunking knobs ---
 CHUNK_SIZE = 1200
 CHUNK_OVERLAP = 300
@@ -30,27 +42,119 @@ def source_type_from_name(name: str) -> str:
     return "dissertation" if ("dissertation" in n or "thesis" in n) else "reference"
 
 
-def extract_pdf_text(pdf_path: Path) -> str:
+def normalise_page_text(txt: str) -> str:
+    # normalise newlines, de-hyphenate, collapse spaces (keep newlines)
+    txt = txt.replace("\r\n", "\n").replace("\r", "\n")
+    txt = re.sub(r"(\w)-\n(\w)", r"\1\2", txt)
+    txt = re.sub(r"[ \t]+", " ", txt)
+    return txt.strip()
+
+
+def extract_page_range(pdf_path: Path, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """
+    Normalised text of pages [start, stop); "" for empty/graphics-only pages.
+    Top-level so it can run in a worker process.
+    """
     from pypdf import PdfReader
     reader = PdfReader(str(pdf_path))
-    parts: List[str] = []
-    empty_pages = 0
-    for page in reader.pages:
+    pages: List[str] = []
+    for page in reader.pages[start:stop]:
         try:
             txt = page.extract_text() or ""
         except Exception:
             txt = ""
-        if not txt.strip():
-            empty_pages += 1
-            continue
-        # normalise newlines, de-hyphenate, collapse spaces (keep newlines)
-        txt = txt.replace("\r\n", "\n").replace("\r", "\n")
-        txt = re.sub(r"(\w)-\n(\w)", r"\1\2", txt)
-        txt = re.sub(r"[ \t]+", " ", txt)
-        parts.append(txt.strip())
+        pages.append(normalise_page_text(txt) if txt.strip() else "")
+    return pages
+
+
+def join_pages(pdf_name: str, pages: List[str]) -> str:
+    empty_pages = sum(1 for p in pages if not p)
     if empty_pages:
-        print(f"  [warn] {pdf_path.name}: {empty_pages} empty/graphics-only pages (consider OCR if critical)")
-    return "\n\n".join(parts)
+        print(f"  [warn] {pdf_name}: {empty_pages} empty/graphics-only pages (consider OCR if critical)")
+    return "\n\n".join(p for p in pages if p)
+
+
+def extract_pdf_text(pdf_path: Path) -> str:
+    return join_pages(pdf_path.name, extract_page_range(pdf_path))
+
+
+# --- Page cache (keyed by file hash; list index = page number) ---
+def load_cached_pages(digest: str) -> Optional[List[str]]:
+    path = PAGE_CACHE_DIR / f"{digest}.json"
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cached_pages(digest: str, pages: List[str]) -> None:
+    PAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PAGE_CACHE_DIR / f"{digest}.json"
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def page_count(pdf_path: Path) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(str(pdf_path)).pages)
+
+
+def extract_documents(pdfs: List[Path], digests: Dict[str, str], workers: int = INGEST_WORKERS,
+                      pool: Optional[ProcessPoolExecutor] = None) -> Dict[str, List[str]]:
+    """
+    Page text for each PDF: served from the page cache when the file hash is
+    known, otherwise extracted over a process pool in page ranges of
+    PAGES_PER_TASK. Results are reassembled in page order, so the output is
+    identical to a sequential run. Pass `pool` to reuse one executor across
+    calls; it is left running.
+    """
+    pages: Dict[str, List[str]] = {}
+    todo: List[Path] = []
+    for pdf in pdfs:
+        cached = load_cached_pages(digests[pdf.name])
+        if cached is not None:
+            pages[pdf.name] = cached
+        else:
+            todo.append(pdf)
+    if pages:
+        print(f"[ingest] page cache hits: {len(pages)} document(s)")
+    if not todo:
+        return pages
+
+    if pool is None and workers <= 1:
+        for pdf in todo:
+            pages[pdf.name] = extract_page_range(pdf)
+            save_cached_pages(digests[pdf.name], pages[pdf.name])
+        return pages
+
+    if pool is not None:
+        pages.update(extract_on_pool(pool, todo, digests, workers))
+        return pages
+    with ProcessPoolExecutor(max_workers=workers) as own_pool:
+        pages.update(extract_on_pool(own_pool, todo, digests, workers))
+    return pages
+
+
+def extract_on_pool(pool: ProcessPoolExecutor, todo: List[Path], digests: Dict[str, str],
+                    workers: int) -> Dict[str, List[str]]:
+    pages: Dict[str, List[str]] = {}
+    futures = {}
+    for pdf in todo:
+        n = page_count(pdf)
+        futures[pdf.name] = [
+            pool.submit(extract_page_range, pdf, start, min(start + PAGES_PER_TASK, n))
+            for start in range(0, n, PAGES_PER_TASK)
+        ]
+    print(f"[ingest] extracting {len(todo)} document(s) on {workers} workers")
+    for pdf in todo:
+        doc_pages: List[str] = []
+        for fut in futures[pdf.name]:
+            doc_pages.extend(fut.result())
+        pages[pdf.name] = doc_pages
+        save_cached_pages(digests[pdf.name], doc_pages)
+    return pages
 
 
 def split_text(text: str) -> List[str]:
@@ -75,19 +179,85 @@ def split_text(text: str) -> List[str]:
     return [c for c in chunks if len(c) >= MIN_CHARS]
 
 
-def rebuild() -> List[Dict]:
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest() -> Dict:
+    if not MANIFEST_PATH.exists():
+        return {"next_id": 0, "documents": {}}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict) -> None:
+    tmp = MANIFEST_PATH.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def load_previous_chunks() -> Dict[str, List[Dict]]:
+    by_source: Dict[str, List[Dict]] = {}
+    if chunk_store_exists() or LEGACY_CHUNKS_FILE.exists():
+        for ch in open_chunks().values():
+            by_source.setdefault(ch["source"], []).append(ch)
+    return by_source
+
+
+def rebuild(full: bool = False, workers: int = INGEST_WORKERS) -> List[Dict]:
+    """
+    Incremental by default: documents whose SHA-256 matches data/manifest.json
+    keep their chunks (and chunk ids) untouched; only new or changed PDFs are
+    re-extracted and re-chunked, and removed PDFs drop out. New chunks always
+    get fresh ids, so ids referenced elsewhere (e.g. outputs/authoring_mapped.csv)
+    never silently point at different text. `full=True` re-extracts everything
+    but still never reuses an id.
+    """
     assert DOCS_DIR.exists(), f"{DOCS_DIR} not found"
+    manifest = load_manifest()
+    if full:
+        manifest["documents"] = {}
+    previous = {} if full else load_previous_chunks()
+    documents = manifest["documents"]
+    cid = manifest["next_id"]
+
     items: List[Dict] = []
-    cid = 0
+    seen = set()
+    unchanged = changed = added = 0
     pdfs = sorted(DOCS_DIR.glob("*.pdf"))
     if not pdfs:
         print(f"[ingest] No PDFs found in {DOCS_DIR}")
+
+    # 1. Hash everything; only new/changed documents need their text
+    digests = {pdf.name: file_sha256(pdf) for pdf in pdfs}
+    def is_unchanged(pdf):
+        entry = documents.get(pdf.name)
+        kept = previous.get(pdf.name, [])
+        return bool(entry) and entry["sha256"] == digests[pdf.name] and len(kept) == len(entry["chunk_ids"])
+    pages = extract_documents([pdf for pdf in pdfs if not is_unchanged(pdf)], digests, workers)
+
+    # 2. Assemble chunks in sorted document order (deterministic ids)
     for pdf in pdfs:
-        print(f"[ingest] {pdf.name}")
-        text = extract_pdf_text(pdf)
+        seen.add(pdf.name)
+        digest = digests[pdf.name]
+        entry = documents.get(pdf.name)
+        if is_unchanged(pdf):
+            items.extend(previous.get(pdf.name, []))
+            unchanged += 1
+            continue
+
+        print(f"[ingest] {pdf.name}" + (" (changed)" if entry else ""))
+        changed += bool(entry)
+        added += not entry
+        text = join_pages(pdf.name, pages[pdf.name])
         if not text.strip():
             print("  [skip] no extractable text")
-            continue
+        chunk_ids = []
         for ch in split_text(text):
             items.append({
                 "id": cid,
@@ -95,14 +265,28 @@ def rebuild() -> List[Dict]:
                 "source_type": source_type_from_name(pdf.name),
                 "text": ch
             })
+            chunk_ids.append(cid)
             cid += 1
+        documents[pdf.name] = {"sha256": digest, "chunk_ids": chunk_ids}
         print(f"  [ok] chunks so far: {cid}")
+
+    removed = [name for name in documents if name not in seen]
+    for name in removed:
+        print(f"[ingest] removed: {name}")
+        del documents[name]
+
+    items.sort(key=lambda ch: ch["id"])
+    manifest["next_id"] = cid
+    print(f"[ingest] unchanged: {unchanged} | changed: {changed} | new: {added} | removed: {len(removed)}")
     print(f"[ingest] total chunks: {len(items)}")
-    with open(OUT_PATH, "wb") as f:
-        pickle.dump(items, f)
+    write_chunk_store(items, OUT_PATH)
+    aliases = dedup_chunks(items, len(items))
+    LexicalIndex.build(ch for ch in items if ch["id"] not in aliases).save(LEXICAL_INDEX_DIR)
+    save_manifest(manifest)
     print(f"[ingest] wrote: {OUT_PATH.resolve()}")
+    print(f"[ingest] wrote: {LEXICAL_INDEX_DIR.resolve()}")
     return items
 
 
 if __name__ == "__main__":
-    rebuild()
+    rebuild(full="--full" in sys.argv, workers=1 if "--serial" in sys.argv else INGEST_WORKERS)
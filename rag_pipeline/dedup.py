@@ -0,0 +1,163 @@
+# rag_pipeline/dedup.py
+# Near-duplicate chunks (a document and its "v2", a paper quoted inside the
+# dissertation) are found with MinHash signatures over word shingles and
+# grouped with LSH banding, so only chunks that share a band are ever
+# compared. One canonical chunk per group stays in the FAISS and BM25
+# indexes; the rest are recorded as aliases of it and remain in the chunk
+# store for lookups by id.
+import os
+import re
+import json
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# --- Paths ---
+ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
+ALIASES_FILE = ROOT_DIR / "data" / "chunk_aliases.json"
+
+# --- Dedup knobs ---
+DEDUP_ENABLED = os.environ.get("RAG_DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.6"))  # estimated Jaccard of word shingles
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+LSH_BANDS = 32           # x LSH_ROWS = NUM_PERM; pairs at Jaccard s collide with p = 1 - (1 - s^rows)^bands
+LSH_ROWS = 4
+MAX_BUCKET = 64          # boilerplate buckets bigger than this are skipped, not compared pairwise
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+# --- Signatures ---
+def shingles(text: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    """crc32 of each k-word window (lower-cased letters and digits only)."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < k:
+        words = words + [""] * (k - len(words))
+    grams = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text: str) -> np.ndarray:
+    h = shingles(text)
+    # Universal hashing (a*h + b) mod p per permutation; uint64 products wrap, as usual for MinHash
+    with np.errstate(over="ignore"):
+        hashed = (_PERM_A[:, None] * h[None, :] + _PERM_B[:, None]) % _MERSENNE
+    return (hashed.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+# --- Grouping ---
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int = LSH_BANDS, rows: int = LSH_ROWS) -> Iterable[Tuple[int, int]]:
+    """Pairs of rows that agree on every value of at least one band."""
+    seen = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        for i, key in enumerate(np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key.tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2 or len(members) > MAX_BUCKET:
+                continue
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pair = (members[x], members[y])
+                    if pair not in seen:
+                        seen.add(pair)
+                        yield pair
+
+
+def find_near_duplicates(chunks: Iterable[Dict], threshold: float = DEDUP_THRESHOLD) -> Dict[int, int]:
+    """
+    {alias chunk id: canonical chunk id} for every chunk whose estimated
+    Jaccard similarity with another passes `threshold`. Groups are the
+    connected components of those pairs; the canonical chunk prefers
+    source_type "dissertation", then the longer text, then the lower id.
+    Reads `chunks` once, keeping only a 512-byte signature per chunk.
+    """
+    ids, lengths, is_dissertation, signatures = [], [], [], []
+    for ch in chunks:
+        ids.append(int(ch["id"]))
+        lengths.append(len(ch["text"]))
+        is_dissertation.append(ch.get("source_type") == "dissertation")
+        signatures.append(minhash(ch["text"]))
+    if not ids:
+        return {}
+    signatures = np.vstack(signatures)
+
+    groups = _UnionFind(len(ids))
+    for i, j in candidate_pairs(signatures):
+        if estimated_jaccard(signatures[i], signatures[j]) >= threshold:
+            groups.union(i, j)
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(ids)):
+        members.setdefault(groups.find(i), []).append(i)
+    aliases: Dict[int, int] = {}
+    for group in members.values():
+        if len(group) < 2:
+            continue
+        canonical = min(group, key=lambda i: (not is_dissertation[i], -lengths[i], ids[i]))
+        for i in group:
+            if i != canonical:
+                aliases[ids[i]] = ids[canonical]
+    return aliases
+
+
+# --- Persistence ---
+def save_aliases(aliases: Dict[int, int], n_chunks: int, path: Path = ALIASES_FILE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state = {
+        "threshold": DEDUP_THRESHOLD,
+        "chunks": n_chunks,
+        "aliases": {str(a): c for a, c in sorted(aliases.items())},
+    }
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+    groups = len(set(aliases.values()))
+    print(f"🧬 Near-duplicates: {len(aliases)} of {n_chunks} chunks folded into {groups} canonical chunks "
+          f"({len(aliases) / max(n_chunks, 1):.1%} smaller index)")
+
+
+def load_aliases(path: Path = ALIASES_FILE) -> Dict[int, int]:
+    path = Path(path)
+    if not DEDUP_ENABLED or not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(a): int(c) for a, c in json.load(f)["aliases"].items()}
+
+
+def dedup_chunks(chunks: Iterable[Dict], n_chunks: int, path: Path = ALIASES_FILE) -> Dict[int, int]:
+    """Find near-duplicates and record them (an empty map when RAG_DEDUP=0)."""
+    aliases = find_near_duplicates(chunks) if DEDUP_ENABLED else {}
+    save_aliases(aliases, n_chunks, path)
+    return aliases
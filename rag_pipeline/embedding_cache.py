@@ -0,0 +1,127 @@
+# rag_pipeline/embedding_cache.py
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# --- Paths ---
+ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
+EMBEDDING_CACHE_DIR = Path(os.environ.get("RAG_EMBED_CACHE_DIR", str(ROOT_DIR / "data" / "embedding_cache")))
+EMBEDDING_CACHE_ENABLED = os.environ.get("RAG_EMBED_CACHE", "1") == "1"
+
+VECTORS_FILE = "vectors.f32"   # raw float32 rows, append-only
+KEYS_FILE = "keys.bin"         # 16-byte text digest per row, same order
+META_FILE = "meta.json"
+
+DIGEST_SIZE = 16
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embeddings for one (model, normalise) pair, under
+    data/embedding_cache/<model>-<norm|raw>/. Rows are only ever appended:
+    vectors first, then their keys, so a crash mid-append leaves at most some
+    unreferenced trailing vectors. Reads go through a read-only memmap.
+    """
+
+    def __init__(self, model_name: str, normalize: bool = True, path: Path = EMBEDDING_CACHE_DIR):
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name) + ("-norm" if normalize else "-raw")
+        self.path = Path(path) / slug
+        self.model_name = model_name
+        self.normalize = normalize
+        self.dim = None
+        self.rows: Dict[bytes, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._load()
+
+    def _load(self):
+        meta_path = self.path / META_FILE
+        if not meta_path.exists():
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.dim = int(json.load(f)["dim"])
+        keys = (self.path / KEYS_FILE).read_bytes() if (self.path / KEYS_FILE).exists() else b""
+        vectors_path = self.path / VECTORS_FILE
+        n_vectors = os.path.getsize(vectors_path) // (4 * self.dim) if vectors_path.exists() else 0
+        n = min(len(keys) // DIGEST_SIZE, n_vectors)
+        self.rows = {keys[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]: i for i in range(n)}
+        self._vectors = None
+
+    def _map(self):
+        if self._vectors is None or len(self._vectors) < len(self.rows):
+            self._vectors = np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode="r",
+                                      shape=(len(self.rows), self.dim)) if self.rows else None
+        return self._vectors
+
+    def _append(self, digests: List[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.path / META_FILE, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "normalize": self.normalize, "dim": self.dim}, f, indent=2)
+        # Drop trailing vectors left by an interrupted append so rows stay aligned with keys
+        with open(self.path / VECTORS_FILE, "ab") as f:
+            f.truncate(len(self.rows) * 4 * self.dim)
+            f.write(vectors.tobytes())
+        with open(self.path / KEYS_FILE, "ab") as f:
+            f.truncate(len(self.rows) * DIGEST_SIZE)
+            f.write(b"".join(digests))
+        start = len(self.rows)
+        for i, d in enumerate(digests):
+            self.rows[d] = start + i
+        self._vectors = None
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for `texts`, calling `encode_fn` only on texts never seen
+        before (each distinct text once). `encode_fn` isn't called at all when
+        everything is cached, so callers can load the model lazily inside it.
+        """
+        digests = [text_digest(t) for t in texts]
+        missing: Dict[bytes, str] = {}
+        for d, t in zip(digests, texts):
+            if d not in self.rows and d not in missing:
+                missing[d] = t
+        self.misses += len(missing)
+        self.hits += len(texts) - sum(1 for d in digests if d in missing)
+
+        if missing:
+            new = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self._append(list(missing), new)
+
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        vectors = self._map()
+        return np.asarray(vectors[[self.rows[d] for d in digests]], dtype=np.float32)
+
+    def stats(self):
+        return {"model": self.model_name, "normalize": self.normalize, "rows": len(self.rows),
+                "hits": self.hits, "misses": self.misses}
+
+
+def cached_encode(texts: List[str], encode_fn: Callable[[List[str]], np.ndarray], model_name: str,
+                  normalize: bool = True) -> np.ndarray:
+    """
+    Route a corpus-encoding call through the on-disk cache (RAG_EMBED_CACHE=0
+    bypasses it). Online per-query encoding doesn't come through here: each
+    question is new, and the answer cache already keys on its embedding.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return np.asarray(encode_fn(list(texts)), dtype=np.float32)
+    cache = EmbeddingCache(model_name, normalize)
+    embeddings = cache.encode(list(texts), encode_fn)
+    s = cache.stats()
+    print(f"🗃️  Embedding cache ({model_name}): {s['hits']} reused | {s['misses']} encoded | "
+          f"{s['rows']} stored")
+    return embeddings
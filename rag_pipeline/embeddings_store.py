@@ -1,53 +1,302 @@
 import os
-import pickle
+import sys
+import json
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+from collections.abc import Mapping
 from pathlib import Path
 
+from .chunk_store import CHUNK_STORE_DIR, chunk_store_exists, open_chunks
+from .dedup import load_aliases
+from .embedding_cache import cached_encode
+
 # --- Path setup ---
 ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
 DATA_DIR = ROOT_DIR / "data"
 
-CHUNKS_FILE = DATA_DIR / "chunks.pkl"
+CHUNKS_FILE = DATA_DIR / "chunks.pkl"                # legacy; see chunk_store.py
 FAISS_INDEX_FILE = DATA_DIR / "faiss_index.bin"
 EMBEDDINGS_FILE = DATA_DIR / "embeddings.npy"
+EMBEDDING_IDS_FILE = DATA_DIR / "embedding_ids.npy"   # chunk id of each row in embeddings.npy
+INDEX_CONFIG_FILE = DATA_DIR / "faiss_index.json"    # index type, metric and search params
+
+# --- Index knobs ---
+INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat")   # flat | hnsw | ivf_flat | ivf_pq
+METRIC = os.environ.get("FAISS_METRIC", "ip")             # ip (cosine on normalised vectors) | l2
+HNSW_M = int(os.environ.get("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.environ.get("FAISS_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.environ.get("FAISS_IVF_NLIST", "0"))   # 0 = derive from corpus size
+IVF_NPROBE = int(os.environ.get("FAISS_IVF_NPROBE", "8"))
+PQ_M = int(os.environ.get("FAISS_PQ_M", "48"))             # sub-quantizers; must divide the dimension
 
 # --- Load Chunks ---
 def load_chunks():
-    print(f"🔍 Loading chunks from {CHUNKS_FILE}")
-    if not CHUNKS_FILE.exists():
-        raise FileNotFoundError(f"❌ chunks.pkl not found at: {CHUNKS_FILE}")
-    with open(CHUNKS_FILE, "rb") as f:
-        chunks = pickle.load(f)
+    print(f"🔍 Loading chunks from {CHUNK_STORE_DIR if chunk_store_exists() else CHUNKS_FILE}")
+    chunks = open_chunks()
     print(f"✅ Loaded {len(chunks)} chunks.")
     return chunks
 
 # --- Create Embeddings ---
-def create_embeddings(chunks):
-    print("⚙️  Encoding chunks with embedding model (BAAI/bge-small-en-v1.5)...")
-    embedding_model = SentenceTransformer('BAAI/bge-small-en-v1.5')
-    texts = [chunk['text'] if isinstance(chunk, dict) else str(chunk) for chunk in chunks]
-    embeddings = embedding_model.encode(texts, convert_to_numpy=True)
+def create_embeddings(chunks, embedding_model=None, model_name='BAAI/bge-small-en-v1.5'):
+    print(f"⚙️  Encoding chunks with embedding model ({model_name})...")
+    items = chunks.values() if isinstance(chunks, Mapping) else chunks
+    texts = [chunk['text'] if isinstance(chunk, dict) else str(chunk) for chunk in items]
+
+    def encode(missing):
+        # Only texts the embedding cache hasn't seen; the model loads on first miss
+        nonlocal embedding_model
+        if embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            embedding_model = SentenceTransformer(model_name)
+        return embedding_model.encode(missing, convert_to_numpy=True, normalize_embeddings=True)
+
+    embeddings = cached_encode(texts, encode, model_name, normalize=True)
     print(f"✅ Embeddings shape: {embeddings.shape}")  # (num_chunks, 384)
     return embedding_model, embeddings
 
+def update_embeddings(chunks, full=False):
+    """
+    Reuse stored embeddings for chunk ids that still exist, encode only ids that
+    have none, and drop rows for ids that disappeared. Chunk ids are never
+    reused for different text (see data_ingestion.rebuild), so the id is a
+    sufficient key. Returns (ids, embeddings, added_ids, removed_ids), sorted by id.
+    """
+    ids = np.array(sorted(chunks), dtype=np.int64)
+    if not full and EMBEDDINGS_FILE.exists() and EMBEDDING_IDS_FILE.exists():
+        old_embeddings = np.load(EMBEDDINGS_FILE)
+        old_ids = np.load(EMBEDDING_IDS_FILE)
+    else:
+        # Legacy stores have no id file: rows can't be trusted, re-encode everything
+        old_embeddings = np.zeros((0, 0), dtype=np.float32)
+        old_ids = np.zeros(0, dtype=np.int64)
+
+    keep = np.isin(old_ids, ids)
+    removed = old_ids[~keep]
+    added = ids[~np.isin(ids, old_ids)]
+    print(f"♻️  Embeddings reused: {int(keep.sum())} | to encode: {len(added)} | to delete: {len(removed)}")
+
+    if len(added):
+        _, new_embeddings = create_embeddings([chunks[i] for i in added])
+        if keep.any():
+            all_embeddings = np.vstack([old_embeddings[keep], new_embeddings])
+        else:
+            all_embeddings = new_embeddings
+        all_ids = np.concatenate([old_ids[keep], added])
+    else:
+        all_embeddings, all_ids = old_embeddings[keep], old_ids[keep]
+
+    order = np.argsort(all_ids, kind="stable")
+    return all_ids[order], np.ascontiguousarray(all_embeddings[order], dtype=np.float32), added, removed
+
+# --- Index Factory ---
+def default_nlist(n_vectors):
+    # ~4*sqrt(N) lists, keeping >= 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+def index_factory_string(index_type, n_vectors, nlist=None, pq_m=PQ_M, hnsw_m=HNSW_M):
+    nlist = nlist or IVF_NLIST or default_nlist(n_vectors)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m}x8"
+    raise ValueError(f"Unknown index type: {index_type}")
+
+def prepare_vectors(embeddings, metric=METRIC):
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if metric == "ip":
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)  # inner product == cosine
+    return vectors
+
+def apply_search_params(faiss_index, params):
+    ps = faiss.ParameterSpace()
+    for name in ("nprobe", "efSearch"):
+        if params.get(name) is not None:
+            ps.set_index_parameter(faiss_index, name, params[name])
+    return faiss_index
+
+def base_index(faiss_index):
+    if isinstance(faiss_index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(faiss_index.index)
+    return faiss_index
+
+def create_faiss_index(dimension, n_vectors=0, id_mapped=True, index_type=INDEX_TYPE, metric=METRIC, nlist=None,
+                       pq_m=PQ_M, hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                       ef_search=HNSW_EF_SEARCH, nprobe=IVF_NPROBE):
+    """
+    Empty FAISS index of the requested type, plus the config needed to reopen
+    it with the same metric and search parameters. IVF types size their lists
+    from `n_vectors` and still need training before vectors are added.
+    """
+    factory = index_factory_string(index_type, n_vectors, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+    if id_mapped:
+        factory = f"IDMap2,{factory}"
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+    faiss_index = faiss.index_factory(dimension, factory, faiss_metric)
+    if index_type == "hnsw":
+        base_index(faiss_index).hnsw.efConstruction = ef_construction
+
+    config = {
+        "index_type": index_type,
+        "factory": factory,
+        "id_mapped": id_mapped,
+        "metric": metric,
+        "nprobe": nprobe if index_type.startswith("ivf") else None,
+        "efSearch": ef_search if index_type == "hnsw" else None,
+    }
+    apply_search_params(faiss_index, config)
+    return faiss_index, config
+
+def build_faiss_index(embeddings, ids=None, index_type=INDEX_TYPE, metric=METRIC, nlist=None, pq_m=PQ_M,
+                      hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                      ef_search=HNSW_EF_SEARCH, nprobe=IVF_NPROBE):
+    """
+    Build a FAISS index of the requested type over `embeddings`. With `ids`
+    the index is wrapped in IDMap2 so searches return chunk ids and vectors
+    can later be removed by id.
+    Returns (faiss_index, config) where config holds everything needed to
+    reopen the index with the same metric and search parameters.
+    """
+    vectors = prepare_vectors(embeddings, metric)
+    n, dimension = vectors.shape
+    faiss_index, config = create_faiss_index(
+        dimension, n, id_mapped=ids is not None, index_type=index_type, metric=metric, nlist=nlist, pq_m=pq_m,
+        hnsw_m=hnsw_m, ef_construction=ef_construction, ef_search=ef_search, nprobe=nprobe,
+    )
+    if not faiss_index.is_trained:
+        print(f"🏋️  Training {config['factory']} on {n} vectors...")
+        faiss_index.train(vectors)
+    if ids is not None:
+        faiss_index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    else:
+        faiss_index.add(vectors)
+    return faiss_index, config
+
+def read_faiss_index(path=FAISS_INDEX_FILE, mmap=False):
+    """
+    Read the index into private memory, or with `mmap=True` map it read-only so
+    every worker on the box shares the same pages through the OS page cache.
+    IO_FLAG_MMAP_IFC maps flat code storage zero-copy (also inside IDMap2 and
+    HNSW); IO_FLAG_MMAP maps IVF inverted lists. IVF indexes reject the
+    combination, so they fall through to IO_FLAG_MMAP alone.
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    attempts = [ifc | faiss.IO_FLAG_MMAP, faiss.IO_FLAG_MMAP, ifc] if ifc else [faiss.IO_FLAG_MMAP]
+    for flags in attempts:
+        try:
+            return faiss.read_index(str(path), flags | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            last_error = e
+    print(f"⚠️ Memory-mapped read failed ({last_error}); loading {path} into private memory.")
+    return faiss.read_index(str(path))
+
+def load_embeddings(mmap=True):
+    # Read-only mapping: shared page cache instead of one copy per process
+    return np.load(EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+
+def load_index_config():
+    # Indexes built before the config file existed are exact L2
+    if not INDEX_CONFIG_FILE.exists():
+        return {"index_type": "flat", "factory": "Flat", "metric": "l2", "nprobe": None, "efSearch": None}
+    with open(INDEX_CONFIG_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
 # --- Save FAISS Index ---
-def save_faiss_index(embeddings):
-    print("📦 Building FAISS index...")
-    dimension = embeddings.shape[1]
-    faiss_index = faiss.IndexFlatL2(dimension)
-    faiss_index.add(embeddings)
-    faiss.write_index(faiss_index, str(FAISS_INDEX_FILE))
-    np.save(EMBEDDINGS_FILE, embeddings)
+def _tmp_path(path):
+    return path.with_name(path.name + ".tmp")
+
+def _atomic_save_npy(path, array):
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+def save_index_files(faiss_index, config, embeddings, ids=None):
+    # Write beside each file and rename over it: a reader with the old file
+    # memory-mapped keeps its inode instead of seeing it truncated (SIGBUS)
+    index_tmp = _tmp_path(FAISS_INDEX_FILE)
+    faiss.write_index(faiss_index, str(index_tmp))
+    os.replace(index_tmp, FAISS_INDEX_FILE)
+    config_tmp = _tmp_path(INDEX_CONFIG_FILE)
+    with open(config_tmp, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(config_tmp, INDEX_CONFIG_FILE)
+    _atomic_save_npy(EMBEDDINGS_FILE, embeddings)
+    if ids is not None:
+        _atomic_save_npy(EMBEDDING_IDS_FILE, ids)
     print(f"✅ Saved FAISS index to {FAISS_INDEX_FILE} and embeddings to {EMBEDDINGS_FILE}")
+
+def indexed_rows(ids, exclude_ids=()):
+    # Near-duplicate aliases keep their embedding rows but stay out of the index
+    return ~np.isin(ids, np.fromiter(exclude_ids, dtype=np.int64))
+
+def save_faiss_index(embeddings, ids=None, index_type=INDEX_TYPE, metric=METRIC, exclude_ids=(), **kwargs):
+    print(f"📦 Building FAISS index ({index_type}, {metric})...")
+    if ids is not None and len(exclude_ids):
+        keep = indexed_rows(ids, exclude_ids)
+        faiss_index, config = build_faiss_index(embeddings[keep], ids=ids[keep], index_type=index_type,
+                                                metric=metric, **kwargs)
+    else:
+        faiss_index, config = build_faiss_index(embeddings, ids=ids, index_type=index_type, metric=metric, **kwargs)
+    save_index_files(faiss_index, config, embeddings, ids)
     return faiss_index
 
+def update_faiss_index(ids, embeddings, added, removed, index_type=INDEX_TYPE, metric=METRIC, exclude_ids=(),
+                       **kwargs):
+    """
+    Apply an incremental change to the stored ID-mapped index in place
+    (remove_ids + add_with_ids). Chunks that became, or stopped being,
+    near-duplicate aliases (`exclude_ids`) are removed or added too. Falls
+    back to a rebuild from the stored embeddings when the index type/metric
+    changed or the index can't delete (HNSW).
+    """
+    config = load_index_config()
+    same_layout = (
+        FAISS_INDEX_FILE.exists()
+        and config.get("id_mapped")
+        and config.get("index_type") == index_type
+        and config.get("metric") == metric
+    )
+    if same_layout:
+        faiss_index = faiss.read_index(str(FAISS_INDEX_FILE))
+        current = faiss.vector_to_array(faiss_index.id_map)
+        target = ids[indexed_rows(ids, exclude_ids)]
+        added = np.union1d(np.intersect1d(added, target), np.setdiff1d(target, current))
+        removed = np.intersect1d(current, np.union1d(np.union1d(removed, added), np.setdiff1d(current, target)))
+        if not len(added) and not len(removed):
+            print("✅ Index already up to date.")
+            return faiss_index
+        try:
+            if len(removed):
+                faiss_index.remove_ids(np.asarray(removed, dtype=np.int64))
+            if len(added):
+                rows = np.searchsorted(ids, added)
+                faiss_index.add_with_ids(prepare_vectors(embeddings[rows], metric), np.asarray(added, dtype=np.int64))
+            print(f"🩹 Updated FAISS index in place: -{len(removed)} +{len(added)} → {faiss_index.ntotal} vectors")
+            save_index_files(faiss_index, config, embeddings, ids)
+            return faiss_index
+        except RuntimeError as e:
+            print(f"⚠️ In-place update not supported ({e}); rebuilding.")
+    return save_faiss_index(embeddings, ids=ids, index_type=index_type, metric=metric, exclude_ids=exclude_ids,
+                            **kwargs)
+
 # --- Main ---
 if __name__ == "__main__":
+    full = "--full" in sys.argv
     chunks = load_chunks()
-    model, embeddings = create_embeddings(chunks)
-    save_faiss_index(embeddings)
+    ids, embeddings, added, removed = update_embeddings(chunks, full=full)
+    aliases = load_aliases()
+    if full:
+        save_faiss_index(embeddings, ids=ids, exclude_ids=aliases)
+    else:
+        update_faiss_index(ids, embeddings, added, removed, exclude_ids=aliases)
 
 def load_all():
     chunks = load_chunks()
@@ -55,10 +304,10 @@ def load_all():
     print(f"📦 Loading FAISS index from {FAISS_INDEX_FILE}")
     if not FAISS_INDEX_FILE.exists():
         raise FileNotFoundError(f"❌ FAISS index not found at: {FAISS_INDEX_FILE}")
-    faiss_index = faiss.read_index(str(FAISS_INDEX_FILE))
+    faiss_index = apply_search_params(faiss.read_index(str(FAISS_INDEX_FILE)), load_index_config())
     print(f"✅ FAISS index loaded with {faiss_index.ntotal} vectors.")
 
+    from sentence_transformers import SentenceTransformer
     embedding_model = SentenceTransformer('BAAI/bge-small-en-v1.5')
 
     return embedding_model, faiss_index, chunks
-
@@ -0,0 +1,152 @@
+# rag_pipeline/lexical_index.py
+import os, re, json
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# --- Paths ---
+ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
+LEXICAL_INDEX_DIR = ROOT_DIR / "data" / "lexical_index"
+
+# --- BM25 knobs ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+what which who how why when where does do can we our their there these those than then into over such
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    # "Mardia's test" -> ["mardia", "test"]; single letters (possessive s, x, y) are noise here
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 over chunk text with postings held in flat arrays:
+      offsets[t]:offsets[t+1]  slice of `docs` / `weights` for term id t
+      docs     int32 positions into `chunk_ids`
+      weights  float32 BM25 term weight (idf and doc-length normalisation baked in)
+    so a query is a handful of array slices and one scatter-add.
+    """
+
+    def __init__(self, vocab: Dict[str, int], offsets: np.ndarray, docs: np.ndarray,
+                 weights: np.ndarray, chunk_ids: np.ndarray):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.chunk_ids = chunk_ids
+
+    # --- Build ---
+    @classmethod
+    def build(cls, items: Iterable[Dict], k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        # Typed arrays, not lists of ints: postings are the bulk of the build's memory
+        vocab: Dict[str, int] = {}
+        chunk_ids = array("q")
+        term_col = array("q")
+        doc_col = array("i")
+        tf_col = array("f")
+        doc_len = array("f")
+        for pos, ch in enumerate(items):
+            tokens = tokenize(ch["text"])
+            chunk_ids.append(ch["id"])
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(pos)
+                tf_col.append(tf)
+
+        terms = np.frombuffer(term_col, dtype=np.int64)
+        docs = np.frombuffer(doc_col, dtype=np.int32)
+        tf = np.frombuffer(tf_col, dtype=np.float32)
+        dl = np.frombuffer(doc_len, dtype=np.float32)
+        n_docs = len(chunk_ids)
+
+        order = np.argsort(terms, kind="stable")
+        terms, docs, tf = terms[order], docs[order], tf[order]
+        df = np.bincount(terms, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(dl.mean()) if n_docs else 1.0
+        norm = k1 * (1.0 - b + b * dl[docs] / max(avgdl, 1e-9))
+        weights = (idf[terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        return cls(vocab, offsets, docs, weights, np.array(chunk_ids, dtype=np.int64))
+
+    # --- Query ---
+    def search(self, query: str, k: int = 10, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (chunk_ids, scores) of the top-k BM25 matches, best first.
+        `mask` (one bool per indexed chunk) restricts the match to a subset.
+        """
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            s, e = self.offsets[t], self.offsets[t + 1]
+            scores[self.docs[s:e]] += self.weights[s:e]  # docs are unique within a posting list
+            matched = True
+        if mask is not None:
+            scores[~mask] = 0.0
+        k = min(k, int(np.count_nonzero(scores)))
+        if not matched or k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.chunk_ids[top], scores[top]
+
+    # --- Persistence ---
+    def save(self, path: Path = LEXICAL_INDEX_DIR):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ("offsets", "docs", "weights", "chunk_ids"):
+            tmp = path / f"{name}.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(tmp, path / f"{name}.npy")
+        terms = sorted(self.vocab, key=self.vocab.get)  # list index == term id
+        tmp = path / "vocab.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        os.replace(tmp, path / "vocab.json")
+
+    @classmethod
+    def load(cls, path: Path = LEXICAL_INDEX_DIR, mmap: bool = True) -> "LexicalIndex":
+        path = Path(path)
+        mode = "r" if mmap else None
+        with open(path / "vocab.json", "r", encoding="utf-8") as f:
+            vocab = {term: i for i, term in enumerate(json.load(f))}
+        return cls(
+            vocab,
+            np.load(path / "offsets.npy", mmap_mode=mode),
+            np.load(path / "docs.npy", mmap_mode=mode),
+            np.load(path / "weights.npy", mmap_mode=mode),
+            np.load(path / "chunk_ids.npy", mmap_mode=mode),
+        )
+
+
+def lexical_index_exists(path: Path = LEXICAL_INDEX_DIR) -> bool:
+    return (Path(path) / "vocab.json").exists()
+
+
+# --- Fusion ---
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Fuse several ranked id lists: score(d) = sum over lists of 1 / (k + rank).
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda d: -scores[d])
@@ -0,0 +1,134 @@
+# rag_pipeline/onnx_embedder.py
+import os
+import json
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+# --- Paths ---
+ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
+ONNX_MODEL_DIR = ROOT_DIR / "data" / "onnx" / "bge-small-en-v1.5"
+
+MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model_int8.onnx"
+CONFIG_FILE = "embedder.json"   # pooling / max length, written by export_onnx_model
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for the slice of SentenceTransformer.encode the pipeline uses,
+    backed by ONNX Runtime and the Rust `tokenizers` fast tokenizer, so
+    serving never imports torch. Pooling (CLS for bge) and max length come
+    from the embedder.json written at export time.
+    """
+
+    def __init__(self, model_dir: Path = ONNX_MODEL_DIR, quantized: bool = True, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / CONFIG_FILE, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.pooling = self.config.get("pooling", "cls")
+        self.max_length = int(self.config.get("max_length", 512))
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.enable_padding(pad_id=self.config.get("pad_token_id", 0))
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = intra_op_threads  # 0 = ORT default (all cores)
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = model_dir / (INT8_MODEL_FILE if quantized else MODEL_FILE)
+        self.session = ort.InferenceSession(str(model_file), opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_file = model_file
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+        if self.pooling == "mean":
+            mask = attention_mask[..., None].astype(np.float32)
+            return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return hidden[:, 0]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False, **_) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Sort by length so each batch pads to a similar size
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            out[idx] = self._embed_batch([texts[i] for i in idx])
+
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+# --- Export (offline; needs torch + transformers) ---
+def export_onnx_model(model_name: str = "BAAI/bge-small-en-v1.5", out_dir: Path = ONNX_MODEL_DIR,
+                      quantize: bool = True, pooling: str = "cls", max_length: int = 512, opset: int = 17):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(out_dir)  # tokenizer.json for the runtime side
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "seq"} for n in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+    model_path = out_dir / MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in names),
+            str(model_path),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+            dynamo=False,
+        )
+    print(f"✅ Exported {model_name} -> {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = out_dir / INT8_MODEL_FILE
+        quantize_dynamic(str(model_path), str(int8_path), weight_type=QuantType.QInt8)
+        print(f"✅ Int8 dynamic quantization -> {int8_path} "
+              f"({os.path.getsize(model_path) / 1e6:.1f} MB -> {os.path.getsize(int8_path) / 1e6:.1f} MB)")
+
+    with open(out_dir / CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "pooling": pooling,
+            "max_length": max_length,
+            "pad_token_id": tokenizer.pad_token_id or 0,
+        }, f, indent=2)
+    return out_dir
+
+
+def onnx_model_exists(model_dir: Path = ONNX_MODEL_DIR, quantized: bool = True) -> bool:
+    model_dir = Path(model_dir)
+    return (model_dir / CONFIG_FILE).exists() and (model_dir / (INT8_MODEL_FILE if quantized else MODEL_FILE)).exists()
@@ -4,21 +4,37 @@ from .query_pipeline import (
     load_faiss_index,
     load_embedding_model,
     load_tokenizer,
+    load_lexical_index,
+    load_reranker,
+    build_retrieval_options,
     load_llm
 )
 
-chunks = load_chunks()
-faiss_index = load_faiss_index()
-embedding_model = load_embedding_model()
-tokenizer = load_tokenizer()
-llm_pipeline = load_llm(mode="cloud")
+# Loaded on the first run_query(), not at import time
+_components = None
+
+def get_components():
+    global _components
+    if _components is None:
+        chunks = load_chunks()
+        _components = {
+            "chunks": chunks,
+            "faiss_index": load_faiss_index(),
+            "embedding_model": load_embedding_model(),
+            "tokenizer": load_tokenizer(),
+            "retrieval_options": build_retrieval_options(chunks, load_lexical_index(), load_reranker()),
+            "llm_pipeline": load_llm(mode="cloud"),
+        }
+    return _components
 
 def run_query(prompt: str) -> str:
+    c = get_components()
     return query_rag_pipeline(
         prompt,
-        embedding_model,
-        faiss_index,
-        chunks,
-        llm_pipeline,
-        tokenizer
+        c["embedding_model"],
+        c["faiss_index"],
+        c["chunks"],
+        c["llm_pipeline"],
+        c["tokenizer"],
+        retrieval_options=c["retrieval_options"]
     )
@@ -1,36 +1,109 @@
-import pickle
+import asyncio
 import faiss
 import numpy as np
 import os
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer
+
+from .chunk_store import CHUNK_STORE_DIR, META_FILE, open_chunks
+from .context_packer import CHARS_PER_TOKEN, CONTEXT_TOKEN_BUDGET, load_token_counter, pack_context
+from .lexical_index import LexicalIndex, lexical_index_exists, reciprocal_rank_fusion
+from .embeddings_store import apply_search_params, load_index_config, read_faiss_index
+from .dedup import load_aliases
+from .source_filter import ChunkMetadata
+from .telemetry import CACHE_LOOKUPS, FALLBACKS, LLM_ERRORS, SESSION_TURNS, STAGE_SECONDS, logger, sampled, span
 
 # --- Path Setup ---
 ROOT_DIR = Path(__file__).resolve().parents[1]  # .../Code
 DATA_DIR = ROOT_DIR / "data"
 
 # --- File Paths ---
-CHUNKS_FILE = DATA_DIR / "chunks.pkl"
+CHUNKS_FILE = DATA_DIR / "chunks.pkl"            # legacy; superseded by data/chunk_store/
 FAISS_INDEX_FILE = DATA_DIR / "faiss_index.bin"
 EMBEDDINGS_FILE = DATA_DIR / "embeddings.npy"
 
+# --- Serving knobs ---
+# Optional fast tokenizer (tokenizers lib) for context budgeting; empty = char estimator
+CONTEXT_TOKENIZER = os.environ.get("RAG_CONTEXT_TOKENIZER", "")
+# Map the FAISS index / embeddings read-only so multiple uvicorn workers share one copy
+SERVE_MMAP = os.environ.get("RAG_MMAP", "1") == "1"
+# Bounded pool for CPU-bound retrieval (encode + FAISS search + prompt assembly)
+RETRIEVAL_WORKERS = int(os.environ.get("RAG_RETRIEVAL_WORKERS", "4"))
+_retrieval_executor = None
+
+# --- Embedding backend ---
+# torch: SentenceTransformer in PyTorch; onnx: exported model on ONNX Runtime (no torch import)
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+EMBED_BACKEND = os.environ.get("RAG_EMBED_BACKEND", "torch")
+ONNX_MODEL_DIR = Path(os.environ.get("RAG_ONNX_MODEL_DIR", str(DATA_DIR / "onnx" / "bge-small-en-v1.5")))
+ONNX_INT8 = os.environ.get("RAG_ONNX_INT8", "1") == "1"              # dynamic int8 weights
+ONNX_THREADS = int(os.environ.get("RAG_ONNX_THREADS", "0"))            # intra-op threads; 0 = all cores
+
+# --- Retrieval knobs ---
+RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "hybrid")   # dense | hybrid (BM25 + FAISS, RRF)
+HYBRID_FETCH_K = int(os.environ.get("RAG_HYBRID_FETCH_K", "20"))  # candidates per retriever before fusion
+
+# --- Rerank knobs (optional cross-encoder stage) ---
+RERANK_ENABLED = os.environ.get("RAG_RERANK", "0") == "1"
+RERANK_MODEL = os.environ.get("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FETCH_K = int(os.environ.get("RAG_RERANK_FETCH_K", "16"))     # candidates scored per request
+RERANK_BUDGET_MS = float(os.environ.get("RAG_RERANK_BUDGET_MS", "150"))
+RERANK_BATCH_SIZE = int(os.environ.get("RAG_RERANK_BATCH_SIZE", "8"))
+
+# --- Answer cache knobs ---
+ANSWER_CACHE_FILE = DATA_DIR / "answer_cache.pkl"
+CACHE_THRESHOLD = float(os.environ.get("RAG_CACHE_THRESHOLD", "0.95"))   # cosine similarity for a hit
+CACHE_MAX_ENTRIES = int(os.environ.get("RAG_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.environ.get("RAG_CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_MAX_MB = float(os.environ.get("RAG_CACHE_MAX_MB", "64"))
+CACHE_PERSIST = os.environ.get("RAG_CACHE_PERSIST", "1") == "1"
+
+# --- Micro-batching knobs (query encode + FAISS search across concurrent requests) ---
+BATCHING_ENABLED = os.environ.get("RAG_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("RAG_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("RAG_BATCH_MAX_WAIT_MS", "5"))
+
+# --- Session knobs (server-side conversation state for follow-up questions) ---
+SESSIONS_ENABLED = os.environ.get("RAG_SESSIONS", "1") == "1"
+SESSION_MAX = int(os.environ.get("RAG_SESSION_MAX", "1000"))
+SESSION_IDLE_SECONDS = float(os.environ.get("RAG_SESSION_IDLE_SECONDS", "1800"))
+SESSION_MAX_TURNS = int(os.environ.get("RAG_SESSION_MAX_TURNS", "8"))
+SESSION_HISTORY_TURNS = int(os.environ.get("RAG_SESSION_HISTORY_TURNS", "2"))    # turns sent to the LLM
+SESSION_HISTORY_CHARS = int(os.environ.get("RAG_SESSION_HISTORY_CHARS", "300"))  # per previous answer
+SESSION_HISTORY_TOKENS = int(os.environ.get("RAG_SESSION_HISTORY_TOKENS", "200"))  # whole history window
+SESSION_REUSE_SIM = float(os.environ.get("RAG_SESSION_REUSE_SIM", "0.9"))        # cosine to reuse last chunks
+SESSION_CARRY = float(os.environ.get("RAG_SESSION_CARRY", "0.5"))                # weight of the previous turn
+
 # --- Loaders ---
 def load_chunks():
-    with open(CHUNKS_FILE, "rb") as f:
-        return pickle.load(f)
+    # Memory-mapped chunk store (falls back to the legacy chunks.pkl)
+    return open_chunks()
 
-def load_embedding_model():
-    return SentenceTransformer("BAAI/bge-small-en-v1.5")
+def load_embedding_model(backend=EMBED_BACKEND):
+    if backend == "onnx":
+        # Export once with: python rag_pipeline/tools/export_onnx_embedder.py
+        from .onnx_embedder import OnnxEmbedder
+        return OnnxEmbedder(ONNX_MODEL_DIR, quantized=ONNX_INT8, intra_op_threads=ONNX_THREADS)
+    elif backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBED_MODEL)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
 
-def load_faiss_index():
-    return faiss.read_index(str(FAISS_INDEX_FILE))
+def load_faiss_index(mmap=SERVE_MMAP):
+    # nprobe / efSearch persisted next to the index by embeddings_store
+    faiss_index = read_faiss_index(FAISS_INDEX_FILE, mmap=mmap)
+    return apply_search_params(faiss_index, load_index_config())
 
 def load_llm(mode="local"):
     """
     Load LLM pipeline based on mode:
     - 'local': uses Ollama (for dev)
-    - 'cloud': uses Groq (for deployment)
+    - 'cloud': uses Groq (for deployment) through call_llm's pooled session,
+      with timeouts, retries and optional failover (LLM_FALLBACK)
     """
     if mode == "local":
         import ollama
@@ -48,72 +121,472 @@ def load_llm(mode="local"):
     else:
         raise ValueError(f"Unknown mode: {mode}")
 
+def load_async_llm(mode="local"):
+    """
+    Async counterpart of load_llm, used by the FastAPI app:
+    - 'local': uses Ollama's async client (for dev)
+    - 'cloud': uses Groq through a pooled httpx client (for deployment), with
+      retries, optional hedging (LLM_HEDGE) and failover (LLM_FALLBACK)
+    """
+    if mode == "local":
+        import ollama
+        client = ollama.AsyncClient()
+        async def local_mistral_pipeline(prompt, max_new_tokens=150):
+            response = await client.chat(model="mistral", messages=[
+                {"role": "user", "content": prompt}
+            ])
+            return [{"generated_text": response["message"]["content"]}]
+        return local_mistral_pipeline
+
+    elif mode == "cloud":
+        from call_llm import allm_pipeline
+        return allm_pipeline
+
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+def load_streaming_llm(mode="local"):
+    """
+    Token-streaming LLM for /query/stream: returns an async generator function
+    yielding text deltas.
+    - 'local': uses Ollama's async client with stream=True (for dev)
+    - 'cloud': uses Groq's SSE chat endpoint (for deployment)
+    """
+    if mode == "local":
+        import ollama
+        client = ollama.AsyncClient()
+        async def local_mistral_stream(prompt, max_new_tokens=150):
+            parts = await client.chat(model="mistral", messages=[
+                {"role": "user", "content": prompt}
+            ], stream=True)
+            async for part in parts:
+                if part["message"]["content"]:
+                    yield part["message"]["content"]
+        return local_mistral_stream
+
+    elif mode == "cloud":
+        from call_llm import astream_llm_pipeline
+        return astream_llm_pipeline
+
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+def get_retrieval_executor():
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval"
+        )
+    return _retrieval_executor
+
+def shutdown_retrieval_executor():
+    global _retrieval_executor
+    if _retrieval_executor is not None:
+        _retrieval_executor.shutdown(wait=False)
+        _retrieval_executor = None
+
+def load_answer_cache():
+    from .semantic_cache import SemanticCache
+    return SemanticCache(
+        threshold=CACHE_THRESHOLD,
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+        max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+        persist_path=ANSWER_CACHE_FILE if CACHE_PERSIST else None,
+        watch_files=(FAISS_INDEX_FILE, CHUNK_STORE_DIR / META_FILE, CHUNKS_FILE),
+    )
+
+def load_query_batcher(embedding_model, faiss_index):
+    if not BATCHING_ENABLED:
+        return None
+    from .batcher import QueryBatcher
+    return QueryBatcher(
+        embedding_model,
+        faiss_index,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        executor=get_retrieval_executor(),
+    )
+
+def load_session_store():
+    if not SESSIONS_ENABLED:
+        return None
+    from .session_store import SessionStore
+    return SessionStore(max_sessions=SESSION_MAX, idle_seconds=SESSION_IDLE_SECONDS, max_turns=SESSION_MAX_TURNS)
+
+def load_chunk_metadata(chunks):
+    # Source / source-type columns for retrieval filters and the source boost
+    return ChunkMetadata(chunks, aliases=load_aliases())
+
+def build_retrieval_options(chunks, lexical_index=None, reranker=None):
+    # Serving retrieval options, assembled in one place so the app, the batch CLI
+    # and run_query retrieve (and fill the shared answer cache) the same way
+    return {"lexical_index": lexical_index, "reranker": reranker, "metadata": load_chunk_metadata(chunks)}
+
+def load_lexical_index():
+    # Built by data_ingestion.rebuild(); hybrid retrieval degrades to dense without it
+    if not lexical_index_exists():
+        print("⚠️ No lexical index found; hybrid retrieval disabled.")
+        return None
+    return LexicalIndex.load()
+
+def load_reranker():
+    if not RERANK_ENABLED:
+        return None
+    from .reranker import CrossEncoderReranker
+    reranker = CrossEncoderReranker(RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, budget_ms=RERANK_BUDGET_MS)
+    reranker.warmup()
+    return reranker
+
 def load_tokenizer():
-    return AutoTokenizer.from_pretrained("google/flan-t5-large")
+    # A token counter for the context packer, not a full HF tokenizer
+    return load_token_counter(CONTEXT_TOKENIZER or None)
 
 # --- Retrieval ---
-def retrieve_relevant_chunks(question, embedding_model, faiss_index, chunks, k=8, distance_threshold=0.85):
-    query_embedding = embedding_model.encode([question], convert_to_numpy=True)
-    distances, indices = faiss_index.search(query_embedding, k)
+NO_MATCH_ANSWER = "No matching content in the selected sources. Try widening the filter."
+
+def encode_query(question, embedding_model):
+    with span("embed"):
+        return embedding_model.encode([question], convert_to_numpy=True, normalize_embeddings=True)
+
+def to_l2_distances(faiss_index, distances, indices=None):
+    # Inner-product indexes return cosine similarity on unit vectors; map it to
+    # squared L2 (2 - 2cos) so distance_threshold means the same for every index type.
+    # Padding slots (id -1, score -FLT_MAX on IP) become +inf before any arithmetic.
+    valid = np.ones(distances.shape, dtype=bool) if indices is None else indices >= 0
+    distances = np.where(valid, distances, 0.0).astype(np.float32)
+    if faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        distances = 2.0 - 2.0 * distances
+    return np.where(valid, distances, np.inf)
+
+def dense_fetch_k(k, lexical_index=None, mode=RETRIEVAL_MODE, reranker=None, **_):
+    # Hybrid fusion and reranking want a deeper candidate list than the final k
+    fetch_k = k
+    if reranker is not None:
+        fetch_k = max(fetch_k, RERANK_FETCH_K)
+    if mode == "hybrid" and lexical_index is not None:
+        fetch_k = max(fetch_k, HYBRID_FETCH_K)
+    return fetch_k
+
+def select_chunks(metadata=None, source_filter=None, **_):
+    # The Selection a source filter allows, or None when the query is unfiltered
+    if metadata is None or not source_filter:
+        return None
+    return metadata.selection(source_filter)
+
+def chunks_for_ids(chunks, ids):
+    # The chunks still present; legacy chunks.pkl lists are indexed by position
+    if isinstance(chunks, Mapping):
+        return [chunks[i] for i in ids if i in chunks]
+    return [chunks[i] for i in ids if 0 <= i < len(chunks)]
 
-    print(f"🔍 FAISS distances: {distances[0]}")
+def retrieve_relevant_chunks(question, embedding_model, faiss_index, chunks, k=8, distance_threshold=0.85,
+                             query_embedding=None, hits=None, lexical_index=None, mode=RETRIEVAL_MODE, reranker=None,
+                             fallback_ids=None, metadata=None, source_filter=None):
+    fetch_k = dense_fetch_k(k, lexical_index, mode, reranker)
+    candidate_k = k if reranker is None else max(k, RERANK_FETCH_K)
+    selection = select_chunks(metadata, source_filter)
+    if hits is not None and selection is None:
+        distances, indices = hits  # already searched (e.g. by the micro-batcher)
+    else:
+        if query_embedding is None:
+            query_embedding = encode_query(question, embedding_model)
+        with span("search"):
+            if selection is None:
+                distances, indices = faiss_index.search(query_embedding, fetch_k)
+            else:
+                # Filtered inside the index: only the selected chunk ids are scored
+                distances, indices = faiss_index.search(query_embedding, fetch_k,
+                                                        params=selection.search_params(faiss_index))
+    distances = to_l2_distances(faiss_index, distances, indices)
+
+    if sampled():
+        logger.debug("retrieval distances=%s", [round(float(d), 3) for d in distances[0]])
+
+    # ANN indexes pad with -1 when fewer than k results
+    keep = (indices[0] >= 0) & (distances[0] < distance_threshold)
+    dense_ids = indices[0][keep]
+    if metadata is not None and metadata.boosted and len(dense_ids) > 1:
+        # Source-type boost on cosine similarity; on unit vectors +b cosine is -2b squared L2.
+        # The threshold above still sees the raw distance, so a boost only reorders.
+        boosted = distances[0][keep] - 2.0 * metadata.boosts(dense_ids)
+        dense_ids = dense_ids[np.argsort(boosted, kind="stable")]
+    dense_ids = [int(i) for i in dense_ids]
 
-    filtered_chunks = []
-    for i, idx in enumerate(indices[0]):
-        if distances[0][i] < distance_threshold:
-            filtered_chunks.append(chunks[idx])
+    ranked = dense_ids
+    if mode == "hybrid" and lexical_index is not None:
+        # Exact-term matches ("Mardia's test", "cokriging") the embedding misses
+        with span("lexical"):
+            mask = selection.lexical_mask(lexical_index) if selection is not None else None
+            lexical_ids, _ = lexical_index.search(question, fetch_k, mask=mask)
+        ranked = reciprocal_rank_fusion([dense_ids, [int(i) for i in lexical_ids]])
 
-    if not filtered_chunks:
-        print("⚠️ No chunks passed distance threshold. Using top-1 fallback.")
+    if not ranked and fallback_ids:
+        # A follow-up that matches nothing on its own keeps the conversation's context
+        FALLBACKS.inc(reason="session_prior")
+        return chunks_for_ids(chunks, fallback_ids[:k])
+    if not ranked:
+        if indices[0][0] < 0:
+            return []  # the filter left nothing to fall back on
+        FALLBACKS.inc(reason="threshold_top1")
+        logger.debug("retrieval fallback=top1 threshold=%s", distance_threshold)
         return [chunks[indices[0][0]]]
 
-    return filtered_chunks
+    candidates = [chunks[idx] for idx in ranked[:candidate_k]]
+    if reranker is not None and len(candidates) > 1:
+        # Cross-encoder picks the best few; degrades to this order if over budget
+        with span("rerank"):
+            candidates = reranker.rerank(question, candidates, top_n=k)
+    return candidates[:k]
 
-# --- Main RAG Pipeline ---
-def query_rag_pipeline(question, embedding_model, faiss_index, chunks, llm_pipeline, tokenizer, k=3, max_tokens=150):
-    print(f"🧠 Question: {question}")
+def retrieve_for_session(question, session, embedding_model, faiss_index, chunks, k=3, query_embedding=None,
+                         hits=None, retrieval_options=None):
+    """
+    Retrieval for a conversation turn. A follow-up close to the previous turn
+    reuses its chunks without searching; otherwise the query embedding is
+    blended with the previous turn's, so "and how does it scale?" still
+    searches the right topic, and the previous chunks replace the top-1
+    fallback. Previous chunks outside the request's source filter are dropped.
+    """
+    options = retrieval_options or {}
+    prev = session.last_turn()
+    selection = select_chunks(**options)
+    prior_ids = [] if prev is None else [i for i in prev["chunk_ids"] if selection is None or i in selection]
+    if not prior_ids:
+        SESSION_TURNS.inc(retrieval="fresh")
+        return retrieve_relevant_chunks(question, embedding_model, faiss_index, chunks, k,
+                                        query_embedding=query_embedding, hits=hits, **options)
+
+    if query_embedding is None:
+        query_embedding = encode_query(question, embedding_model)
+    q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    if float(q @ prev["embedding"]) >= SESSION_REUSE_SIM:
+        SESSION_TURNS.inc(retrieval="reuse")
+        return chunks_for_ids(chunks, prior_ids[:k])
 
-    # 1. Retrieve top-k chunks
-    retrieved_chunks = retrieve_relevant_chunks(question, embedding_model, faiss_index, chunks, k)
-    texts = [chunk["text"] if isinstance(chunk, dict) else str(chunk) for chunk in retrieved_chunks]
+    SESSION_TURNS.inc(retrieval="merge")
+    blended = q + SESSION_CARRY * prev["embedding"]
+    blended = (blended / np.linalg.norm(blended)).reshape(1, -1)
+    return retrieve_relevant_chunks(f"{prev['question']} {question}", embedding_model, faiss_index, chunks, k,
+                                    query_embedding=blended, fallback_ids=prior_ids, **options)
 
-    # 2. Preview
-    print("📚 Context preview:")
-    for i, txt in enumerate(texts, 1):
-        print(f"[{i}] {txt[:150]}...\n")
+# --- Prompt Assembly ---
+def build_prompt(question, embedding_model, faiss_index, chunks, tokenizer, k=3, query_embedding=None, hits=None,
+                 max_tokens=150, retrieval_options=None, retrieved_chunks=None, history=None):
+    # 1. Retrieve top-k chunks (unless the caller already did, e.g. for a session turn)
+    if retrieved_chunks is None:
+        retrieved_chunks = retrieve_relevant_chunks(
+            question, embedding_model, faiss_index, chunks, k, query_embedding=query_embedding, hits=hits,
+            **(retrieval_options or {})
+        )
 
-    # 3. Truncate context to avoid overflow
+    # 2. Pack whole chunks into the token budget, sending chunk overlaps once;
+    #    the question and conversation history come out of the same budget
+    history_tokens = tokenizer(history) if history else 0
+    if history_tokens > SESSION_HISTORY_TOKENS:
+        # Keep the most recent end of an overlong history
+        history = "…" + history[-int(SESSION_HISTORY_TOKENS * CHARS_PER_TOKEN):]
+        history_tokens = tokenizer(history)
+    budget = max(0, CONTEXT_TOKEN_BUDGET - history_tokens - tokenizer(question))
+    with span("pack"):
+        texts = pack_context(retrieved_chunks, tokenizer, budget=budget, max_new_tokens=max_tokens)
     context = "\n".join(texts)
-    context_tokens = tokenizer.encode(context, truncation=True, max_length=350)
-    context = tokenizer.decode(context_tokens)
 
-    # 4. Prompt template
+    # 3. Prompt template
+    conversation = f"Conversation so far:\n{history}\n\n" if history else ""
     prompt = (
         "You are an expert dissertation assistant.\n"
         "Based on the context, answer the user's question in 2–3 clear sentences.\n\n"
         f"Context:\n{context}\n\n"
+        f"{conversation}"
         f"Question: {question}\n\n"
         "Answer only:"
     )
 
-    # 5. Debug Prompt
-    print("📝 Prompt preview:\n", prompt[:800], "\n...")
-    print("🧪 Sending to LLM...")
+    # 4. Sampled debug detail (stdout writes on every request were hot-path I/O)
+    if sampled():
+        logger.debug("prompt question=%r chunks=%s previews=%r prompt_chars=%d", question,
+                     [c.get("id") for c in retrieved_chunks], [t[:150] for t in texts], len(prompt))
+    return prompt
+
+def shared_query(session=None, retrieval_options=None):
+    # Retrieval and answer depend on the question alone: no conversation so far
+    # and no source filter. Only these use the answer cache and the micro-batcher.
+    followup = session is not None and session.last_turn() is not None
+    return not followup and not (retrieval_options or {}).get("source_filter")
+
+def prepare_query(question, embedding_model, faiss_index, chunks, tokenizer, k=3, answer_cache=None, batched=None,
+                  retrieval_options=None, session=None):
+    """
+    Embed the question once, consult the answer cache, and only on a miss run
+    retrieval + prompt assembly. Returns (query_embedding, cached_answer, prompt);
+    exactly one of cached_answer / prompt is set.
+
+    `batched` is the (query_embedding, distances, indices) triple produced by
+    QueryBatcher; when given, no encode/search happens here. `retrieval_options`
+    are extra keyword arguments for retrieve_relevant_chunks (e.g. lexical_index).
+
+    With a `session`, the turn's retrieval goes through retrieve_for_session
+    and is recorded on it, and the prompt carries a compact history window.
+    Follow-ups and source-filtered queries skip the answer cache: their answer
+    depends on more than the question. A filter that leaves no chunks returns
+    NO_MATCH_ANSWER as the answer, without a prompt.
+    """
+    shared = shared_query(session, retrieval_options)
+    hits = None
+    if batched is not None:
+        query_embedding, distances, indices = batched
+        hits = (distances, indices)
+    else:
+        query_embedding = encode_query(question, embedding_model)
+    if answer_cache is not None and shared:
+        cached = answer_cache.lookup(query_embedding[0])
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            logger.debug("answer_cache hit question=%r", question)
+            if session is not None:
+                # Still retrieve (no prompt, no LLM): the next follow-up builds on these chunks
+                retrieved_chunks = retrieve_relevant_chunks(
+                    question, embedding_model, faiss_index, chunks, k, query_embedding=query_embedding, hits=hits,
+                    **(retrieval_options or {})
+                )
+                session.add_turn(question, query_embedding[0], [c["id"] for c in retrieved_chunks])
+                session.finish_turn(question, cached)
+            return query_embedding, cached, None
+
+    history = None
+    if session is not None:
+        retrieved_chunks = retrieve_for_session(
+            question, session, embedding_model, faiss_index, chunks, k,
+            query_embedding=query_embedding, hits=hits, retrieval_options=retrieval_options
+        )
+        history = session.history(SESSION_HISTORY_TURNS, SESSION_HISTORY_CHARS)
+        session.add_turn(question, query_embedding[0], [c["id"] for c in retrieved_chunks])
+    else:
+        retrieved_chunks = retrieve_relevant_chunks(
+            question, embedding_model, faiss_index, chunks, k, query_embedding=query_embedding, hits=hits,
+            **(retrieval_options or {})
+        )
+    if not retrieved_chunks:
+        # Only a source filter can leave nothing; don't ask the LLM to answer without context
+        FALLBACKS.inc(reason="filter_empty")
+        if session is not None:
+            session.finish_turn(question, NO_MATCH_ANSWER)
+        return query_embedding, NO_MATCH_ANSWER, None
+    prompt = build_prompt(
+        question, embedding_model, faiss_index, chunks, tokenizer, k,
+        query_embedding=query_embedding, hits=hits, retrieval_options=retrieval_options,
+        retrieved_chunks=retrieved_chunks, history=history
+    )
+    return query_embedding, None, prompt
+
+async def aprepare_query(question, embedding_model, faiss_index, chunks, tokenizer, k=3, answer_cache=None, batcher=None,
+                         retrieval_options=None, session=None):
+    # Retrieval is CPU-bound: keep it off the event loop on the bounded executor.
+    # Follow-ups (blended embedding) and filtered queries (ID selector) bypass the batcher.
+    batched = None
+    if batcher is not None and shared_query(session, retrieval_options):
+        batched = await batcher.search(question, dense_fetch_k(k, **(retrieval_options or {})))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_retrieval_executor(),
+        partial(prepare_query, question, embedding_model, faiss_index, chunks, tokenizer, k, answer_cache, batched,
+                retrieval_options=retrieval_options, session=session),
+    )
+
+# --- Main RAG Pipeline ---
+def query_rag_pipeline(question, embedding_model, faiss_index, chunks, llm_pipeline, tokenizer, k=3, max_tokens=150,
+                       answer_cache=None, retrieval_options=None, session=None):
+    shared = shared_query(session, retrieval_options)
+    query_embedding, cached, prompt = prepare_query(
+        question, embedding_model, faiss_index, chunks, tokenizer, k, answer_cache,
+        retrieval_options=retrieval_options, session=session
+    )
+    if cached is not None:
+        return cached
+
+    try:
+        with span("llm"):
+            response = llm_pipeline(prompt, max_new_tokens=max_tokens)
+    except Exception as e:
+        LLM_ERRORS.inc(kind=type(e).__name__)
+        raise
+    answer = response[0]["generated_text"].strip()
+    if session is not None:
+        session.finish_turn(question, answer)
+    if answer_cache is not None and answer and shared:
+        answer_cache.store(query_embedding[0], question, answer)
+    return answer
+
+async def aquery_rag_pipeline(question, embedding_model, faiss_index, chunks, allm_pipeline, tokenizer, k=3, max_tokens=150,
+                              answer_cache=None, batcher=None, retrieval_options=None, session=None):
+    shared = shared_query(session, retrieval_options)
+    query_embedding, cached, prompt = await aprepare_query(
+        question, embedding_model, faiss_index, chunks, tokenizer, k, answer_cache, batcher,
+        retrieval_options=retrieval_options, session=session
+    )
+    if cached is not None:
+        return cached
+
+    # The LLM call is network-bound: await it so concurrent requests overlap
+    try:
+        with span("llm"):
+            response = await allm_pipeline(prompt, max_new_tokens=max_tokens)
+    except Exception as e:
+        LLM_ERRORS.inc(kind=type(e).__name__)
+        raise
+    answer = response[0]["generated_text"].strip()
+    if session is not None:
+        session.finish_turn(question, answer)
+    if answer_cache is not None and answer and shared:
+        answer_cache.store(query_embedding[0], question, answer)
+    return answer
+
+async def astream_rag_pipeline(question, embedding_model, faiss_index, chunks, astream_llm, tokenizer, k=3, max_tokens=150,
+                               answer_cache=None, batcher=None, retrieval_options=None, session=None):
+    shared = shared_query(session, retrieval_options)
+    query_embedding, cached, prompt = await aprepare_query(
+        question, embedding_model, faiss_index, chunks, tokenizer, k, answer_cache, batcher,
+        retrieval_options=retrieval_options, session=session
+    )
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    t0 = time.perf_counter()
+    try:
+        async for token in astream_llm(prompt, max_new_tokens=max_tokens):
+            if not parts:
+                STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_first_token")
+            parts.append(token)
+            yield token
+    except Exception as e:
+        LLM_ERRORS.inc(kind=type(e).__name__)
+        raise
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_stream")
 
-    # 6. Run through local LLM
-    response = llm_pipeline(prompt, max_new_tokens=max_tokens)
-    return response[0]["generated_text"].strip()
+    # Only cache completions that streamed to the end
+    answer = "".join(parts).strip()
+    if session is not None:
+        session.finish_turn(question, answer)
+    if answer_cache is not None and answer and shared:
+        answer_cache.store(query_embedding[0], question, answer)
 
 # --- Test Run ---
 if __name__ == "__main__":
+    from .telemetry import configure_logging
+    configure_logging()
     print("🔧 Loading components...")
     chunks = load_chunks()
     embedding_model = load_embedding_model()
     faiss_index = load_faiss_index()
     tokenizer = load_tokenizer()
+    lexical_index = load_lexical_index()
     llm_pipeline = load_llm(mode="local")  # 👈 Local dev
 
     test_question = "What is Multiple-Response Regression?"
-    answer = query_rag_pipeline(test_question, embedding_model, faiss_index, chunks, llm_pipeline, tokenizer)
+    answer = query_rag_pipeline(test_question, embedding_model, faiss_index, chunks, llm_pipeline, tokenizer,
+                                retrieval_options={"lexical_index": lexical_index})
     print("💬 Answer:\n", answer)
 
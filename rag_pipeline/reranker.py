@@ -0,0 +1,74 @@
+# rag_pipeline/reranker.py
+import time
+from typing import Dict, List
+
+from .telemetry import FALLBACKS, logger
+
+ESTIMATE_DECAY = 0.95  # per degraded request, so a stale (too high) batch-cost estimate lets scoring back in
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores (question, chunk) pairs with a small cross-encoder on CPU, in
+    mini-batches, under a per-request time budget. The cost of one batch is
+    tracked as a moving average; if the next batch would push a request past
+    `budget_ms`, scoring stops and the candidates keep their retrieval order.
+    Each degraded request shrinks the estimate a little, so one slow batch
+    can't switch reranking off for good: scoring resumes and re-measures.
+    """
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=8,
+                 budget_ms=150.0, max_length=256):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+
+        self.reranked = 0
+        self.degraded = 0
+        self._batch_ms = None  # moving average of one batch's scoring time
+
+    def warmup(self):
+        # First predict pays for lazy init; the second, warm one seeds the batch-cost estimate
+        self._score("warm up", ["warm up"] * self.batch_size)
+        self._batch_ms = None
+        self._score("warm up", ["warm up"] * self.batch_size)
+
+    def _score(self, question: str, texts: List[str]):
+        t0 = time.perf_counter()
+        scores = self.model.predict(
+            [(question, t) for t in texts],
+            batch_size=len(texts),
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+        ms = (time.perf_counter() - t0) * 1000 * self.batch_size / max(1, len(texts))
+        self._batch_ms = ms if self._batch_ms is None else 0.8 * self._batch_ms + 0.2 * ms
+        return scores
+
+    def rerank(self, question: str, candidates: List[Dict], top_n: int = 3, budget_ms: float = None) -> List[Dict]:
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        t0 = time.perf_counter()
+        scores = []
+        for start in range(0, len(candidates), self.batch_size):
+            elapsed = (time.perf_counter() - t0) * 1000
+            if self._batch_ms is not None and elapsed + self._batch_ms > budget_ms:
+                self.degraded += 1
+                self._batch_ms *= ESTIMATE_DECAY
+                FALLBACKS.inc(reason="rerank_budget")
+                logger.debug("rerank fallback=retrieval_order budget_ms=%.0f scored=%d", budget_ms, start)
+                return candidates[:top_n]
+            batch = candidates[start:start + self.batch_size]
+            scores.extend(float(s) for s in self._score(question, [c["text"] for c in batch]))
+
+        self.reranked += 1
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return [candidates[i] for i in order[:top_n]]
+
+    def stats(self):
+        return {
+            "reranked": self.reranked,
+            "degraded": self.degraded,
+            "batch_ms_estimate": self._batch_ms,
+            "budget_ms": self.budget_ms,
+        }
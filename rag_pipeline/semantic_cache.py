@@ -0,0 +1,177 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# --- Semantic answer cache ---
+class SemanticCache:
+    """
+    Answer cache keyed on the query embedding. A lookup hits when the cosine
+    similarity to a stored question passes `threshold`. Entries are evicted
+    LRU-first when `max_entries` or `max_bytes` is exceeded, expire after
+    `ttl_seconds`, and are all dropped whenever one of `watch_files`
+    (the FAISS index / chunk store) changes on disk.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=1024, ttl_seconds=24 * 3600,
+                 max_bytes=64 * 1024 * 1024, persist_path=None, watch_files=()):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self.watch_files = list(watch_files)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> (question, answer, created_at, nbytes), LRU order
+        self._vectors = None           # (max_entries, dim) float32, rows indexed by slot
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._bytes = 0
+        self._fingerprint = self._current_fingerprint()
+
+        if self.persist_path and os.path.exists(self.persist_path):
+            self._load()
+
+    # --- Invalidation ---
+    def _current_fingerprint(self):
+        fp = []
+        for path in self.watch_files:
+            try:
+                st = os.stat(path)
+                fp.append((str(path), st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                fp.append((str(path), None, None))
+        return tuple(fp)
+
+    def _check_fingerprint(self):
+        current = self._current_fingerprint()
+        if current != self._fingerprint:
+            self._clear()
+            self._fingerprint = current
+            self.invalidations += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._valid[:] = False
+        self._bytes = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    # --- Lookup / store ---
+    @staticmethod
+    def _normalise(embedding):
+        v = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        n = np.linalg.norm(v)
+        return v / n if n > 0 else v
+
+    def lookup(self, embedding):
+        q = self._normalise(embedding)
+        with self._lock:
+            self._check_fingerprint()
+            if self._vectors is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            sims = self._vectors @ q
+            sims[~self._valid] = -np.inf
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                self.misses += 1
+                return None
+
+            question, answer, created_at, _ = self._entries[slot]
+            if time.time() - created_at > self.ttl_seconds:
+                self._evict(slot)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return answer
+
+    def store(self, embedding, question, answer, created_at=None):
+        v = self._normalise(embedding)
+        nbytes = v.nbytes + len(question.encode("utf-8")) + len(answer.encode("utf-8"))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._check_fingerprint()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, v.shape[0]), dtype=np.float32)
+
+            while self._entries and (
+                len(self._entries) >= self.max_entries or self._bytes + nbytes > self.max_bytes
+            ):
+                self._evict(next(iter(self._entries)))
+
+            slot = int(np.argmin(self._valid))  # first free slot
+            self._vectors[slot] = v
+            self._valid[slot] = True
+            self._entries[slot] = (question, answer, created_at or time.time(), nbytes)
+            self._bytes += nbytes
+
+    def _evict(self, slot):
+        _, _, _, nbytes = self._entries.pop(slot)
+        self._valid[slot] = False
+        self._bytes -= nbytes
+        self.evictions += 1
+
+    # --- Stats ---
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+            }
+
+    # --- Persistence ---
+    def save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            slots = list(self._entries)
+            state = {
+                "fingerprint": self._fingerprint,
+                "vectors": self._vectors[slots] if slots else None,
+                "entries": [self._entries[s] for s in slots],
+            }
+        tmp = f"{self.persist_path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp, self.persist_path)
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable answer cache {self.persist_path}: {e}")
+            return
+        if state.get("fingerprint") != self._fingerprint or state.get("vectors") is None:
+            print("♻️ Answer cache is stale (index/chunks changed); starting empty.")
+            return
+
+        now = time.time()
+        for vec, entry in zip(state["vectors"], state["entries"]):
+            if now - entry[2] <= self.ttl_seconds:
+                self.store(vec, entry[0], entry[1], created_at=entry[2])
+        print(f"✅ Restored {len(self._entries)} cached answers.")
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+# --- Conversation sessions ---
+class Session:
+    """
+    One conversation: the last few turns, each with the question, its
+    embedding, the chunk ids retrieval settled on, and (once generated) the
+    answer.
+    """
+
+    def __init__(self, session_id, max_turns=8):
+        self.session_id = session_id
+        self.turns = deque(maxlen=max_turns)   # dicts: question, embedding, chunk_ids, answer
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    def last_turn(self):
+        with self._lock:
+            return self.turns[-1] if self.turns else None
+
+    def add_turn(self, question, embedding, chunk_ids):
+        turn = {
+            "question": question,
+            "embedding": np.asarray(embedding, dtype=np.float32).reshape(-1),
+            "chunk_ids": list(chunk_ids),
+            "answer": None,
+        }
+        with self._lock:
+            self.turns.append(turn)
+        return turn
+
+    def finish_turn(self, question, answer):
+        # Latest unanswered turn for this question (the UI sends one at a time)
+        with self._lock:
+            for turn in reversed(self.turns):
+                if turn["question"] == question and turn["answer"] is None:
+                    turn["answer"] = answer
+                    return
+
+    def history(self, n_turns=2, answer_chars=300):
+        """Compact window of the last `n_turns` answered turns, oldest first."""
+        with self._lock:
+            answered = [t for t in self.turns if t["answer"]][-n_turns:] if n_turns > 0 else []
+        lines = []
+        for t in answered:
+            answer = t["answer"] if len(t["answer"]) <= answer_chars else t["answer"][:answer_chars].rstrip() + "…"
+            lines.append(f"Q: {t['question']}\nA: {answer}")
+        return "\n".join(lines)
+
+
+class SessionStore:
+    """
+    Bounded in-memory session store: at most `max_sessions`, evicted LRU-first,
+    and sessions idle for longer than `idle_seconds` are dropped. Per process;
+    with several uvicorn workers a follow-up that lands on another worker just
+    starts a fresh session.
+    """
+
+    def __init__(self, max_sessions=1000, idle_seconds=1800, max_turns=8):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_turns = max_turns
+
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session_id -> Session, least recently used first
+
+    def _expire(self, now):
+        # LRU order is last-used order, so idle sessions sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+
+    def get(self, session_id, create=True):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if not create:
+                    return None
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+                session = Session(session_id, self.max_turns)
+                self._sessions[session_id] = session
+                self.created += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    # --- Stats ---
+    def stats(self):
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "sessions": len(self._sessions),
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "max_sessions": self.max_sessions,
+                "idle_seconds": self.idle_seconds,
+            }
@@ -0,0 +1,199 @@
+# rag_pipeline/source_filter.py
+# Metadata-aware retrieval: restrict a query to the dissertation, to the
+# references, or to named source documents, and nudge chunks of preferred
+# source types up the dense ranking. Filters are applied inside the search
+# itself (a FAISS IDSelectorBitmap over chunk ids, a mask over the BM25
+# scores), so a filtered query costs the same as an unfiltered one instead of
+# over-fetching the whole corpus and post-filtering.
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from .chunk_store import ChunkStore
+from .embeddings_store import base_index
+
+# --- Filter knobs ---
+FILTER_CACHE_SIZE = int(os.environ.get("RAG_FILTER_CACHE_SIZE", "64"))   # distinct filters kept built
+
+
+def parse_boosts(spec: str) -> Dict[str, float]:
+    """'dissertation=0.03,reference=0' -> {"dissertation": 0.03, "reference": 0.0}"""
+    boosts = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        boosts[name.strip()] = float(value)
+    return boosts
+
+
+# Added to the cosine similarity of dense hits, as map_questions.py does offline
+SOURCE_BOOST = parse_boosts(os.environ.get("RAG_SOURCE_BOOST", "dissertation=0.03"))
+
+
+# --- Filters ---
+class SourceFilter(NamedTuple):
+    source_types: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()
+
+
+def _names(value, field) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value):
+        raise ValueError(f"filters.{field} must be a string or a list of strings")
+    return tuple(sorted(set(value)))
+
+
+def parse_filter(raw) -> Optional[SourceFilter]:
+    """
+    {"source_type": "dissertation" | [...], "sources": ["Parallelisation.pdf", ...]}
+    -> SourceFilter, or None for no filter. Both fields must match when given.
+    Raises ValueError on a malformed body.
+    """
+    if raw is None:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("filters must be an object")
+    source_filter = SourceFilter(
+        source_types=_names(raw.get("source_type", raw.get("source_types")), "source_type"),
+        sources=_names(raw.get("sources", raw.get("source")), "sources"),
+    )
+    return source_filter if source_filter.source_types or source_filter.sources else None
+
+
+class Selection:
+    """
+    The chunk ids one filter allows, with the FAISS selector and BM25 mask
+    built from them. The bitmap is indexed by chunk id (ids are dense and
+    ascending), so membership is one bit test whatever the partition size.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+        n_bits = int(ids[-1]) + 1 if len(ids) else 1
+        self.bitmap = np.zeros((n_bits + 7) // 8, dtype=np.uint8)
+        np.bitwise_or.at(self.bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        # Sized in bytes; the selector reads the bitmap in place, self.bitmap keeps it alive
+        self.selector = faiss.IDSelectorBitmap(len(self.bitmap), faiss.swig_ptr(self.bitmap))
+        self._lexical = (None, None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, chunk_id) -> bool:
+        chunk_id = int(chunk_id)
+        return 0 <= chunk_id < len(self.bitmap) * 8 and bool(self.bitmap[chunk_id >> 3] & (1 << (chunk_id & 7)))
+
+    def search_params(self, faiss_index):
+        # Carry the index's own nprobe / efSearch: per-call params replace them
+        index = base_index(faiss_index)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=self.selector, efSearch=index.hnsw.efSearch)
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=self.selector, nprobe=index.nprobe)
+        return faiss.SearchParameters(sel=self.selector)
+
+    def lexical_mask(self, lexical_index) -> np.ndarray:
+        index, mask = self._lexical
+        if index is not lexical_index:
+            mask = np.isin(lexical_index.chunk_ids, self.ids)
+            self._lexical = (lexical_index, mask)
+        return mask
+
+
+# --- Chunk metadata ---
+class ChunkMetadata:
+    """
+    source / source_type of every chunk as code columns aligned with the
+    sorted chunk ids, plus an LRU of built Selections. Read straight from the
+    chunk store's columns; legacy dict chunks are scanned once.
+
+    Near-duplicate aliases (dedup.py) aren't in the indexes, so a filter
+    selects their canonical chunks instead: filtering on a source whose text
+    was folded into another document still finds that text.
+    """
+
+    def __init__(self, chunks, boosts: Dict[str, float] = None, aliases: Dict[int, int] = None):
+        if isinstance(chunks, ChunkStore):
+            self.ids = np.asarray(chunks.ids, dtype=np.int64)
+            self.sources = list(chunks.sources)
+            self.source_types = list(chunks.source_types)
+            self.source_codes = np.asarray(chunks.source_codes)
+            self.source_type_codes = np.asarray(chunks.source_type_codes)
+        else:
+            rows = sorted(chunks.values() if hasattr(chunks, "values") else chunks, key=lambda ch: ch["id"])
+            sources, source_types = {}, {}
+            self.ids = np.array([ch["id"] for ch in rows], dtype=np.int64)
+            self.source_codes = np.array([sources.setdefault(ch.get("source", ""), len(sources)) for ch in rows],
+                                         dtype=np.int32)
+            self.source_type_codes = np.array(
+                [source_types.setdefault(ch.get("source_type", "reference"), len(source_types)) for ch in rows],
+                dtype=np.int8)
+            self.sources, self.source_types = list(sources), list(source_types)
+
+        # Chunk id each row is retrieved as: itself, or the canonical chunk it's an alias of
+        self.retrieved_ids = self.ids.copy()
+        if aliases:
+            alias_ids = np.fromiter(aliases.keys(), dtype=np.int64, count=len(aliases))
+            canonical = np.fromiter(aliases.values(), dtype=np.int64, count=len(aliases))
+            pos = np.searchsorted(self.ids, alias_ids)
+            found = (pos < len(self.ids)) & (self.ids[np.minimum(pos, len(self.ids) - 1)] == alias_ids)
+            self.retrieved_ids[pos[found]] = canonical[found]
+
+        boosts = SOURCE_BOOST if boosts is None else boosts
+        self.type_boost = np.array([boosts.get(t, 0.0) for t in self.source_types], dtype=np.float32)
+        self.boosted = bool(np.any(self.type_boost))
+
+        self._lock = threading.Lock()
+        self._selections = OrderedDict()  # SourceFilter -> Selection, least recently used first
+
+    def boosts(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        pos = np.searchsorted(self.ids, np.asarray(chunk_ids, dtype=np.int64))
+        return self.type_boost[self.source_type_codes[np.minimum(pos, len(self.ids) - 1)]]
+
+    def unknown(self, source_filter: SourceFilter):
+        """Names in the filter that no chunk carries."""
+        return ([t for t in source_filter.source_types if t not in self.source_types]
+                + [s for s in source_filter.sources if s not in self.sources])
+
+    def selection(self, source_filter: SourceFilter) -> Selection:
+        with self._lock:
+            selection = self._selections.get(source_filter)
+            if selection is not None:
+                self._selections.move_to_end(source_filter)
+                return selection
+
+        keep = np.ones(len(self.ids), dtype=bool)
+        if source_filter.source_types:
+            codes = [self.source_types.index(t) for t in source_filter.source_types if t in self.source_types]
+            keep &= np.isin(self.source_type_codes, codes)
+        if source_filter.sources:
+            codes = [self.sources.index(s) for s in source_filter.sources if s in self.sources]
+            keep &= np.isin(self.source_codes, codes)
+        selection = Selection(np.unique(self.retrieved_ids[keep]))
+
+        with self._lock:
+            self._selections[source_filter] = selection
+            while len(self._selections) > FILTER_CACHE_SIZE:
+                self._selections.popitem(last=False)
+        return selection
+
+    def _retrievable(self, codes: np.ndarray, n_names: int) -> np.ndarray:
+        # Distinct retrievable chunks per name: aliases count once, as their canonical chunk
+        pairs = np.unique(np.stack([codes.astype(np.int64), self.retrieved_ids]), axis=1)
+        return np.bincount(pairs[0], minlength=n_names)
+
+    def catalog(self) -> Dict:
+        """Retrievable chunks per source type and per source, for building filters."""
+        type_counts = self._retrievable(self.source_type_codes, len(self.source_types))
+        source_counts = self._retrievable(self.source_codes, len(self.sources))
+        return {
+            "source_types": {t: int(n) for t, n in zip(self.source_types, type_counts)},
+            "sources": {s: int(n) for s, n in zip(self.sources, source_counts)},
+            "boosts": {t: float(b) for t, b in zip(self.source_types, self.type_boost) if b},
+        }
@@ -0,0 +1,437 @@
+# rag_pipeline/stream_ingest.py
+# Streaming rebuild, pages to index: extract → split → embed → append, each
+# stage on its own thread with bounded queues in between. At most a few
+# documents' text and a couple of embedding batches are in flight, and every
+# row is appended to disk as soon as it is embedded, so peak memory no longer
+# grows with docs/. Progress is checkpointed after each document; an
+# interrupted run picks up from the last checkpoint. The chunk store, FAISS
+# index, embeddings, lexical index and manifest are only swapped in once the
+# whole run has finished, so the serving files are never half-written.
+# Near-duplicate chunks are folded out of both indexes at install (dedup.py).
+#
+#   python -m rag_pipeline.stream_ingest [--full] [--batch-size 64] [--restart] [--serial]
+import os
+import json
+import queue
+import shutil
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+import faiss
+
+from .chunk_store import CHUNK_STORE_DIR, ChunkStore, ChunkStoreAppender, chunk_store_exists, open_chunks
+from .data_ingestion import (
+    DOCS_DIR, INGEST_WORKERS, extract_documents, file_sha256, join_pages, load_manifest, save_manifest,
+    source_type_from_name, split_text,
+)
+from .dedup import dedup_chunks
+from .embedding_cache import EMBEDDING_CACHE_ENABLED, EmbeddingCache
+from .embeddings_store import (
+    DATA_DIR, EMBEDDING_IDS_FILE, EMBEDDINGS_FILE, FAISS_INDEX_FILE, INDEX_CONFIG_FILE, INDEX_TYPE, METRIC,
+    build_faiss_index, create_faiss_index, indexed_rows, prepare_vectors,
+)
+from .lexical_index import LEXICAL_INDEX_DIR, LexicalIndex
+
+# --- Streaming knobs ---
+STAGING_DIR = DATA_DIR / "ingest_staging"
+CHECKPOINT_FILE = "checkpoint.json"
+VECTORS_FILE = "vectors.f32"
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+EMBED_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "64"))   # chunks per encode call
+QUEUE_DOCS = int(os.environ.get("INGEST_QUEUE_DOCS", "2"))          # extracted documents waiting to be split
+QUEUE_ROWS = int(os.environ.get("INGEST_QUEUE_ROWS", "256"))        # split chunks waiting to be embedded
+QUEUE_BATCHES = int(os.environ.get("INGEST_QUEUE_BATCHES", "2"))    # embedded batches waiting to be written
+COPY_BLOCK = 4096                                                    # rows per block when copying vectors
+
+
+# --- Bounded hand-off between stages ---
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+def threaded(iterable: Iterable, maxsize: int, stop: threading.Event) -> Iterator:
+    """
+    Consume `iterable` on a background thread and yield its items through a
+    queue of at most `maxsize`: the producer blocks when the consumer falls
+    behind, which is what bounds memory. Errors re-raise in the consumer;
+    setting `stop` ends the producer.
+    """
+    q = queue.Queue(maxsize=max(1, maxsize))
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failed(e))
+
+    threading.Thread(target=pump, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+
+# --- Stages ---
+def extract_stage(pdfs: List[Path], digests: Dict[str, str], workers: int) -> Iterator:
+    # One document at a time over a single pool for the whole run; the page
+    # cache makes re-runs cheap
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and pdfs else None
+    try:
+        for pdf in pdfs:
+            pages = extract_documents([pdf], digests, workers, pool=pool)[pdf.name]
+            yield pdf, digests[pdf.name], join_pages(pdf.name, pages)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def split_stage(documents: Iterable, next_id: int) -> Iterator[Dict]:
+    """
+    Chunk rows with fresh ids, then one {"document": ...} marker per document
+    once all of its rows have been yielded.
+    """
+    for pdf, digest, text in documents:
+        print(f"[ingest] {pdf.name}")
+        if not text.strip():
+            print("  [skip] no extractable text")
+        chunk_ids = []
+        for ch in split_text(text):
+            yield {"id": next_id, "source": pdf.name, "source_type": source_type_from_name(pdf.name), "text": ch}
+            chunk_ids.append(next_id)
+            next_id += 1
+        yield {"document": pdf.name, "sha256": digest, "chunk_ids": chunk_ids, "next_id": next_id}
+
+
+def kept_stage(previous, kept: set) -> Iterator[Dict]:
+    """
+    Rows of unchanged documents in id order, carrying their stored embedding
+    when there is one, then a single {"kept": ...} marker.
+    """
+    vectors = stored_ids = None
+    if EMBEDDINGS_FILE.exists() and EMBEDDING_IDS_FILE.exists():
+        vectors = np.load(EMBEDDINGS_FILE, mmap_mode="r")
+        stored_ids = np.load(EMBEDDING_IDS_FILE)
+    for chunk_id in sorted(previous):
+        ch = previous[chunk_id]
+        if ch["source"] not in kept:
+            continue
+        row = dict(ch)
+        if stored_ids is not None:
+            pos = int(np.searchsorted(stored_ids, chunk_id))
+            if pos < len(stored_ids) and stored_ids[pos] == chunk_id:
+                row["vector"] = np.asarray(vectors[pos], dtype=np.float32)
+        yield row
+    yield {"kept": sorted(kept)}
+
+
+def embed_stage(items: Iterable[Dict], encode, batch_size: int) -> Iterator[List[Dict]]:
+    """
+    Group rows into batches of `batch_size` and fill in "vector" for rows that
+    don't carry one, with one encode call per batch. Markers travel with the
+    batch they arrived in, after the rows before them.
+    """
+    batch, n_rows = [], 0
+
+    def flush():
+        todo = [it for it in batch if "text" in it and "vector" not in it]
+        if todo:
+            vectors = encode([it["text"] for it in todo])
+            for it, v in zip(todo, vectors):
+                it["vector"] = v
+        return batch
+
+    for item in items:
+        batch.append(item)
+        n_rows += "text" in item
+        if n_rows >= batch_size:
+            yield flush()
+            batch, n_rows = [], 0
+    if batch:
+        yield flush()
+
+
+def make_encoder(embedding_model=None, model_name: str = EMBED_MODEL):
+    # The model loads on the first encode that misses the embedding cache
+    cache = EmbeddingCache(model_name, normalize=True) if EMBEDDING_CACHE_ENABLED else None
+
+    def model_encode(texts):
+        nonlocal embedding_model
+        if embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            embedding_model = SentenceTransformer(model_name)
+        return embedding_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+    def encode(texts):
+        if cache is None:
+            return np.asarray(model_encode(texts), dtype=np.float32)
+        return cache.encode(texts, model_encode)
+
+    return encode
+
+
+# --- Vector staging + index ---
+class VectorAppender:
+    """
+    Embeddings appended to a raw float32 file as they arrive, and added to the
+    FAISS index batch by batch. Index types that need training (IVF) can't be
+    grown before all vectors exist, so those are built once at the end from
+    the memory-mapped file.
+    """
+
+    def __init__(self, staging: Path, index_type: str = INDEX_TYPE, metric: str = METRIC, dim: int = None,
+                 rows: int = 0, ids: np.ndarray = None):
+        self.path = Path(staging) / VECTORS_FILE
+        self.index_type = index_type
+        self.metric = metric
+        self.dim = dim
+        self.rows = rows
+        self.index = self.config = None
+        with open(self.path, "ab") as f:
+            f.truncate(rows * 4 * (dim or 0))
+        self._file = open(self.path, "ab")
+        if rows:
+            # Resuming: re-add what earlier runs appended (no re-encoding)
+            self._init_index()
+            if self.index is not None:
+                stored = np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, dim))
+                for start in range(0, rows, COPY_BLOCK):
+                    self._add(ids[start:start + COPY_BLOCK], np.asarray(stored[start:start + COPY_BLOCK]))
+
+    def _init_index(self):
+        if self.index is None and not self.index_type.startswith("ivf"):
+            self.index, self.config = create_faiss_index(self.dim, index_type=self.index_type, metric=self.metric)
+
+    def _add(self, ids, vectors):
+        self.index.add_with_ids(prepare_vectors(vectors, self.metric), np.asarray(ids, dtype=np.int64))
+
+    def append(self, ids, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self._file.write(vectors.tobytes())
+        self.rows += len(vectors)
+        self._init_index()
+        if self.index is not None:
+            self._add(ids, vectors)
+
+    def state(self) -> Dict:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"rows": self.rows, "dim": self.dim}
+
+    def commit(self, ids: np.ndarray, exclude_ids=()):
+        """
+        Install the FAISS index, its config, embeddings.npy and
+        embedding_ids.npy. `exclude_ids` (near-duplicate aliases) keep their
+        embedding rows but are dropped from the index.
+        """
+        self.state()
+        self._file.close()
+        stored = (np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+                  if self.rows else np.zeros((0, self.dim or 0), dtype=np.float32))
+        if self.index is not None and len(exclude_ids):
+            try:
+                self.index.remove_ids(np.fromiter(exclude_ids, dtype=np.int64))
+            except RuntimeError:
+                self.index = None  # HNSW can't delete; build once from the kept rows instead
+        if self.index is None:
+            keep = indexed_rows(ids, exclude_ids)
+            self.index, self.config = build_faiss_index(stored[keep], ids=ids[keep], index_type=self.index_type,
+                                                        metric=self.metric)
+        # Copy into a real .npy block by block rather than loading the whole matrix
+        tmp = EMBEDDINGS_FILE.with_name(EMBEDDINGS_FILE.name + ".tmp")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=stored.shape)
+        for start in range(0, self.rows, COPY_BLOCK):
+            out[start:start + COPY_BLOCK] = stored[start:start + COPY_BLOCK]
+        out.flush()
+        del out
+
+        index_tmp = FAISS_INDEX_FILE.with_name(FAISS_INDEX_FILE.name + ".tmp")
+        faiss.write_index(self.index, str(index_tmp))
+        os.replace(index_tmp, FAISS_INDEX_FILE)
+        config_tmp = INDEX_CONFIG_FILE.with_name(INDEX_CONFIG_FILE.name + ".tmp")
+        with open(config_tmp, "w", encoding="utf-8") as f:
+            json.dump(self.config, f, indent=2)
+        os.replace(config_tmp, INDEX_CONFIG_FILE)
+        os.replace(tmp, EMBEDDINGS_FILE)
+        ids_tmp = EMBEDDING_IDS_FILE.with_name(EMBEDDING_IDS_FILE.name + ".tmp")
+        with open(ids_tmp, "wb") as f:
+            np.save(f, ids)
+        os.replace(ids_tmp, EMBEDDING_IDS_FILE)
+        print(f"✅ Saved FAISS index to {FAISS_INDEX_FILE} and embeddings to {EMBEDDINGS_FILE}")
+        return self.index
+
+
+# --- Checkpoints ---
+def load_checkpoint(staging: Path = STAGING_DIR) -> Dict:
+    path = Path(staging) / CHECKPOINT_FILE
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(state: Dict, staging: Path = STAGING_DIR):
+    path = Path(staging) / CHECKPOINT_FILE
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def checkpoint_matches(state: Dict, plan: Dict) -> bool:
+    # Resume only the run that was interrupted: same settings, same kept
+    # documents, and every finished document still has the same content
+    if not state:
+        return False
+    if any(state.get(key) != plan[key] for key in ("full", "index_type", "metric", "kept_names")):
+        return False
+    return all(plan["digests"].get(name) == doc["sha256"] for name, doc in state["documents"].items()
+               if name not in plan["kept_names"])
+
+
+# --- Runner ---
+def count_by_source(previous) -> Counter:
+    if isinstance(previous, ChunkStore):
+        counts = np.bincount(np.asarray(previous.source_codes), minlength=len(previous.sources))
+        return Counter({name: int(n) for name, n in zip(previous.sources, counts)})
+    return Counter(ch["source"] for ch in previous.values())
+
+
+def run(full: bool = False, batch_size: int = EMBED_BATCH_SIZE, workers: int = INGEST_WORKERS,
+        restart: bool = False, embedding_model=None, index_type: str = INDEX_TYPE, metric: str = METRIC,
+        docs_dir: Path = DOCS_DIR, staging: Path = STAGING_DIR) -> int:
+    """
+    Rebuild the chunk store, FAISS index, embeddings and lexical index as a
+    stream. Same incremental rules as data_ingestion.rebuild: unchanged
+    documents keep their chunks, ids and stored embeddings; new or changed
+    ones get fresh ids. Returns the number of chunks in the new store.
+    """
+    assert Path(docs_dir).exists(), f"{docs_dir} not found"
+    manifest = load_manifest()
+    documents = {} if full else manifest["documents"]
+    previous = open_chunks() if not full and (chunk_store_exists() or (DATA_DIR / "chunks.pkl").exists()) else {}
+    counts = count_by_source(previous) if previous else Counter()
+
+    pdfs = sorted(Path(docs_dir).glob("*.pdf"))
+    digests = {pdf.name: file_sha256(pdf) for pdf in pdfs}
+    kept = {pdf.name for pdf in pdfs
+            if pdf.name in documents and documents[pdf.name]["sha256"] == digests[pdf.name]
+            and counts[pdf.name] == len(documents[pdf.name]["chunk_ids"])}
+    plan = {"full": full, "index_type": index_type, "metric": metric, "kept_names": sorted(kept), "digests": digests}
+
+    state = {} if restart else load_checkpoint(staging)
+    if state and not checkpoint_matches(state, plan):
+        print("♻️  Checkpoint is from a different run (docs or settings changed); starting over.")
+        state = {}
+    if not state and Path(staging).exists():
+        shutil.rmtree(staging)
+    if state:
+        print(f"⏯️  Resuming: {len(state['documents'])} document(s), {state['chunks']['rows']} chunks already staged")
+    state = state or {
+        "full": full, "index_type": index_type, "metric": metric, "kept_names": sorted(kept),
+        "kept_done": not kept, "next_id": manifest["next_id"], "documents": {},
+        "chunks": {}, "vectors": {},
+    }
+
+    chunk_out = ChunkStoreAppender(staging, state["chunks"])
+    vector_out = VectorAppender(staging, index_type, metric, dim=state["vectors"].get("dim"),
+                                rows=state["vectors"].get("rows", 0),
+                                ids=chunk_out.ids() if state["chunks"].get("rows") else None)
+    todo = [pdf for pdf in pdfs if pdf.name not in kept and pdf.name not in state["documents"]]
+    print(f"[ingest] kept: {len(kept)} | to process: {len(todo)} | batch: {batch_size}")
+
+    def write(rows):
+        if rows:
+            chunk_out.append(rows)
+            vector_out.append([r["id"] for r in rows], np.stack([r["vector"] for r in rows]))
+
+    def checkpoint():
+        state["chunks"] = chunk_out.state()
+        state["vectors"] = vector_out.state()
+        save_checkpoint(state, staging)
+
+    stop = threading.Event()
+    try:
+        kept_rows = kept_stage(previous, kept) if not state["kept_done"] else ()
+        new_rows = split_stage(threaded(extract_stage(todo, digests, workers), QUEUE_DOCS, stop), state["next_id"])
+        rows = threaded(chain(kept_rows, new_rows), QUEUE_ROWS, stop)
+        for batch in threaded(embed_stage(rows, make_encoder(embedding_model), batch_size), QUEUE_BATCHES, stop):
+            pending = []
+            for item in batch:
+                if "text" in item:
+                    pending.append(item)
+                    continue
+                write(pending)
+                pending = []
+                if "kept" in item:
+                    state["kept_done"] = True
+                    state["documents"].update({name: documents[name] for name in item["kept"]})
+                else:
+                    state["documents"][item["document"]] = {"sha256": item["sha256"], "chunk_ids": item["chunk_ids"]}
+                    state["next_id"] = item["next_id"]
+                    print(f"  [ok] checkpoint: {chunk_out.rows} chunks staged")
+                checkpoint()
+            write(pending)
+    finally:
+        stop.set()
+
+    # --- Install: chunk store, index + embeddings, lexical index, then the manifest ---
+    ids = chunk_out.ids()
+    n = chunk_out.commit(CHUNK_STORE_DIR)
+    store = ChunkStore(CHUNK_STORE_DIR)
+    aliases = dedup_chunks(store.values(), n)
+    vector_out.commit(ids, exclude_ids=aliases)
+    del vector_out  # free the FAISS index before the BM25 build so the two peaks don't stack
+    LexicalIndex.build(ch for ch in store.values() if ch["id"] not in aliases).save(LEXICAL_INDEX_DIR)
+    store.close()
+
+    removed = [name for name in documents if name not in digests]
+    manifest["documents"] = {name: state["documents"][name] for name in sorted(state["documents"])}
+    manifest["next_id"] = state["next_id"]
+    save_manifest(manifest)
+    shutil.rmtree(staging)
+    print(f"[ingest] kept: {len(kept)} | processed: {len(todo)} | removed: {len(removed)} | total chunks: {n}")
+    print(f"[ingest] wrote: {CHUNK_STORE_DIR.resolve()} and the FAISS index")
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Streaming, resumable rebuild of the chunk store and index.")
+    ap.add_argument("--full", action="store_true", help="re-extract every document (ids are still never reused)")
+    ap.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks per encode call")
+    ap.add_argument("--restart", action="store_true", help="ignore any checkpoint from an interrupted run")
+    ap.add_argument("--serial", action="store_true", help="extract pages in this process")
+    ap.add_argument("--index-type", default=INDEX_TYPE)
+    args = ap.parse_args()
+    run(full=args.full, batch_size=args.batch_size, workers=1 if args.serial else INGEST_WORKERS,
+        restart=args.restart, index_type=args.index_type)
+
+
+if __name__ == "__main__":
+    main()
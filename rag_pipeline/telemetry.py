@@ -0,0 +1,139 @@
+# rag_pipeline/telemetry.py
+import os
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# --- Logging knobs ---
+LOG_LEVEL = os.environ.get("RAG_LOG_LEVEL", "INFO")
+# Fraction of requests whose debug detail (distances, previews, prompt) is logged
+LOG_SAMPLE_RATE = float(os.environ.get("RAG_LOG_SAMPLE_RATE", "0.01"))
+
+logger = logging.getLogger("rag_pipeline")
+
+# Seconds; fine at the low end for embed/search, coarse at the top for the LLM
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    # key=value messages on one line each, so they grep and parse cleanly; only
+    # our logger, so RAG_LOG_LEVEL=DEBUG doesn't also turn on library chatter
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def sampled(rate: float = None) -> bool:
+    """True for a random `rate` fraction of calls; gates per-request debug detail."""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < rate
+
+
+# --- Metrics (Prometheus text exposition, per process) ---
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _fmt(self, key, extra=None) -> str:
+        pairs = list(zip(self.labelnames, key)) + (extra or [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{v}"' for n, v in pairs) + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._fmt(k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}   # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{self._fmt(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._fmt(key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{self._fmt(key)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Latency of each pipeline stage", ("stage",))
+REQUESTS = Counter("rag_requests_total", "Requests handled, by endpoint", ("endpoint",))
+CACHE_LOOKUPS = Counter("rag_answer_cache_lookups_total", "Semantic answer cache lookups", ("result",))
+FALLBACKS = Counter("rag_fallbacks_total", "Degraded retrieval paths taken", ("reason",))
+LLM_ERRORS = Counter("rag_llm_errors_total", "Failed LLM calls, by exception type", ("kind",))
+LLM_EVENTS = Counter("rag_llm_client_events_total", "LLM client retries, hedges and failovers", ("event",))
+SESSION_TURNS = Counter("rag_session_turns_total", "Conversation turns, by how retrieval was done", ("retrieval",))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block into rag_stage_seconds{stage=...}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
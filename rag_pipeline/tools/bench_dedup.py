@@ -0,0 +1,87 @@
+# rag_pipeline/tools/bench_dedup.py
+# What near-duplicate folding saves: for each index type, the index built over
+# every embedding vs over canonical chunks only (aliases from
+# data/chunk_aliases.json, or recomputed with --threshold). Reports vectors,
+# serialized size, p50/p99 single-query search latency, and how many top-k
+# slots the full index spends on copies of a chunk already ranked higher.
+#
+#   python rag_pipeline/tools/bench_dedup.py --k 8 --queries 500
+#   python rag_pipeline/tools/bench_dedup.py --threshold 0.5
+import sys, time, argparse
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from rag_pipeline.chunk_store import open_chunks
+from rag_pipeline.dedup import find_near_duplicates, load_aliases
+from rag_pipeline.embeddings_store import (
+    EMBEDDING_IDS_FILE, EMBEDDINGS_FILE, build_faiss_index, indexed_rows, prepare_vectors,
+)
+
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat"]
+
+
+def redundant_slots(found, aliases):
+    """Share of top-k slots holding a chunk whose canonical already appeared higher up."""
+    wasted = total = 0
+    for row in found:
+        seen = set()
+        for cid in row[row >= 0]:
+            canonical = aliases.get(int(cid), int(cid))
+            wasted += canonical in seen
+            seen.add(canonical)
+            total += 1
+    return wasted / max(total, 1)
+
+
+def time_search(index, queries, k):
+    timings = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q[None, :], k)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--queries", type=int, default=500, help="canonical corpus vectors reused as queries")
+    ap.add_argument("--threshold", type=float, default=None, help="recompute aliases at this Jaccard threshold")
+    ap.add_argument("--index-types", nargs="+", default=INDEX_TYPES)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    if args.threshold is None:
+        aliases = load_aliases()
+    else:
+        chunks = open_chunks()
+        aliases = find_near_duplicates(chunks.values(), threshold=args.threshold)
+    embeddings = np.load(EMBEDDINGS_FILE)
+    ids = np.load(EMBEDDING_IDS_FILE)
+    keep = indexed_rows(ids, aliases)
+    print(f"[bench] {len(ids)} vectors | {len(ids) - int(keep.sum())} aliases | k={args.k}")
+
+    rng = np.random.default_rng(args.seed)
+    canonical_rows = np.flatnonzero(keep)
+    sample = rng.choice(canonical_rows, size=min(args.queries, len(canonical_rows)), replace=False)
+    queries = prepare_vectors(embeddings[sample], "ip")
+
+    header = f"{'index':<10} {'corpus':<10} {'vectors':>8} {'size MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'dup slots':>9}"
+    print(header)
+    print("-" * len(header))
+    for index_type in args.index_types:
+        for label, rows in (("all", slice(None)), ("canonical", keep)):
+            index, _ = build_faiss_index(embeddings[rows], ids=ids[rows], index_type=index_type)
+            _, found = index.search(queries, args.k)
+            p50, p99 = time_search(index, queries, args.k)
+            size_mb = faiss.serialize_index(index).nbytes / 1e6
+            print(f"{index_type:<10} {label:<10} {index.ntotal:>8} {size_mb:>8.2f} {p50:>8.3f} {p99:>8.3f} "
+                  f"{redundant_slots(found, aliases):>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
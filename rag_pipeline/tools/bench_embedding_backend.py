@@ -0,0 +1,89 @@
+# rag_pipeline/tools/bench_embedding_backend.py
+# Startup time, resident memory and query-encode latency of the embedding
+# backends (PyTorch SentenceTransformer vs ONNX Runtime fp32 / int8). Each
+# backend runs in a fresh process so import cost and RSS aren't shared.
+#
+#   python rag_pipeline/tools/bench_embedding_backend.py --queries 200 --threads 1
+import sys, csv, time, argparse
+import multiprocessing as mp
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from bench_worker_memory import memory_kb
+
+AUTHORING_CSV = Path(__file__).resolve().parents[2] / "fine_tune" / "authoring.csv"
+
+
+def worker(backend, questions, threads, batch, results):
+    import os
+    import numpy as np
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+
+    baseline = memory_kb()
+    t0 = time.perf_counter()
+    if backend == "torch":
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+        from rag_pipeline.query_pipeline import EMBED_MODEL
+        model = SentenceTransformer(EMBED_MODEL)
+    else:
+        from rag_pipeline.onnx_embedder import OnnxEmbedder
+        from rag_pipeline.query_pipeline import ONNX_MODEL_DIR
+        model = OnnxEmbedder(ONNX_MODEL_DIR, quantized=backend == "onnx-int8", intra_op_threads=threads)
+    model.encode(["warm up"], normalize_embeddings=True)
+    load_s = time.perf_counter() - t0
+
+    timings = []
+    for q in questions:
+        t0 = time.perf_counter()
+        model.encode([q], convert_to_numpy=True, normalize_embeddings=True)
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    model.encode(questions, batch_size=batch, convert_to_numpy=True, normalize_embeddings=True)
+    batch_qps = len(questions) / (time.perf_counter() - t0)
+
+    mem = memory_kb()
+    results.put({
+        "backend": backend,
+        "load_s": load_s,
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+        "qps": batch_qps,
+        "rss": mem["rss"] - baseline["rss"],
+    })
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["torch", "onnx-fp32", "onnx-int8"])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--threads", type=int, default=0, help="intra-op threads; 0 = library default")
+    ap.add_argument("--batch", type=int, default=32)
+    args = ap.parse_args()
+
+    with AUTHORING_CSV.open(newline="", encoding="utf-8-sig") as f:
+        questions = [r["question"] for r in csv.DictReader(f)]
+    questions = (questions * (args.queries // max(1, len(questions)) + 1))[:args.queries]
+
+    ctx = mp.get_context("spawn")
+    header = f"{'backend':<10} {'startup ms':>11} {'RSS MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch q/s':>10}"
+    print(f"[bench] {len(questions)} single-question encodes + one batched pass (batch={args.batch})")
+    print(header)
+    print("-" * len(header))
+    for backend in args.backends:
+        results = ctx.Queue()
+        p = ctx.Process(target=worker, args=(backend, questions, args.threads, args.batch, results))
+        p.start()
+        r = results.get()
+        p.join()
+        print(f"{r['backend']:<10} {r['load_s'] * 1000:>11.0f} {r['rss'] / 1024:>8.1f} "
+              f"{r['p50']:>8.2f} {r['p99']:>8.2f} {r['qps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# rag_pipeline/tools/bench_faiss_index.py
+# Recall@k vs the exact flat index, plus p50/p99 single-query search latency,
+# for each FAISS index configuration over data/embeddings.npy.
+#
+#   python rag_pipeline/tools/bench_faiss_index.py --k 8 --queries 500
+import sys, time, argparse
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from rag_pipeline.embeddings_store import EMBEDDINGS_FILE, build_faiss_index, prepare_vectors
+
+CONFIGS = [
+    {"index_type": "flat"},
+    {"index_type": "hnsw", "hnsw_m": 16, "ef_search": 32},
+    {"index_type": "hnsw", "hnsw_m": 32, "ef_search": 64},
+    {"index_type": "hnsw", "hnsw_m": 32, "ef_search": 128},
+    {"index_type": "ivf_flat", "nprobe": 4},
+    {"index_type": "ivf_flat", "nprobe": 16},
+    {"index_type": "ivf_pq", "nprobe": 8},
+    {"index_type": "ivf_pq", "nprobe": 32},
+]
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--queries", type=int, default=500, help="corpus vectors reused as queries")
+    ap.add_argument("--metric", default="ip", choices=["ip", "l2"])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    embeddings = np.load(EMBEDDINGS_FILE)
+    vectors = prepare_vectors(embeddings, args.metric)
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    print(f"[bench] {len(vectors)} vectors x {vectors.shape[1]} dims | {len(queries)} queries | k={args.k}")
+
+    # Ground truth from the exact index
+    exact, _ = build_faiss_index(embeddings, index_type="flat", metric=args.metric)
+    _, truth = exact.search(queries, args.k)
+
+    header = f"{'config':<34} {'recall@k':>8} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'size MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for cfg in CONFIGS:
+        params = dict(cfg)
+        index_type = params.pop("index_type")
+        t0 = time.perf_counter()
+        try:
+            index, config = build_faiss_index(embeddings, index_type=index_type, metric=args.metric, **params)
+        except Exception as e:
+            print(f"{index_type:<34} skipped: {e}")
+            continue
+        build_s = time.perf_counter() - t0
+
+        # Batched search for recall, single-query searches for serving latency
+        _, found = index.search(queries, args.k)
+        timings = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q[None, :], args.k)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        label = f"{config['factory']} " + " ".join(
+            f"{name}={config[name]}" for name in ("nprobe", "efSearch") if config.get(name) is not None
+        )
+        print(f"{label:<34} {recall_at_k(found, truth):>8.3f} "
+              f"{np.percentile(timings, 50):>8.3f} {np.percentile(timings, 99):>8.3f} "
+              f"{build_s:>8.2f} {size_mb:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# rag_pipeline/tools/bench_lexical.py
+# Build time, size and per-query latency of the BM25 lexical index, using the
+# authoring questions (and a few exact-term probes) as queries.
+#
+#   python rag_pipeline/tools/bench_lexical.py --repeat 200
+import sys, csv, time, argparse
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from rag_pipeline.chunk_store import open_chunks
+from rag_pipeline.lexical_index import LexicalIndex
+
+AUTHORING_CSV = ROOT / "fine_tune" / "authoring.csv"
+PROBES = ["Mardia's test", "Cholesky decomposition", "coregionalization", "universal cokriging", "gradient and Hessian"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=100, help="passes over the query set")
+    ap.add_argument("--k", type=int, default=20)
+    args = ap.parse_args()
+
+    chunks = open_chunks()
+    items = list(chunks.values())
+    t0 = time.perf_counter()
+    index = LexicalIndex.build(items)
+    build_s = time.perf_counter() - t0
+    size_mb = sum(a.nbytes for a in (index.offsets, index.docs, index.weights, index.chunk_ids)) / 1e6
+
+    with AUTHORING_CSV.open(newline="", encoding="utf-8-sig") as f:
+        questions = [r["question"] for r in csv.DictReader(f)] + PROBES
+
+    timings = []
+    for _ in range(args.repeat):
+        for q in questions:
+            t0 = time.perf_counter()
+            index.search(q, args.k)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+    print(f"[bench] {len(items)} chunks | vocab {len(index.vocab)} | postings {len(index.docs)} | "
+          f"arrays {size_mb:.2f} MB | build {build_s:.2f} s")
+    print(f"[bench] {len(timings)} queries (k={args.k}): "
+          f"p50 {np.percentile(timings, 50):.3f} ms | p99 {np.percentile(timings, 99):.3f} ms | "
+          f"max {max(timings):.3f} ms")
+    for q in PROBES:
+        ids, scores = index.search(q, 3)
+        print(f"  {q!r}: " + ", ".join(f"{chunks[int(i)]['source']}#{int(i)} ({s:.2f})" for i, s in zip(ids, scores)))
+
+
+if __name__ == "__main__":
+    main()
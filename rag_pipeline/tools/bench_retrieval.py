@@ -0,0 +1,224 @@
+# rag_pipeline/tools/bench_retrieval.py
+# Offline retrieval benchmark on the authoring gold set. Relevance labels are
+# the chunks listed for each question in outputs/authoring_mapped.csv; they're
+# resolved by content (the `chunk_preview` text), so they survive re-chunking.
+# Reports recall@k, MRR and nDCG@k per configuration (index type x retrieval
+# mode x distance threshold x k) and p50/p95/p99 of each stage: embed, search,
+# retrieve (threshold/fusion/rerank), prompt assembly, and the whole pipeline
+# against a stub LLM. No network needed once the embedding model is cached.
+#
+#   python rag_pipeline/tools/bench_retrieval.py --out data/bench_retrieval.json
+#   python rag_pipeline/tools/bench_retrieval.py --baseline data/bench_retrieval.json   # exit 1 on regression
+import io, re, sys, csv, json, time, argparse
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from rag_pipeline.dedup import load_aliases
+from rag_pipeline.embeddings_store import EMBEDDING_IDS_FILE, build_faiss_index, indexed_rows, load_embeddings
+from rag_pipeline.query_pipeline import (
+    build_prompt, dense_fetch_k, encode_query, load_chunk_metadata, load_chunks, load_embedding_model,
+    load_faiss_index, load_lexical_index, load_tokenizer, query_rag_pipeline, retrieve_relevant_chunks,
+)
+
+MAPPED_CSV = ROOT / "outputs" / "authoring_mapped.csv"
+STAGES = ["embed", "search", "retrieve", "prompt", "pipeline"]
+QUALITY = ["recall", "mrr", "ndcg"]
+PROBE = 32  # squashed chars of a label preview that must occur in a chunk
+
+
+# --- Gold labels ---
+def squash(text: str) -> str:
+    # Letters and digits only: immune to hyphenation, whitespace and punctuation drift between extractions
+    return re.sub(r"[^a-z0-9]+", "", (text or "").lower())
+
+
+def resolve_labels(chunks, path: Path = MAPPED_CSV):
+    """
+    [(question, {relevant chunk ids})] for questions with at least one label
+    found in the current chunk store, plus (labels, resolved) counts. Labels
+    that land on a near-duplicate alias count as its canonical chunk.
+    """
+    aliases = load_aliases()
+    squashed = {cid: squash(ch["text"]) for cid, ch in chunks.items()}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+
+    gold, labels, resolved = [], 0, 0
+    for r in rows:
+        relevant = set()
+        for part in filter(None, (r.get("chunk_preview") or "").split(" || ")):
+            labels += 1
+            text = squash(re.sub(r"^\[\d+\]\s*", "", part).rstrip("…"))
+            found = set()
+            # Slide the probe in case the preview starts in text the extractor now drops
+            for off in range(0, max(1, len(text) - PROBE + 1), PROBE // 2):
+                probe = text[off:off + PROBE]
+                if len(probe) < PROBE:
+                    break
+                found = {cid for cid, t in squashed.items() if probe in t}
+                if found:
+                    break
+            resolved += bool(found)
+            relevant |= {aliases.get(cid, cid) for cid in found}
+        if relevant:
+            gold.append((r["question"], relevant))
+    return gold, labels, resolved
+
+
+# --- Metrics ---
+def score_ranking(ranked, relevant, k):
+    top = ranked[:k]
+    hits = [1.0 if cid in relevant else 0.0 for cid in top]
+    recall = sum(hits) / len(relevant)
+    mrr = next((1.0 / (i + 1) for i, h in enumerate(hits) if h), 0.0)
+    dcg = sum(h / np.log2(i + 2) for i, h in enumerate(hits))
+    idcg = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    return recall, mrr, dcg / idcg
+
+
+def percentiles(ms):
+    return {f"p{p}": float(np.percentile(ms, p)) for p in (50, 95, 99)} if ms else {}
+
+
+def stub_llm(prompt, max_new_tokens=150):
+    # Deterministic, offline: echo the start of the context
+    context = prompt.split("Context:\n", 1)[-1]
+    return [{"generated_text": context[:max_new_tokens * 4]}]
+
+
+# --- Runner ---
+def run_config(gold, query_embeddings, embedding_model, faiss_index, chunks, tokenizer, k, retrieval_options):
+    timings = {s: [] for s in STAGES[1:]}
+    quality = {m: [] for m in QUALITY}
+    fetch_k = dense_fetch_k(k, **retrieval_options)
+    with redirect_stdout(io.StringIO()):
+        for (question, relevant), q in zip(gold, query_embeddings):
+            t0 = time.perf_counter()
+            hits = faiss_index.search(q, fetch_k)
+            t1 = time.perf_counter()
+            retrieved = retrieve_relevant_chunks(question, embedding_model, faiss_index, chunks, k,
+                                                 query_embedding=q, hits=hits, **retrieval_options)
+            t2 = time.perf_counter()
+            build_prompt(question, embedding_model, faiss_index, chunks, tokenizer, k, query_embedding=q, hits=hits,
+                         retrieval_options=retrieval_options)
+            t3 = time.perf_counter()
+            query_rag_pipeline(question, embedding_model, faiss_index, chunks, stub_llm, tokenizer, k,
+                               retrieval_options=retrieval_options)
+            t4 = time.perf_counter()
+
+            for stage, dt in zip(STAGES[1:], (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                timings[stage].append(dt * 1000)
+            for m, v in zip(QUALITY, score_ranking([c["id"] for c in retrieved], relevant, k)):
+                quality[m].append(v)
+    return {
+        **{m: float(np.mean(v)) for m, v in quality.items()},
+        "latency_ms": {s: percentiles(v) for s, v in timings.items()},
+    }
+
+
+def check_regressions(report, baseline, quality_tol, latency_tol, latency_floor_ms):
+    def slower(now, before):
+        return before is not None and now > before * (1 + latency_tol) + latency_floor_ms
+
+    failures = []
+    if slower(report["embed_ms"]["p95"], baseline.get("embed_ms", {}).get("p95")):
+        failures.append(f"embed p95 {report['embed_ms']['p95']:.2f} ms > baseline "
+                        f"{baseline['embed_ms']['p95']:.2f} ms (+{latency_tol:.0%})")
+    for key, res in report["configs"].items():
+        base = baseline.get("configs", {}).get(key)
+        if base is None:
+            continue
+        for m in QUALITY:
+            if res[m] < base[m] - quality_tol:
+                failures.append(f"{key}: {m} {res[m]:.3f} < baseline {base[m]:.3f} - {quality_tol}")
+        for stage, p in res["latency_ms"].items():
+            b = base.get("latency_ms", {}).get(stage, {}).get("p95")
+            if slower(p["p95"], b):
+                failures.append(f"{key}: {stage} p95 {p['p95']:.2f} ms > baseline {b:.2f} ms (+{latency_tol:.0%})")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, nargs="+", default=[3, 5, 8])
+    ap.add_argument("--thresholds", type=float, nargs="+", default=[0.85, 1.2], help="squared-L2 distance cut-offs")
+    ap.add_argument("--index-types", nargs="+", default=["stored", "flat", "hnsw"],
+                    help="'stored' = data/faiss_index.bin; others are built in memory from data/embeddings.npy")
+    ap.add_argument("--modes", nargs="+", default=["dense", "hybrid"])
+    ap.add_argument("--out", type=Path, default=None, help="write results JSON (usable as a baseline)")
+    ap.add_argument("--baseline", type=Path, default=None, help="fail (exit 1) on regression vs this JSON")
+    ap.add_argument("--quality-tol", type=float, default=0.02, help="allowed absolute drop in recall/MRR/nDCG")
+    ap.add_argument("--latency-tol", type=float, default=0.5, help="allowed relative p95 increase")
+    ap.add_argument("--latency-floor-ms", type=float, default=0.5, help="absolute slack for sub-ms stages")
+    args = ap.parse_args()
+
+    chunks = load_chunks()
+    gold, n_labels, n_resolved = resolve_labels(chunks)
+    print(f"[bench] {len(gold)} questions | labels resolved {n_resolved}/{n_labels} against {len(chunks)} chunks")
+
+    embedding_model = load_embedding_model()
+    tokenizer = load_tokenizer()
+    lexical_index = load_lexical_index()
+    metadata = load_chunk_metadata(chunks)
+
+    embed_ms, query_embeddings = [], []
+    encode_query("warm up", embedding_model)
+    for question, _ in gold:
+        t0 = time.perf_counter()
+        query_embeddings.append(encode_query(question, embedding_model))
+        embed_ms.append((time.perf_counter() - t0) * 1000)
+    embed = percentiles(embed_ms)
+    print(f"[bench] embed: p50 {embed['p50']:.2f} | p95 {embed['p95']:.2f} | p99 {embed['p99']:.2f} ms")
+
+    results = {}
+    for index_type in args.index_types:
+        if index_type == "stored":
+            faiss_index = load_faiss_index()
+        else:
+            ids = np.load(EMBEDDING_IDS_FILE)
+            keep = indexed_rows(ids, load_aliases())
+            faiss_index, _ = build_faiss_index(load_embeddings()[keep], ids=ids[keep], index_type=index_type)
+        for mode in args.modes:
+            if mode == "hybrid" and lexical_index is None:
+                continue
+            for threshold in args.thresholds:
+                for k in args.k:
+                    options = {"lexical_index": lexical_index, "mode": mode, "distance_threshold": threshold,
+                               "metadata": metadata}
+                    key = f"{index_type}/{mode}/t{threshold:g}/k{k}"
+                    results[key] = run_config(gold, query_embeddings, embedding_model, faiss_index, chunks,
+                                              tokenizer, k, options)
+
+    header = (f"{'config':<26} {'recall':>7} {'MRR':>6} {'nDCG':>6} "
+              + " ".join(f"{s + ' p50/p95/p99 ms':>26}" for s in STAGES[1:]))
+    print(header)
+    print("-" * len(header))
+    for key, r in results.items():
+        lat = " ".join(f"{r['latency_ms'][s]['p50']:>8.2f}/{r['latency_ms'][s]['p95']:>7.2f}/{r['latency_ms'][s]['p99']:>8.2f}"
+                       for s in STAGES[1:])
+        print(f"{key:<26} {r['recall']:>7.3f} {r['mrr']:>6.3f} {r['ndcg']:>6.3f} {lat}")
+
+    report = {"questions": len(gold), "labels": [n_resolved, n_labels], "embed_ms": embed, "configs": results}
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, indent=2))
+        print(f"[bench] wrote {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        failures = check_regressions(report, baseline, args.quality_tol, args.latency_tol, args.latency_floor_ms)
+        if failures:
+            print("❌ Regressions vs baseline:")
+            for f in failures:
+                print(f"  - {f}")
+            sys.exit(1)
+        print("✅ No regressions vs baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# rag_pipeline/tools/bench_worker_memory.py
+# Resident memory per worker and load time: private-copy loaders vs the
+# memory-mapped serving mode (RAG_MMAP=1). Spawns N worker processes that stay
+# alive together, so PSS shows how the mapped pages are shared between them.
+#
+#   python rag_pipeline/tools/bench_worker_memory.py --workers 4
+import sys, time, argparse
+import multiprocessing as mp
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+
+def memory_kb():
+    """Rss / Pss / Uss (private) in kB from /proc (Linux)."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def worker(mode, searches, barrier, results):
+    import numpy as np
+    from rag_pipeline.embeddings_store import load_embeddings
+    from rag_pipeline.query_pipeline import load_faiss_index, load_chunks
+
+    baseline = memory_kb()
+    t0 = time.perf_counter()
+    mmap = mode == "mmap"
+    faiss_index = load_faiss_index(mmap=mmap)
+    embeddings = load_embeddings(mmap=mmap)
+    chunks = load_chunks()
+    load_s = time.perf_counter() - t0
+
+    # Touch what serving touches: searches over the whole index + every embedding row
+    rng = np.random.default_rng(0)
+    queries = np.ascontiguousarray(embeddings[rng.integers(0, len(embeddings), searches)], dtype=np.float32)
+    _, ids = faiss_index.search(queries, 8)
+    float(np.asarray(embeddings).sum())
+    _ = [chunks[int(i)]["text"] for i in ids[:, 0] if i >= 0]
+
+    barrier.wait()  # all workers resident at once
+    mem = memory_kb()
+    results.put({
+        "load_s": load_s,
+        **{k: mem[k] - baseline[k] for k in mem},
+    })
+    barrier.wait()
+
+
+def run(mode, workers, searches):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, searches, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--searches", type=int, default=256)
+    args = ap.parse_args()
+
+    print(f"[bench] {args.workers} workers | memory is the delta over each worker's pre-load baseline")
+    header = f"{'mode':<8} {'load ms':>9} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'total PSS MB':>13}"
+    print(header)
+    print("-" * len(header))
+    for mode in ("private", "mmap"):
+        rows = run(mode, args.workers, args.searches)
+        mean = lambda key: sum(r[key] for r in rows) / len(rows)
+        print(f"{mode:<8} {mean('load_s') * 1000:>9.1f} {mean('rss') / 1024:>8.1f} "
+              f"{mean('pss') / 1024:>8.1f} {mean('uss') / 1024:>8.1f} "
+              f"{sum(r['pss'] for r in rows) / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import os, csv, json, pickle
+import os, sys, csv, json, pickle
 from typing import Any, Tuple
 
 IN = os.environ.get("CHUNKS_PATH", "chunks.pkl")
@@ -64,9 +64,14 @@ def extract_text_source(obj: Any) -> Tuple[str, str]:
     # Fallback
     return str(obj), "unknown"
 
-# Load file
-with open(IN, "rb") as f:
-    raw = pickle.load(f)
+# Load file (a chunk_store/ directory or a pickle)
+if os.path.isdir(IN):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from rag_pipeline.chunk_store import ChunkStore
+    raw = list(ChunkStore(IN).values())
+else:
+    with open(IN, "rb") as f:
+        raw = pickle.load(f)
 
 # Sometimes people store {"chunks":[...]}
 if isinstance(raw, dict) and "chunks" in raw:
@@ -0,0 +1,30 @@
+# rag_pipeline/tools/export_onnx_embedder.py
+# One-off export of the query embedding model to ONNX (+ int8 dynamic
+# quantization) for the RAG_EMBED_BACKEND=onnx serving path. Needs torch and
+# transformers here; the serving side only needs onnxruntime + tokenizers.
+#
+#   python rag_pipeline/tools/export_onnx_embedder.py
+#   RAG_EMBED_BACKEND=onnx uvicorn app:app
+import sys, argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from rag_pipeline.onnx_embedder import ONNX_MODEL_DIR, export_onnx_model
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="BAAI/bge-small-en-v1.5")
+    ap.add_argument("--out", type=Path, default=ONNX_MODEL_DIR)
+    ap.add_argument("--pooling", choices=["cls", "mean"], default="cls", help="bge uses the CLS token")
+    ap.add_argument("--max-length", type=int, default=512)
+    ap.add_argument("--no-quantize", action="store_true", help="skip the int8 model")
+    args = ap.parse_args()
+
+    export_onnx_model(args.model, args.out, quantize=not args.no_quantize,
+                      pooling=args.pooling, max_length=args.max_length)
+
+
+if __name__ == "__main__":
+    main()
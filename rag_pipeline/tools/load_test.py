@@ -0,0 +1,143 @@
+# rag_pipeline/tools/load_test.py
+# Drive the running app at a fixed concurrency (closed loop) or a fixed
+# request rate (open loop, Poisson arrivals) and report throughput, latency
+# percentiles and errors. Pair with mock_llm_server.py to measure how the
+# server itself scales with workers and concurrency:
+#
+#   python rag_pipeline/tools/mock_llm_server.py --port 9000 &
+#   LLM_BASE_URL=http://127.0.0.1:9000/v1 RAG_CACHE_THRESHOLD=2 uvicorn app:app --workers 2 &
+#   python rag_pipeline/tools/load_test.py --concurrency 16 --duration 30
+#   python rag_pipeline/tools/load_test.py --rate 20 --duration 30 --stream
+#
+# RAG_CACHE_THRESHOLD=2 keeps the semantic answer cache from answering the
+# repeated questions, so every request reaches retrieval and the LLM.
+import csv, json, time, random, asyncio, argparse
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+AUTHORING_CSV = Path(__file__).resolve().parents[2] / "fine_tune" / "authoring.csv"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []   # seconds, successful requests
+        self.ttfts = []       # seconds to first streamed token
+        self.errors = Counter()
+        self.started = 0
+
+    def summary(self, elapsed):
+        ms = np.asarray(self.latencies) * 1000
+        done = len(self.latencies)
+        out = {
+            "sent": self.started,
+            "ok": done,
+            "errors": dict(self.errors),
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(done / elapsed, 2) if elapsed else 0.0,
+        }
+        if done:
+            out["latency_ms"] = {f"p{p}": round(float(np.percentile(ms, p)), 1) for p in (50, 90, 95, 99)}
+            out["latency_ms"]["max"] = round(float(ms.max()), 1)
+        if self.ttfts:
+            out["ttft_ms"] = {f"p{p}": round(float(np.percentile(np.asarray(self.ttfts) * 1000, p)), 1)
+                              for p in (50, 95, 99)}
+        return out
+
+
+async def one_request(client, url, question, stream, rec):
+    rec.started += 1
+    t0 = time.perf_counter()
+    try:
+        if stream:
+            first = None
+            async with client.stream("POST", url + "/query/stream", json={"question": question}) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if line.startswith("data:") and first is None:
+                        first = time.perf_counter() - t0
+                    if line.startswith("event: error"):
+                        raise RuntimeError("stream error event")
+            if first is not None:
+                rec.ttfts.append(first)
+        else:
+            r = await client.post(url + "/query", json={"question": question})
+            r.raise_for_status()
+        rec.latencies.append(time.perf_counter() - t0)
+    except httpx.HTTPStatusError as e:
+        rec.errors[f"http_{e.response.status_code}"] += 1
+    except httpx.TimeoutException:
+        rec.errors["timeout"] += 1
+    except Exception as e:
+        rec.errors[type(e).__name__] += 1
+
+
+async def closed_loop(client, url, questions, args, rec, deadline):
+    # `concurrency` users, each sending its next request when the last one returns
+    async def user(n):
+        i = n
+        while time.perf_counter() < deadline and (not args.requests or rec.started < args.requests):
+            await one_request(client, url, questions[i % len(questions)], args.stream, rec)
+            i += args.concurrency
+    await asyncio.gather(*(user(n) for n in range(args.concurrency)))
+
+
+async def open_loop(client, url, questions, args, rec, deadline):
+    # Arrivals at `rate`/s regardless of how fast responses come back
+    tasks, i = set(), 0
+    while time.perf_counter() < deadline and (not args.requests or i < args.requests):
+        tasks.add(asyncio.ensure_future(one_request(client, url, questions[i % len(questions)], args.stream, rec)))
+        i += 1
+        await asyncio.sleep(random.expovariate(args.rate))
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+async def run(args):
+    with AUTHORING_CSV.open(newline="", encoding="utf-8-sig") as f:
+        questions = [r["question"] for r in csv.DictReader(f)]
+    random.shuffle(questions)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        rec = Recorder()
+        t0 = time.perf_counter()
+        deadline = t0 + args.duration
+        if args.rate:
+            await open_loop(client, args.url, questions, args, rec, deadline)
+        else:
+            await closed_loop(client, args.url, questions, args, rec, deadline)
+        return rec.summary(time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", type=int, default=8, help="closed-loop users (ignored with --rate)")
+    ap.add_argument("--rate", type=float, default=0.0, help="open-loop arrivals per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds to keep sending")
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = no limit)")
+    ap.add_argument("--stream", action="store_true", help="use /query/stream and also report time to first token")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args()
+    random.seed(args.seed)
+
+    mode = f"open loop {args.rate:g} req/s" if args.rate else f"closed loop x{args.concurrency}"
+    print(f"[load] {args.url} | {mode} | {'stream' if args.stream else 'query'} | {args.duration:g}s")
+    summary = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"[load] sent {summary['sent']} | ok {summary['ok']} | errors {summary['errors'] or 0} | "
+          f"{summary['throughput_rps']} req/s over {summary['elapsed_s']} s")
+    for key in ("latency_ms", "ttft_ms"):
+        if key in summary:
+            print(f"[load] {key.replace('_ms', '')}: " + " | ".join(f"{k} {v} ms" for k, v in summary[key].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# rag_pipeline/tools/mock_llm_server.py
+# Local OpenAI-compatible chat-completions stand-in for load testing: a
+# configurable time-to-first-token distribution, token rate, error rate and
+# SSE streaming, without touching api.groq.com.
+#
+#   python rag_pipeline/tools/mock_llm_server.py --port 9000 --latency-ms 400 --tokens-per-s 80 --error-rate 0.02
+#   LLM_BASE_URL=http://127.0.0.1:9000/v1 uvicorn app:app --workers 2
+import json, math, time, random, asyncio, argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+config = argparse.Namespace(
+    latency_ms=300.0, latency_dist="lognormal", latency_sigma=0.5, tokens_per_s=60.0,
+    completion_tokens=0, error_rate=0.0, error_status=500, retry_after=1.0, seed=None,
+)
+stats = {"requests": 0, "streamed": 0, "errors": 0, "tokens": 0}
+rng = random.Random()
+
+WORDS = ("the model fits several responses jointly so that correlated outputs share "
+         "information and the covariance structure is estimated from the residuals").split()
+
+
+def first_token_delay():
+    """Seconds before the first token, drawn from the configured distribution."""
+    mean = config.latency_ms / 1000
+    if config.latency_dist == "fixed":
+        return mean
+    if config.latency_dist == "exponential":
+        return rng.expovariate(1 / mean) if mean > 0 else 0.0
+    # lognormal with the given mean: mu = ln(mean) - sigma^2 / 2
+    sigma = config.latency_sigma
+    return rng.lognormvariate(math.log(max(mean, 1e-6)) - sigma ** 2 / 2, sigma)
+
+
+def completion_words(max_tokens):
+    n = config.completion_tokens or max_tokens or 150
+    return [WORDS[i % len(WORDS)] for i in range(n)]
+
+
+def error_response():
+    status = config.error_status
+    headers = {"Retry-After": f"{config.retry_after:g}"} if status in (429, 503) else {}
+    return JSONResponse(status_code=status, headers=headers,
+                        content={"error": {"message": "mock failure", "type": "server_error", "code": status}})
+
+
+def completion_body(text, n_tokens, prompt):
+    return {
+        "id": f"mock-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "mock",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": n_tokens,
+                  "total_tokens": len(prompt.split()) + n_tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if rng.random() < config.error_rate:
+        stats["errors"] += 1
+        return error_response()
+
+    prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+    words = completion_words(body.get("max_tokens"))
+    per_token = 1 / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+    stats["tokens"] += len(words)
+
+    if not body.get("stream"):
+        await asyncio.sleep(first_token_delay() + per_token * len(words))
+        return JSONResponse(content=completion_body(" ".join(words), len(words), prompt))
+
+    stats["streamed"] += 1
+
+    async def events():
+        await asyncio.sleep(first_token_delay())
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            chunk = {"object": "chat.completion.chunk", "model": "mock",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(per_token)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+def get_stats():
+    return JSONResponse(content={**stats, "config": vars(config)})
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--latency-ms", type=float, default=config.latency_ms, help="mean time to first token")
+    ap.add_argument("--latency-dist", choices=["fixed", "lognormal", "exponential"], default=config.latency_dist)
+    ap.add_argument("--latency-sigma", type=float, default=config.latency_sigma, help="lognormal shape (tail weight)")
+    ap.add_argument("--tokens-per-s", type=float, default=config.tokens_per_s, help="0 = whole completion at once")
+    ap.add_argument("--completion-tokens", type=int, default=config.completion_tokens,
+                    help="tokens per completion; 0 = the request's max_tokens")
+    ap.add_argument("--error-rate", type=float, default=config.error_rate, help="fraction of requests that fail")
+    ap.add_argument("--error-status", type=int, default=config.error_status, help="e.g. 500, 429 or 503")
+    ap.add_argument("--retry-after", type=float, default=config.retry_after, help="Retry-After seconds on 429/503")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    for key, value in vars(args).items():
+        if hasattr(config, key):
+            setattr(config, key, value)
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    import uvicorn
+    print(f"🧪 Mock LLM on http://{args.host}:{args.port}/v1 | {vars(config)}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
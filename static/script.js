@@ -5,12 +5,25 @@ let chatOrder = JSON.parse(localStorage.getItem("chatOrder")) || [];
 // ✅ per-chat state
 let chatStates = {}; // { chatId: { isAnswering: bool, abortController: AbortController|null } }
 let chatTitles = JSON.parse(localStorage.getItem("chatTitles") || "{}");
+let chatSessions = JSON.parse(localStorage.getItem("chatSessions") || "{}"); // { chatId: server session_id }
 
 // Save chat history + order to localStorage
 function saveChatHistory() {
   localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
   localStorage.setItem("chatOrder", JSON.stringify(chatOrder));
   localStorage.setItem("chatTitles", JSON.stringify(chatTitles)); // ✅ new
+  localStorage.setItem("chatSessions", JSON.stringify(chatSessions));
+}
+
+// Random per-chat id for the server's conversation session (follow-up questions)
+function sessionIdFor(chatId) {
+  if (!chatSessions[chatId]) {
+    chatSessions[chatId] = window.crypto && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    saveChatHistory();
+  }
+  return chatSessions[chatId];
 }
 
 function bumpChatToTop(chatId) {
@@ -49,6 +62,21 @@ function appendMessage(chatId, sender, text) {
   if (chatId === currentChatId) renderChat();
 }
 
+// Replace the text of the latest message (used while streaming a bot reply)
+function updateLastMessage(chatId, text) {
+  const messages = chatHistory[chatId];
+  if (!messages || messages.length === 0) return;
+  messages[messages.length - 1].text = text;
+
+  if (chatId !== currentChatId) return;
+  // ✅ touch only the last bubble instead of re-rendering the whole chat
+  const bubbles = document.querySelectorAll("#chatBox .bubble");
+  const last = bubbles[bubbles.length - 1];
+  if (last) last.textContent = text;
+  const chatBox = document.getElementById("chatBox");
+  chatBox.scrollTop = chatBox.scrollHeight;
+}
+
 // Render current chat messages
 function renderChat() {
   const chatBox = document.getElementById("chatBox");
@@ -196,6 +224,10 @@ function toggleMenu(chatId, wrapper) {
   del.onclick = () => {
     delete chatHistory[chatId];
     delete chatTitles[chatId];                 // ✅ also remove from chatTitles
+    if (chatSessions[chatId]) {
+      fetch(`/sessions/${encodeURIComponent(chatSessions[chatId])}`, { method: "DELETE" }).catch(() => {});
+      delete chatSessions[chatId];
+    }
     chatOrder = chatOrder.filter(id => id !== chatId);
     saveChatHistory();
     updateChatList();
@@ -211,7 +243,19 @@ function toggleMenu(chatId, wrapper) {
   wrapper.appendChild(menu);
 }
 
-// Submit user question (non-streaming JSON backend)
+// Parse one Server-Sent Events frame into { event, data }
+function parseSseFrame(frame) {
+  let event = "message";
+  const dataLines = [];
+  for (const line of frame.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) dataLines.push(line.slice(5).trimStart());
+  }
+  if (dataLines.length === 0) return null;
+  return { event, data: JSON.parse(dataLines.join("\n")) };
+}
+
+// Submit user question (streaming SSE backend)
 async function submitQuestion() {
   const input = document.getElementById("question");
 
@@ -248,22 +292,57 @@ async function submitQuestion() {
   state.isAnswering = true;
   refreshArrowState(chatIdAtSubmit);
 
+  let answer = "";
+  let bubbleStarted = false;
+
   try {
-    const response = await fetch("/query", {
+    const response = await fetch("/query/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ question }),
-      signal: controller.signal, // ✅ link cancel signal
+      body: JSON.stringify({ question, session_id: sessionIdFor(chatIdAtSubmit) }),
+      signal: controller.signal, // ✅ link cancel signal (also stops the stream)
     });
 
     if (!response.ok) throw new Error(`Server returned ${response.status}`);
 
-    const data = await response.json();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let done = false;
+
+    while (!done) {
+      const { value, done: streamDone } = await reader.read();
+      if (streamDone) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE frames are separated by a blank line
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const frame = parseSseFrame(buffer.slice(0, sep));
+        buffer = buffer.slice(sep + 2);
+        if (!frame) continue;
+
+        if (frame.event === "done") { done = true; break; }
+        if (frame.event === "error") throw new Error(frame.data.message || "stream error");
+
+        // ✅ Don't render tokens if user cancelled
+        if (controller.signal.aborted) { done = true; break; }
+        answer += frame.data.token || "";
+        if (!bubbleStarted) {
+          appendMessage(chatIdAtSubmit, "bot", answer);
+          bubbleStarted = true;
+        } else {
+          updateLastMessage(chatIdAtSubmit, answer);
+        }
+      }
+    }
 
-    // ✅ Don't append answer if user cancelled
     if (!controller.signal.aborted) {
-      const answer = data.answer || "⚠️ No answer returned.";
-      appendMessage(chatIdAtSubmit, "bot", answer);
+      if (!bubbleStarted) {
+        appendMessage(chatIdAtSubmit, "bot", "⚠️ No answer returned.");
+      } else {
+        updateLastMessage(chatIdAtSubmit, answer.trim());
+      }
     }
 
   } catch (err) {
@@ -278,6 +357,8 @@ async function submitQuestion() {
       chatBox.appendChild(errorBubble);
     }
   } finally {
+    // ✅ keep whatever was streamed before a cancel/error
+    if (bubbleStarted) saveChatHistory();
     finishAnswering(chatIdAtSubmit);
   }
 }
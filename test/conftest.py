@@ -0,0 +1,9 @@
+# test/conftest.py
+# The unit tests run offline under pytest. The other scripts in this folder
+# load the full pipeline at import time and are run by hand.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+collect_ignore = ["test_rag.py", "test_output.py", "fix_file.py"]
@@ -0,0 +1,98 @@
+# test/test_app.py
+# Run from the repo root (app.py mounts ./static). Requests go straight to the
+# ASGI app, so the lifespan loader never starts: tests set the startup state.
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+
+import app as app_module
+
+
+def request(method, path, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def status(monkeypatch):
+    def set_status(value, error=None):
+        monkeypatch.setitem(app_module.startup, "status", value)
+        monkeypatch.setitem(app_module.startup, "error", error)
+    return set_status
+
+
+# --- Health probes ---
+def test_loading_is_live_but_not_ready(status):
+    status("loading")
+    assert request("GET", "/healthz").json() == {"status": "ok"}
+    ready = request("GET", "/readyz")
+    assert ready.status_code == 503 and ready.json()["status"] == "loading"
+
+
+def test_ready_after_load(status):
+    status("ready")
+    assert request("GET", "/healthz").status_code == 200
+    assert request("GET", "/readyz").status_code == 200
+
+
+def test_failed_load_fails_liveness(status):
+    status("failed", error="OSError('no index')")
+    health = request("GET", "/healthz")
+    assert health.status_code == 500 and health.json() == {"status": "failed", "error": "OSError('no index')"}
+    assert request("GET", "/readyz").status_code == 503
+
+
+def test_queries_wait_for_readiness(status):
+    status("loading")
+    response = request("POST", "/query", json={"question": "hello?"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
+
+
+# --- /query/batch validation ---
+@pytest.mark.parametrize("body", [
+    {},
+    ["what is kriging?"],
+    {"questions": []},
+    {"questions": "what is kriging?"},
+    {"questions": ["ok", 3]},
+    {"questions": [{"question": 5}]},
+    {"questions": [{"question_id": "x"}]},
+    {"questions": [{"question": "   "}]},
+    {"questions": [{"question": "ok", "question_id": [1]}]},
+    {"questions": [{"question": "ok", "question_id": True}]},
+    {"questions": ["ok"], "concurrency": "2"},
+    {"questions": ["ok"], "concurrency": True},
+])
+def test_bad_batch_requests_are_rejected(body):
+    questions, concurrency, error = app_module.get_batch_request(body)
+    assert questions is None and error.status_code == 400
+
+
+def test_batch_concurrency_is_clamped_to_the_server_cap(monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_CONCURRENCY", 4)
+    for asked, granted in ((None, 4), (2, 2), (0, 1), (99, 4)):
+        body = {"questions": ["a", {"question_id": "x", "question": "b"}]}
+        if asked is not None:
+            body["concurrency"] = asked
+        questions, concurrency, error = app_module.get_batch_request(body)
+        assert error is None and concurrency == granted and len(questions) == 2
+
+
+def test_batch_records_with_int_ids_are_accepted():
+    body = {"questions": [{"question_id": 7, "question": "a"}, {"question": "b"}]}
+    questions, _, error = app_module.get_batch_request(body)
+    assert error is None and len(questions) == 2
+
+
+@pytest.mark.parametrize("questions", [[], [{"question": 5}]])
+def test_batch_endpoint_answers_400_before_streaming(status, questions):
+    status("ready")
+    response = request("POST", "/query/batch", json={"questions": questions})
+    assert response.status_code == 400
+    assert response.headers["content-type"].startswith("application/json")
@@ -0,0 +1,120 @@
+# test/test_batch_runner.py
+import asyncio
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+
+from rag_pipeline.batch_runner import arun_batch, normalise_records
+
+DIM = 8
+CHUNKS = {i: {"id": i, "source": "doc.pdf", "text": f"chunk {i} text"} for i in range(4)}
+
+
+class HashEmbedder:
+    def encode(self, texts, **kwargs):
+        rows = [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM) for t in texts]
+        v = np.asarray(rows, dtype=np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+class FakeLLM:
+    """Answers "A: <question>" after a delay set per question; "boom" raises."""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.in_flight = self.peak = 0
+
+    async def __call__(self, prompt, max_new_tokens=150):
+        question = prompt.split("Question: ")[1].split("\n")[0]
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(question, 0.01))
+            if question == "boom":
+                raise RuntimeError("upstream 500")
+            return [{"generated_text": f" A: {question} "}]
+        finally:
+            self.in_flight -= 1
+
+
+class OneAnswerCache:
+    def __init__(self, vector, answer):
+        self.vector, self.answer = vector, answer
+        self.stored = []
+
+    def lookup(self, embedding):
+        return self.answer if float(embedding @ self.vector) > 0.999 else None
+
+    def store(self, embedding, question, answer):
+        self.stored.append(question)
+
+
+@pytest.fixture
+def index():
+    vectors = HashEmbedder().encode([c["text"] for c in CHUNKS.values()])
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(vectors, np.arange(len(CHUNKS), dtype=np.int64))
+    return index
+
+
+def collect(records, index, llm, **kwargs):
+    async def main():
+        return [r async for r in arun_batch(records, HashEmbedder(), index, CHUNKS, llm, len, **kwargs)]
+    return asyncio.run(main())
+
+
+def test_normalise_records_accepts_strings_and_dicts():
+    records = list(normalise_records(["  first ", {"question_id": "x", "question": "second"}, {"question": None}]))
+    assert records == [{"question_id": "q1", "question": "first"}, {"question_id": "x", "question": "second"},
+                       {"question_id": "q3", "question": ""}]
+
+
+def test_results_stream_in_completion_order_with_all_fields(index):
+    llm = FakeLLM({"slow": 0.2, "fast": 0.0})
+    records = normalise_records(["slow", "fast"])
+    results = collect(records, index, llm, concurrency=2)
+    assert [r["question_id"] for r in results] == ["q2", "q1"]
+    for r in results:
+        assert set(r) == {"question_id", "question", "answer", "cached", "latency_ms"}
+        assert r["answer"] == f"A: {r['question']}" and r["cached"] is False and r["latency_ms"] > 0
+
+
+def test_failures_and_empty_questions_are_reported_per_record(index):
+    results = {r["question_id"]: r for r in collect(normalise_records(["ok", "", "boom"]), index, FakeLLM())}
+    assert results["q1"]["answer"] == "A: ok" and "error" not in results["q1"]
+    assert results["q2"] == {"question_id": "q2", "question": "", "answer": None, "cached": False,
+                             "latency_ms": 0.0, "error": "empty question"}
+    assert results["q3"]["answer"] is None and results["q3"]["error"] == "upstream 500"
+
+
+def test_cached_answers_skip_the_llm_and_new_answers_are_stored(index):
+    cache = OneAnswerCache(HashEmbedder().encode(["known"])[0], "from cache")
+    llm = FakeLLM()
+    results = {r["question"]: r for r in collect(normalise_records(["known", "new"]), index, llm,
+                                                 answer_cache=cache)}
+    assert results["known"]["cached"] is True and results["known"]["answer"] == "from cache"
+    assert results["new"]["cached"] is False
+    assert cache.stored == ["new"]
+
+
+def test_concurrency_caps_llm_calls_in_flight(index):
+    llm = FakeLLM({f"q{i}": 0.02 for i in range(12)})
+    results = collect(normalise_records([f"q{i}" for i in range(12)]), index, llm, concurrency=3, window_size=4)
+    assert len(results) == 12 and llm.peak == 3
+
+
+def test_closing_the_stream_cancels_llm_calls_in_flight(index):
+    llm = FakeLLM({"fast": 0.01, **{f"slow{i}": 30 for i in range(3)}})
+    records = normalise_records(["fast", "slow0", "slow1", "slow2"])
+
+    async def main():
+        stream = arun_batch(records, HashEmbedder(), index, CHUNKS, llm, len, concurrency=4)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first, len(asyncio.all_tasks())
+
+    first, tasks_left = asyncio.run(main())
+    assert first["answer"] == "A: fast"
+    assert llm.in_flight == 0 and tasks_left == 1
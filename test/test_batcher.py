@@ -0,0 +1,100 @@
+# test/test_batcher.py
+import asyncio
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+
+from rag_pipeline.batcher import QueryBatcher
+
+DIM = 16
+
+
+class HashEmbedder:
+    """Deterministic unit vectors per text; counts encode calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(len(texts))
+        rows = [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM) for t in texts]
+        v = np.asarray(rows, dtype=np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index():
+    vectors = np.random.default_rng(0).standard_normal((200, DIM)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(DIM)
+    index.add(vectors)
+    return index
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_questions_share_one_encode_and_match_unbatched_search(index):
+    model = HashEmbedder()
+    questions = [f"question {i}" for i in range(6)]
+
+    async def main():
+        batcher = QueryBatcher(model, index, max_batch_size=16, max_wait_ms=20)
+        try:
+            return await asyncio.gather(*(batcher.search(q, 4) for q in questions)), batcher.stats()
+        finally:
+            await batcher.close()
+
+    results, stats = run(main())
+    assert model.calls == [6]
+    assert stats["batches"] == 1 and stats["items"] == 6
+    for q, (embedding, distances, indices) in zip(questions, results):
+        expected_d, expected_i = index.search(HashEmbedder().encode([q]), 4)
+        np.testing.assert_array_equal(indices, expected_i)
+        np.testing.assert_allclose(distances, expected_d, rtol=1e-5)
+        assert embedding.shape == (1, DIM)
+
+
+def test_each_request_gets_its_own_k(index):
+    async def main():
+        batcher = QueryBatcher(HashEmbedder(), index, max_wait_ms=20)
+        try:
+            return await asyncio.gather(batcher.search("a", 2), batcher.search("b", 5))
+        finally:
+            await batcher.close()
+
+    (_, d2, i2), (_, d5, i5) = run(main())
+    assert i2.shape == (1, 2) and i5.shape == (1, 5)
+
+
+def test_full_batch_splits_at_max_batch_size(index):
+    model = HashEmbedder()
+
+    async def main():
+        batcher = QueryBatcher(model, index, max_batch_size=4, max_wait_ms=20)
+        try:
+            await asyncio.gather(*(batcher.search(f"q{i}", 3) for i in range(10)))
+        finally:
+            await batcher.close()
+
+    run(main())
+    assert sum(model.calls) == 10
+    assert max(model.calls) <= 4
+
+
+def test_encode_failure_reaches_every_waiter(index):
+    class Broken(HashEmbedder):
+        def encode(self, texts, **kwargs):
+            raise RuntimeError("model down")
+
+    async def main():
+        batcher = QueryBatcher(Broken(), index, max_wait_ms=20)
+        try:
+            return await asyncio.gather(batcher.search("a", 2), batcher.search("b", 2), return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    assert all(isinstance(r, RuntimeError) for r in run(main()))
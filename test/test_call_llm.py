@@ -0,0 +1,104 @@
+# test/test_call_llm.py
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+import call_llm
+
+
+def response(status, body=None, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(body or {}).encode()
+    r.headers.update(headers or {})
+    r.url = "http://llm.test/chat/completions"
+    return r
+
+
+def answer(text):
+    return response(200, {"choices": [{"message": {"content": text}}]})
+
+
+class ScriptedSession:
+    """Stands in for requests.Session: replies (or raises) from a script, recording each call."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls.append((url, headers, json))
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(call_llm.time, "sleep", slept.append)
+    monkeypatch.setattr(call_llm, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(call_llm, "LLM_FALLBACK", "")
+    return slept
+
+
+def use(monkeypatch, session):
+    monkeypatch.setattr(call_llm, "_session", session)
+    return session
+
+
+def test_retry_after_parses_seconds_and_dates():
+    assert call_llm._retry_after({}) is None
+    assert call_llm._retry_after({"Retry-After": "3"}) == 3.0
+    assert call_llm._retry_after({"Retry-After": "soon"}) is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+    assert 15 < call_llm._retry_after({"Retry-After": date}) <= 20
+
+
+def test_backoff_stays_within_bounds(monkeypatch):
+    monkeypatch.setattr(call_llm, "LLM_BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(call_llm, "LLM_BACKOFF_MAX", 8)
+    assert all(0 <= call_llm._backoff(10) <= 8 for _ in range(50))
+    assert all(4 <= call_llm._backoff(0, retry_after=4) <= 4.5 for _ in range(50))
+
+
+def test_retries_on_429_honouring_retry_after(monkeypatch, sleeps):
+    session = use(monkeypatch, ScriptedSession(response(429, headers={"Retry-After": "2"}), answer("ok")))
+    assert call_llm.llm_pipeline("q") == [{"generated_text": "ok"}]
+    assert len(session.calls) == 2
+    assert len(sleeps) == 1 and 2 <= sleeps[0] <= 2 + call_llm.LLM_BACKOFF_BASE
+
+
+def test_retries_transport_errors_then_gives_up(monkeypatch, sleeps):
+    session = use(monkeypatch, ScriptedSession(*[requests.ConnectionError("down")] * 3))
+    with pytest.raises(requests.ConnectionError):
+        call_llm.llm_pipeline("q")
+    assert len(session.calls) == 3 and len(sleeps) == 2
+
+
+def test_client_errors_and_long_retry_after_are_not_retried(monkeypatch, sleeps):
+    use(monkeypatch, ScriptedSession(response(400)))
+    with pytest.raises(requests.HTTPError):
+        call_llm.llm_pipeline("q")
+    use(monkeypatch, ScriptedSession(response(503, headers={"Retry-After": "3600"})))
+    with pytest.raises(requests.HTTPError):
+        call_llm.llm_pipeline("q")
+    assert sleeps == []
+
+
+def test_fails_over_with_the_fallback_endpoints_own_key(monkeypatch, sleeps):
+    monkeypatch.setattr(call_llm, "LLM_FALLBACK", "openai")
+    monkeypatch.setattr(call_llm, "PRIMARY", call_llm.Endpoint("http://primary/chat", "m", "primary-key"))
+    monkeypatch.setattr(call_llm, "FALLBACK", call_llm.Endpoint("http://fallback/chat", "m2", None))
+    session = use(monkeypatch, ScriptedSession(*[response(503)] * 3, answer("from fallback")))
+
+    assert call_llm.llm_pipeline("q") == [{"generated_text": "from fallback"}]
+    urls = [url for url, _, _ in session.calls]
+    assert urls == ["http://primary/chat"] * 3 + ["http://fallback/chat"]
+    assert session.calls[0][1]["Authorization"] == "Bearer primary-key"
+    assert "Authorization" not in session.calls[-1][1]
+    assert session.calls[-1][2]["model"] == "m2"
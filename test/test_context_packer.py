@@ -0,0 +1,48 @@
+# test/test_context_packer.py
+from rag_pipeline.context_packer import estimate_tokens, overlap_length, pack_context
+
+OVERLAP = "the shared overlap between two neighbouring chunks of one document. "
+
+
+def chunk(cid, text, source="doc.pdf"):
+    return {"id": cid, "source": source, "text": text}
+
+
+def test_overlap_length_finds_suffix_prefix():
+    assert overlap_length("first part. " + OVERLAP, OVERLAP + "second part.") == len(OVERLAP)
+    assert overlap_length("nothing shared here at all, not one bit", "completely different text follows now") == 0
+
+
+def test_neighbouring_chunks_send_overlap_once():
+    a = chunk(4, "first part. " + OVERLAP)
+    b = chunk(5, OVERLAP + "second part.")
+    texts = pack_context([a, b], budget=1000)
+    assert texts[0] == a["text"].strip()
+    assert texts[1] == "second part."
+    assert "".join(texts).count(OVERLAP.strip()) == 1
+
+
+def test_overlap_removed_when_later_chunk_ranks_first():
+    a = chunk(4, "first part. " + OVERLAP)
+    b = chunk(5, OVERLAP + "second part.")
+    texts = pack_context([b, a], budget=1000)
+    assert texts == [b["text"].strip(), "first part."]
+
+
+def test_other_documents_keep_their_text():
+    a = chunk(4, "first part. " + OVERLAP)
+    b = chunk(5, OVERLAP + "second part.", source="other.pdf")
+    assert pack_context([a, b], budget=1000)[1] == b["text"].strip()
+
+
+def test_chunk_over_budget_is_skipped_for_smaller_ones():
+    big, small = chunk(1, "x" * 700), chunk(9, "short text")
+    budget = estimate_tokens("y" * 100)
+    assert pack_context([chunk(0, "y" * 100), big, small], budget=budget + estimate_tokens("short text")) == \
+        ["y" * 100, "short text"]
+
+
+def test_lone_oversized_chunk_is_cut_and_zero_budget_packs_nothing():
+    texts = pack_context([chunk(1, "x" * 700)], budget=10)
+    assert len(texts) == 1 and 0 < len(texts[0]) < 700
+    assert pack_context([chunk(1, "x" * 700)], budget=0) == []
@@ -0,0 +1,48 @@
+# test/test_dedup.py
+from rag_pipeline import dedup
+from rag_pipeline.dedup import estimated_jaccard, find_near_duplicates, load_aliases, minhash, save_aliases
+
+BASE = ("The kriging estimator is the best linear unbiased predictor of the random field at an unobserved "
+        "location, given a covariance model fitted to the empirical variogram of the residuals. ") * 3
+OTHER = ("Domain decomposition splits the mesh into subdomains that are solved in parallel on separate "
+         "nodes, exchanging halo values after every iteration of the outer solver loop. ") * 3
+
+
+def test_minhash_estimates_similarity():
+    assert estimated_jaccard(minhash(BASE), minhash(BASE)) == 1.0
+    assert estimated_jaccard(minhash(BASE), minhash(BASE + " One extra closing sentence.")) > 0.8
+    assert estimated_jaccard(minhash(BASE), minhash(OTHER)) < 0.2
+
+
+def test_near_duplicates_fold_into_preferred_canonical():
+    chunks = [
+        {"id": 1, "text": BASE, "source_type": "reference"},
+        {"id": 2, "text": BASE + " A longer copy.", "source_type": "reference"},
+        {"id": 3, "text": BASE, "source_type": "dissertation"},
+        {"id": 4, "text": OTHER, "source_type": "reference"},
+    ]
+    # The dissertation copy wins over the longer reference one
+    assert find_near_duplicates(chunks, threshold=0.6) == {1: 3, 2: 3}
+
+
+def test_canonical_prefers_longer_then_lower_id():
+    chunks = [
+        {"id": 7, "text": BASE},
+        {"id": 5, "text": BASE},
+        {"id": 6, "text": BASE + " A longer copy."},
+    ]
+    assert find_near_duplicates(chunks, threshold=0.6) == {5: 6, 7: 6}
+    assert find_near_duplicates(chunks[:2], threshold=0.6) == {7: 5}
+
+
+def test_no_chunks_no_aliases():
+    assert find_near_duplicates([]) == {}
+
+
+def test_save_load_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / "aliases.json"
+    save_aliases({1: 3, 2: 3}, n_chunks=4, path=path)
+    assert load_aliases(path) == {1: 3, 2: 3}
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", False)
+    assert load_aliases(path) == {}
+    assert load_aliases(tmp_path / "missing.json") == {}
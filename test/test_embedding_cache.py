@@ -0,0 +1,75 @@
+# test/test_embedding_cache.py
+import numpy as np
+import pytest
+
+from rag_pipeline.embedding_cache import KEYS_FILE, VECTORS_FILE, EmbeddingCache
+
+DIM = 4
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        return np.asarray([[len(t), t.count("a"), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+
+def expected(*texts):
+    return np.asarray([[len(t), t.count("a"), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "embedding_cache"
+
+
+def test_only_unseen_texts_are_encoded_once_each(cache_dir):
+    encode = CountingEncoder()
+    cache = EmbeddingCache("org/model", path=cache_dir)
+    out = cache.encode(["alpha", "beta", "alpha"], encode)
+    np.testing.assert_array_equal(out, expected("alpha", "beta", "alpha"))
+    assert encode.batches == [["alpha", "beta"]]
+
+    out = cache.encode(["beta", "gamma"], encode)
+    np.testing.assert_array_equal(out, expected("beta", "gamma"))
+    assert encode.batches[-1] == ["gamma"]
+    assert cache.stats() == {"model": "org/model", "normalize": True, "rows": 3, "hits": 1, "misses": 3}
+
+
+def test_everything_cached_never_calls_the_encoder(cache_dir):
+    EmbeddingCache("org/model", path=cache_dir).encode(["alpha", "beta"], CountingEncoder())
+
+    def must_not_encode(texts):
+        raise AssertionError("model should not load")
+
+    reopened = EmbeddingCache("org/model", path=cache_dir)
+    np.testing.assert_array_equal(reopened.encode(["beta", "alpha"], must_not_encode), expected("beta", "alpha"))
+
+
+def test_model_and_normalisation_get_separate_caches(cache_dir):
+    EmbeddingCache("org/model", normalize=True, path=cache_dir).encode(["alpha"], CountingEncoder())
+    encode = CountingEncoder()
+    EmbeddingCache("org/model", normalize=False, path=cache_dir).encode(["alpha"], encode)
+    EmbeddingCache("org/other", path=cache_dir).encode(["alpha"], encode)
+    assert encode.batches == [["alpha"], ["alpha"]]
+
+
+def test_torn_append_is_dropped_and_rows_stay_aligned(cache_dir):
+    cache = EmbeddingCache("org/model", path=cache_dir)
+    cache.encode(["alpha", "beta"], CountingEncoder())
+    # A crash after writing vectors for two more rows, and half of one key
+    with open(cache.path / VECTORS_FILE, "ab") as f:
+        f.write(np.ones((2, DIM), dtype=np.float32).tobytes())
+    with open(cache.path / KEYS_FILE, "ab") as f:
+        f.write(b"\x00" * 7)
+
+    reopened = EmbeddingCache("org/model", path=cache_dir)
+    assert reopened.stats()["rows"] == 2
+    encode = CountingEncoder()
+    out = reopened.encode(["gamma", "alpha"], encode)
+    np.testing.assert_array_equal(out, expected("gamma", "alpha"))
+    assert encode.batches == [["gamma"]]
+    assert (reopened.path / VECTORS_FILE).stat().st_size == 3 * DIM * 4
+    assert (reopened.path / KEYS_FILE).stat().st_size == 3 * 16
@@ -0,0 +1,177 @@
+# test/test_incremental_ingest.py
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+import pytest
+
+from rag_pipeline import data_ingestion, embeddings_store
+from rag_pipeline.chunk_store import open_chunks
+
+DIM = 8
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Index, config and embedding files under tmp_path."""
+    for name in ("FAISS_INDEX_FILE", "EMBEDDINGS_FILE", "EMBEDDING_IDS_FILE", "INDEX_CONFIG_FILE"):
+        monkeypatch.setattr(embeddings_store, name, tmp_path / getattr(embeddings_store, name).name)
+    return tmp_path
+
+
+def vectors(ids):
+    rng = np.random.default_rng(0)
+    table = rng.standard_normal((100, DIM)).astype(np.float32)
+    return table[np.asarray(ids)]
+
+
+def stored_ids():
+    index = faiss.read_index(str(embeddings_store.FAISS_INDEX_FILE))
+    return sorted(faiss.vector_to_array(index.id_map).tolist())
+
+
+def test_update_embeddings_reuses_rows_and_drops_stale_ids(store, monkeypatch):
+    ids = np.arange(4, dtype=np.int64)
+    np.save(embeddings_store.EMBEDDINGS_FILE, vectors(ids))
+    np.save(embeddings_store.EMBEDDING_IDS_FILE, ids)
+    encoded = []
+
+    def fake_create(chunks, *args, **kwargs):
+        new_ids = [ch["id"] for ch in chunks]
+        encoded.extend(new_ids)
+        return None, vectors(new_ids)
+
+    monkeypatch.setattr(embeddings_store, "create_embeddings", fake_create)
+    chunks = {i: {"id": i, "text": f"chunk {i}"} for i in (0, 2, 3, 5)}
+    all_ids, embeddings, added, removed = embeddings_store.update_embeddings(chunks)
+    assert encoded == [5]
+    assert all_ids.tolist() == [0, 2, 3, 5]
+    assert added.tolist() == [5] and removed.tolist() == [1]
+    np.testing.assert_array_equal(embeddings, vectors([0, 2, 3, 5]))
+
+
+def test_incremental_update_adds_and_removes_by_id(store):
+    ids = np.arange(6, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(ids), ids=ids, index_type="flat")
+
+    new_ids = np.array([0, 1, 2, 4, 6, 7], dtype=np.int64)   # 3 and 5 gone, 6 and 7 new
+    index = embeddings_store.update_faiss_index(new_ids, vectors(new_ids), added=np.array([6, 7]),
+                                                removed=np.array([3, 5]), index_type="flat")
+    assert index.ntotal == 6
+    assert stored_ids() == new_ids.tolist()
+    # The added vectors are searchable under their chunk ids
+    _, found = index.search(embeddings_store.prepare_vectors(vectors([7])), 1)
+    assert found[0][0] == 7
+    np.testing.assert_array_equal(np.load(embeddings_store.EMBEDDING_IDS_FILE), new_ids)
+
+
+def test_stale_ids_are_reconciled_against_the_id_map(store):
+    ids = np.arange(5, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(ids), ids=ids, index_type="flat")
+
+    # The caller's diff is stale: it misses that 4 left and 9 arrived, and
+    # names 8 as removed although the index never had it
+    new_ids = np.array([0, 1, 2, 3, 9], dtype=np.int64)
+    index = embeddings_store.update_faiss_index(new_ids, vectors(new_ids), added=np.array([], dtype=np.int64),
+                                                removed=np.array([8]), index_type="flat")
+    assert index.ntotal == 5
+    assert stored_ids() == new_ids.tolist()
+
+
+def test_up_to_date_index_is_left_alone(store):
+    ids = np.arange(4, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(ids), ids=ids, index_type="flat")
+    mtime = embeddings_store.FAISS_INDEX_FILE.stat().st_mtime_ns
+    embeddings_store.update_faiss_index(ids, vectors(ids), added=np.array([], dtype=np.int64),
+                                        removed=np.array([], dtype=np.int64), index_type="flat")
+    assert embeddings_store.FAISS_INDEX_FILE.stat().st_mtime_ns == mtime
+
+
+def test_changed_index_type_rebuilds(store):
+    ids = np.arange(4, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(ids), ids=ids, index_type="flat", metric="ip")
+    embeddings_store.update_faiss_index(ids, vectors(ids), added=np.array([], dtype=np.int64),
+                                        removed=np.array([], dtype=np.int64), index_type="flat", metric="l2")
+    assert embeddings_store.load_index_config()["metric"] == "l2"
+    assert stored_ids() == ids.tolist()
+
+
+# --- Manifest-driven re-ingestion ---
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    """A docs/ folder of fake PDFs whose 'pages' are their file text; outputs under tmp_path."""
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    chunk_dir = tmp_path / "chunk_store"
+    monkeypatch.setattr(data_ingestion, "DOCS_DIR", docs_dir)
+    monkeypatch.setattr(data_ingestion, "OUT_PATH", chunk_dir)
+    monkeypatch.setattr(data_ingestion, "MANIFEST_PATH", tmp_path / "manifest.json")
+    monkeypatch.setattr(data_ingestion, "PAGE_CACHE_DIR", tmp_path / "page_cache")
+    monkeypatch.setattr(data_ingestion, "LEXICAL_INDEX_DIR", tmp_path / "lexical_index")
+    monkeypatch.setattr(data_ingestion, "LEGACY_CHUNKS_FILE", tmp_path / "chunks.pkl")
+    monkeypatch.setattr(data_ingestion, "chunk_store_exists", lambda: (chunk_dir / "meta.json").exists())
+    monkeypatch.setattr(data_ingestion, "open_chunks", lambda: open_chunks(chunk_dir))
+    monkeypatch.setattr(data_ingestion, "dedup_chunks", lambda items, n: {})
+
+    extracted = []
+
+    def fake_extract(pdfs, digests, workers=1):
+        extracted.append(sorted(p.name for p in pdfs))
+        return {p.name: [p.read_text()] for p in pdfs}
+
+    monkeypatch.setattr(data_ingestion, "extract_documents", fake_extract)
+    return SimpleNamespace(path=docs_dir, extracted=extracted)
+
+
+def text(topic, n=3):
+    return "\n\n".join(f"{topic} paragraph {i}. " + "filler words to pass the minimum length. " * 3
+                       for i in range(n))
+
+
+def test_rebuild_skips_unchanged_documents_and_never_reuses_ids(docs):
+    (docs.path / "a.pdf").write_text(text("alpha"))
+    (docs.path / "b.pdf").write_text(text("beta"))
+    first = data_ingestion.rebuild(workers=1)
+    ids_a = [ch["id"] for ch in first if ch["source"] == "a.pdf"]
+    ids_b = [ch["id"] for ch in first if ch["source"] == "b.pdf"]
+    assert docs.extracted == [["a.pdf", "b.pdf"]]
+
+    (docs.path / "b.pdf").write_text(text("beta, revised"))
+    (docs.path / "c.pdf").write_text(text("gamma"))
+    second = data_ingestion.rebuild(workers=1)
+    assert docs.extracted[-1] == ["b.pdf", "c.pdf"]
+
+    # a.pdf keeps its chunks and ids; b.pdf's new chunks get fresh ids
+    assert [ch["id"] for ch in second if ch["source"] == "a.pdf"] == ids_a
+    new_b = [ch["id"] for ch in second if ch["source"] == "b.pdf"]
+    assert min(new_b) > max(ids_a + ids_b)
+
+    (docs.path / "a.pdf").unlink()
+    third = data_ingestion.rebuild(workers=1)
+    assert docs.extracted[-1] == []
+    assert {ch["source"] for ch in third} == {"b.pdf", "c.pdf"}
+    manifest = data_ingestion.load_manifest()
+    assert sorted(manifest["documents"]) == ["b.pdf", "c.pdf"]
+
+
+def test_full_rebuild_re_extracts_with_fresh_ids(docs):
+    (docs.path / "a.pdf").write_text(text("alpha"))
+    first = data_ingestion.rebuild(workers=1)
+    again = data_ingestion.rebuild(full=True, workers=1)
+    assert docs.extracted[-1] == ["a.pdf"]
+    assert min(ch["id"] for ch in again) > max(ch["id"] for ch in first)
+
+
+def test_saving_replaces_files_under_a_mapped_reader(store):
+    ids = np.arange(4, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(ids), ids=ids, index_type="flat")
+    mapped = np.load(embeddings_store.EMBEDDINGS_FILE, mmap_mode="r")
+    inode = embeddings_store.FAISS_INDEX_FILE.stat().st_ino
+
+    new_ids = np.arange(10, 12, dtype=np.int64)
+    embeddings_store.save_faiss_index(vectors(new_ids), ids=new_ids, index_type="flat")
+    # The old mapping still reads the old rows; the new files are fresh inodes
+    np.testing.assert_array_equal(mapped, vectors(ids))
+    assert embeddings_store.FAISS_INDEX_FILE.stat().st_ino != inode
+    np.testing.assert_array_equal(np.load(embeddings_store.EMBEDDINGS_FILE), vectors(new_ids))
+    assert not list(store.glob("*.tmp"))
@@ -0,0 +1,51 @@
+# test/test_lexical_index.py
+import numpy as np
+
+from rag_pipeline.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    {"id": 10, "text": "Kriging interpolates a random field from scattered observations."},
+    {"id": 11, "text": "Universal kriging adds a trend; kriging variance measures uncertainty."},
+    {"id": 12, "text": "Mardia's test checks multivariate normality of residuals."},
+    {"id": 13, "text": "Parallelisation of the solver uses MPI across nodes."},
+]
+
+
+def test_tokenize_drops_stopwords_and_single_letters():
+    assert tokenize("What is Mardia's test of x?") == ["mardia", "test"]
+
+
+def test_search_ranks_by_bm25():
+    index = LexicalIndex.build(CHUNKS)
+    ids, scores = index.search("kriging variance", k=3)
+    assert list(ids) == [11, 10]
+    assert scores[0] > scores[1] > 0
+
+
+def test_search_without_matches_is_empty():
+    ids, scores = LexicalIndex.build(CHUNKS).search("the of and", k=5)
+    assert len(ids) == 0 and len(scores) == 0
+
+
+def test_mask_restricts_matches():
+    index = LexicalIndex.build(CHUNKS)
+    mask = np.isin(index.chunk_ids, [10, 12])
+    ids, _ = index.search("kriging normality", k=5, mask=mask)
+    assert sorted(ids) == [10, 12]
+    assert len(index.search("parallelisation", k=5, mask=mask)[0]) == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    index = LexicalIndex.build(CHUNKS)
+    index.save(tmp_path)
+    loaded = LexicalIndex.load(tmp_path)
+    for query in ("kriging", "mpi nodes", "multivariate residuals"):
+        np.testing.assert_array_equal(index.search(query)[0], loaded.search(query)[0])
+        np.testing.assert_allclose(index.search(query)[1], loaded.search(query)[1])
+
+
+def test_reciprocal_rank_fusion():
+    # 2 is second in both lists, beating items that top only one
+    assert reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]])[0] == 2
+    assert set(reciprocal_rank_fusion([[1, 2], [3]])) == {1, 2, 3}
+    assert reciprocal_rank_fusion([]) == []
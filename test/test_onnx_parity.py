@@ -0,0 +1,62 @@
+# test/test_onnx_parity.py
+# Cosine agreement between the ONNX Runtime embedder and the PyTorch
+# SentenceTransformer on the existing chunk set. Run after
+# rag_pipeline/tools/export_onnx_embedder.py:
+#
+#   python test/test_onnx_parity.py [--sample 512] [--fp32]
+import sys, argparse
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from rag_pipeline.chunk_store import open_chunks
+from rag_pipeline.onnx_embedder import OnnxEmbedder, onnx_model_exists
+from rag_pipeline.query_pipeline import EMBED_MODEL, ONNX_MODEL_DIR
+
+MIN_MEAN_COSINE = 0.99   # int8 drift is a few thousandths on average
+MIN_COSINE = 0.95        # worst single chunk
+MIN_TOP1_AGREEMENT = 0.95
+
+
+@pytest.mark.skipif(not onnx_model_exists(ONNX_MODEL_DIR),
+                    reason="no exported ONNX model; run rag_pipeline/tools/export_onnx_embedder.py")
+def test_onnx_parity(sample=512, quantized=True):
+    from sentence_transformers import SentenceTransformer
+
+    chunks = open_chunks()
+    texts = [ch["text"] for ch in chunks.values()]
+    rng = np.random.default_rng(0)
+    picked = rng.choice(len(texts), size=min(sample, len(texts)), replace=False)
+    texts = [texts[i] for i in picked]
+
+    reference = SentenceTransformer(EMBED_MODEL).encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    onnx = OnnxEmbedder(ONNX_MODEL_DIR, quantized=quantized).encode(texts, normalize_embeddings=True)
+
+    cosine = np.sum(reference * onnx, axis=1)
+    # Same nearest neighbour within the sample, using each text as a query
+    top1 = np.mean(np.argmax(onnx @ reference.T, axis=1) == np.argmax(reference @ reference.T, axis=1))
+    print(f"🔎 {len(texts)} chunks | {'int8' if quantized else 'fp32'} | cosine mean {cosine.mean():.4f} "
+          f"min {cosine.min():.4f} | top-1 agreement {top1:.3f}")
+
+    assert cosine.mean() >= MIN_MEAN_COSINE, f"mean cosine {cosine.mean():.4f} < {MIN_MEAN_COSINE}"
+    assert cosine.min() >= MIN_COSINE, f"min cosine {cosine.min():.4f} < {MIN_COSINE}"
+    assert top1 >= MIN_TOP1_AGREEMENT, f"top-1 agreement {top1:.3f} < {MIN_TOP1_AGREEMENT}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sample", type=int, default=512)
+    ap.add_argument("--fp32", action="store_true", help="check the unquantized model")
+    args = ap.parse_args()
+    try:
+        test_onnx_parity(args.sample, quantized=not args.fp32)
+    except AssertionError as e:
+        print(f"❌ Parity check failed: {e}")
+        sys.exit(1)
+    print("✅ ONNX embeddings match PyTorch.")
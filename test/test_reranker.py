@@ -0,0 +1,94 @@
+# test/test_reranker.py
+import time
+
+import pytest
+
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from rag_pipeline import reranker as reranker_module
+from rag_pipeline.reranker import CrossEncoderReranker
+
+
+class FixedCostCrossEncoder:
+    """Scores a pair by text length, taking `batch_s` per predict call."""
+
+    batch_s = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def predict(self, pairs, **kwargs):
+        self.calls += 1
+        time.sleep(self.batch_s)
+        return [float(len(text)) for _, text in pairs]
+
+
+def make_reranker(monkeypatch, batch_s, budget_ms=150):
+    encoder = type("Encoder", (FixedCostCrossEncoder,), {"batch_s": batch_s})
+    monkeypatch.setattr(sentence_transformers, "CrossEncoder", encoder)
+    return CrossEncoderReranker(batch_size=8, budget_ms=budget_ms)
+
+
+class SlowFirstCrossEncoder:
+    """0.4 s on the first predict (cold start), 10 ms after."""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def predict(self, pairs, **kwargs):
+        self.calls += 1
+        time.sleep(0.4 if self.calls == 1 else 0.01)
+        return [float(len(text)) for _, text in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    monkeypatch.setattr(sentence_transformers, "CrossEncoder", SlowFirstCrossEncoder)
+    return CrossEncoderReranker(batch_size=8, budget_ms=150)
+
+
+def candidates(n=16):
+    return [{"id": i, "text": "x" * i} for i in range(n)]
+
+
+def test_reranks_by_cross_encoder_score(monkeypatch):
+    reranker = make_reranker(monkeypatch, batch_s=0.0)
+    reranker.warmup()
+    assert [c["id"] for c in reranker.rerank("q", candidates(), top_n=3)] == [15, 14, 13]
+    assert reranker.model.calls == 4  # two warm-up calls + two batches of 8
+    assert reranker.stats()["reranked"] == 1
+
+
+def test_keeps_retrieval_order_when_budget_would_overrun(monkeypatch):
+    reranker = make_reranker(monkeypatch, batch_s=0.1, budget_ms=150)
+    reranker.warmup()
+    assert [c["id"] for c in reranker.rerank("q", candidates(), top_n=3)] == [0, 1, 2]
+    stats = reranker.stats()
+    assert stats["degraded"] == 1 and stats["reranked"] == 0
+    # Per-call budget overrides the default
+    assert [c["id"] for c in reranker.rerank("q", candidates(), top_n=3, budget_ms=1000)] == [15, 14, 13]
+
+
+def test_warmup_estimate_comes_from_a_warm_call(reranker):
+    reranker.warmup()
+    assert reranker.model.calls == 2
+    assert reranker._batch_ms < 150
+
+
+def test_reranks_after_slow_warmup(reranker):
+    reranker.warmup()
+    out = [reranker.rerank("q", candidates(), top_n=3) for _ in range(20)]
+    assert reranker.stats()["reranked"] == 20
+    assert [c["id"] for c in out[-1]] == [15, 14, 13]
+
+
+def test_overestimate_decays_until_scoring_resumes(reranker):
+    reranker.warmup()
+    reranker._batch_ms = 450.0  # as if seeded from the cold call
+    for _ in range(50):
+        reranker.rerank("q", candidates(), top_n=3)
+    stats = reranker.stats()
+    assert stats["degraded"] > 0
+    assert stats["reranked"] > 0
+    assert stats["batch_ms_estimate"] < 150
+    assert reranker_module.ESTIMATE_DECAY < 1
@@ -0,0 +1,68 @@
+# test/test_semantic_cache.py
+import time
+
+import numpy as np
+
+from rag_pipeline.semantic_cache import SemanticCache
+
+
+def unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_hit_above_threshold_miss_below():
+    cache = SemanticCache(threshold=0.95)
+    cache.store(unit(1, 0, 0), "q", "a")
+    assert cache.lookup(unit(1, 0.1, 0)) == "a"        # cosine ~0.995
+    assert cache.lookup(unit(1, 1, 0)) is None         # cosine ~0.71
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_expired_entries_miss_and_are_evicted():
+    cache = SemanticCache(ttl_seconds=10)
+    cache.store(unit(1, 0), "q", "a", created_at=time.time() - 11)
+    assert cache.lookup(unit(1, 0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = SemanticCache(max_entries=2)
+    cache.store(unit(1, 0, 0), "q1", "a1")
+    cache.store(unit(0, 1, 0), "q2", "a2")
+    assert cache.lookup(unit(1, 0, 0)) == "a1"         # q1 is now most recent
+    cache.store(unit(0, 0, 1), "q3", "a3")
+    assert cache.lookup(unit(0, 1, 0)) is None
+    assert cache.lookup(unit(1, 0, 0)) == "a1"
+    assert cache.lookup(unit(0, 0, 1)) == "a3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts():
+    cache = SemanticCache(max_bytes=200)
+    cache.store(unit(1, 0), "q1", "x" * 100)
+    cache.store(unit(0, 1), "q2", "y" * 100)
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup(unit(0, 1)) == "y" * 100
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "cache.pkl"
+    cache = SemanticCache(persist_path=path)
+    cache.store(unit(1, 0), "q", "a")
+    cache.save()
+    assert SemanticCache(persist_path=path).lookup(unit(1, 0)) == "a"
+
+
+def test_changed_watch_file_invalidates(tmp_path):
+    watched = tmp_path / "faiss_index.bin"
+    watched.write_bytes(b"v1")
+    path = tmp_path / "cache.pkl"
+    cache = SemanticCache(persist_path=path, watch_files=[watched])
+    cache.store(unit(1, 0), "q", "a")
+    cache.save()
+
+    watched.write_bytes(b"index v2")
+    assert SemanticCache(persist_path=path, watch_files=[watched]).lookup(unit(1, 0)) is None
+    assert cache.lookup(unit(1, 0)) is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,162 @@
+# test/test_session_store.py
+import faiss
+import numpy as np
+import pytest
+
+from rag_pipeline import query_pipeline, session_store
+from rag_pipeline.query_pipeline import build_prompt, retrieve_for_session
+from rag_pipeline.session_store import SessionStore
+from rag_pipeline.telemetry import SESSION_TURNS
+
+DIM = 4
+CHUNKS = {i: {"id": i, "source": "doc.pdf", "text": f"chunk {i} " + "word " * 8} for i in range(3)}
+
+
+def unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class FixedEmbedder:
+    """Encodes each known question to a fixed vector."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts, **kwargs):
+        return np.stack([self.vectors[t] for t in texts])
+
+
+class NoSearch:
+    metric_type = faiss.METRIC_INNER_PRODUCT
+
+    def search(self, *args, **kwargs):
+        raise AssertionError("a reused turn must not search")
+
+
+@pytest.fixture
+def index():
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(np.eye(DIM, dtype=np.float32)[:3], np.arange(3, dtype=np.int64))
+    return index
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "time", clock.time)
+    return clock
+
+
+# --- SessionStore ---
+def test_least_recently_used_session_is_evicted(clock):
+    store = SessionStore(max_sessions=2, idle_seconds=60)
+    store.get("a")
+    store.get("b")
+    store.get("a")          # "b" is now least recently used
+    store.get("c")
+    assert store.get("b", create=False) is None
+    assert store.get("a", create=False) is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_idle_sessions_expire(clock):
+    store = SessionStore(max_sessions=10, idle_seconds=60)
+    store.get("old")
+    clock.now += 30
+    store.get("recent")
+    clock.now += 45         # "old" idle 75 s, "recent" 45 s
+    stats = store.stats()
+    assert stats["sessions"] == 1 and stats["expirations"] == 1
+    assert store.get("old", create=False) is None
+    assert store.get("recent", create=False) is not None
+
+
+def test_history_window_is_answered_turns_only(clock):
+    session = SessionStore().get("s")
+    session.add_turn("first?", unit(1, 0, 0, 0), [0])
+    session.finish_turn("first?", "A" * 20)
+    session.add_turn("second?", unit(0, 1, 0, 0), [1])
+    assert session.history(n_turns=2, answer_chars=10) == "Q: first?\nA: " + "A" * 10 + "…"
+
+
+# --- retrieve_for_session ---
+def turns(retrieval):
+    return SESSION_TURNS.value(retrieval=retrieval)
+
+
+def test_first_turn_retrieves_fresh(index, clock):
+    session = SessionStore().get("s")
+    model = FixedEmbedder({"q": unit(1, 0, 0, 0)})
+    before = turns("fresh")
+    found = retrieve_for_session("q", session, model, index, CHUNKS, k=1)
+    assert [c["id"] for c in found] == [0]
+    assert turns("fresh") == before + 1
+
+
+def test_close_follow_up_reuses_previous_chunks(clock):
+    session = SessionStore().get("s")
+    session.add_turn("what is kriging?", unit(1, 0, 0, 0), [2, 1])
+    model = FixedEmbedder({"and its variance?": unit(1, 0.1, 0, 0)})
+    before = turns("reuse")
+    found = retrieve_for_session("and its variance?", session, model, NoSearch(), CHUNKS, k=3)
+    assert [c["id"] for c in found] == [2, 1]
+    assert turns("reuse") == before + 1
+
+
+def test_distant_follow_up_searches_with_blended_query(index, clock):
+    session = SessionStore().get("s")
+    session.add_turn("first?", unit(1, 0, 0, 0), [0])
+    model = FixedEmbedder({"then?": unit(0, 1, 0, 0)})
+    before = turns("merge")
+    found = retrieve_for_session("then?", session, model, index, CHUNKS, k=1,
+                                 retrieval_options={"mode": "dense"})
+    assert [c["id"] for c in found] == [1]
+    assert turns("merge") == before + 1
+
+
+def test_merged_turn_without_matches_keeps_previous_chunks(index, clock):
+    session = SessionStore().get("s")
+    session.add_turn("first?", unit(1, 0, 0, 0), [0])
+    # Nothing in the index is near the blend of these two
+    model = FixedEmbedder({"unrelated?": unit(0, 0, 0, 1)})
+    found = retrieve_for_session("unrelated?", session, model, index, CHUNKS, k=1,
+                                 retrieval_options={"mode": "dense"})
+    assert [c["id"] for c in found] == [0]
+
+
+
+def test_previous_chunks_resolve_in_a_legacy_chunk_list(index, clock):
+    legacy = [CHUNKS[i] for i in range(3)]      # chunks.pkl: a list indexed by position
+    session = SessionStore().get("s")
+    session.add_turn("what is kriging?", unit(1, 0, 0, 0), [2, 7, 1])
+    model = FixedEmbedder({"and its variance?": unit(1, 0.1, 0, 0), "unrelated?": unit(0, 0, 0, 1)})
+    reused = retrieve_for_session("and its variance?", session, model, NoSearch(), legacy, k=3)
+    assert [c["id"] for c in reused] == [2, 1]
+    merged = retrieve_for_session("unrelated?", session, model, index, legacy, k=2,
+                                  retrieval_options={"mode": "dense"})
+    assert [c["id"] for c in merged] == [2]
+
+# --- Prompt budget ---
+def words(text):
+    return len(text.split())
+
+
+def test_history_is_charged_against_the_context_budget(monkeypatch):
+    monkeypatch.setattr(query_pipeline, "CONTEXT_TOKEN_BUDGET", 25)
+    chunks = list(CHUNKS.values())
+    kwargs = dict(embedding_model=None, faiss_index=None, chunks=CHUNKS, tokenizer=words, retrieved_chunks=chunks)
+
+    without = build_prompt("q?", history=None, **kwargs)
+    with_history = build_prompt("q?", history="Q: earlier?\nA: " + "word " * 6, **kwargs)
+    assert without.count("chunk ") == 2
+    assert with_history.count("chunk ") == 1
+    assert "Conversation so far:" in with_history
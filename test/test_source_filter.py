@@ -0,0 +1,71 @@
+# test/test_source_filter.py
+import faiss
+import numpy as np
+import pytest
+
+from rag_pipeline.lexical_index import LexicalIndex
+from rag_pipeline.source_filter import ChunkMetadata, Selection, SourceFilter, parse_boosts, parse_filter
+
+CHUNKS = [
+    {"id": 0, "source": "thesis.pdf", "source_type": "dissertation", "text": "kriging chapter one"},
+    {"id": 1, "source": "thesis.pdf", "source_type": "dissertation", "text": "kriging chapter two"},
+    {"id": 2, "source": "paper.pdf", "source_type": "reference", "text": "kriging paper"},
+    {"id": 3, "source": "paper_v2.pdf", "source_type": "reference", "text": "kriging paper"},
+    {"id": 4, "source": "solver.pdf", "source_type": "reference", "text": "parallel solver"},
+]
+ALIASES = {3: 2}  # paper_v2's only chunk was folded into paper.pdf's
+
+
+def test_parse_filter():
+    assert parse_filter(None) is None
+    assert parse_filter({}) is None
+    assert parse_filter({"source_type": "dissertation"}) == SourceFilter(("dissertation",), ())
+    assert parse_filter({"sources": ["b.pdf", "a.pdf", "a.pdf"]}) == SourceFilter((), ("a.pdf", "b.pdf"))
+    for bad in ("dissertation", {"sources": 3}, {"source_type": [""]}, {"sources": ["a.pdf", 1]}):
+        with pytest.raises(ValueError):
+            parse_filter(bad)
+
+
+def test_parse_boosts():
+    assert parse_boosts("dissertation=0.03, reference=0") == {"dissertation": 0.03, "reference": 0.0}
+
+
+def test_selection_membership_and_faiss_selector():
+    selection = Selection(np.array([1, 3, 9, 17], dtype=np.int64))
+    assert [i for i in range(20) if i in selection] == [1, 3, 9, 17]
+    assert -1 not in selection and 200 not in selection
+
+    vectors = np.eye(20, dtype=np.float32)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(20))
+    index.add_with_ids(vectors, np.arange(20, dtype=np.int64))
+    _, found = index.search(np.ones((1, 20), dtype=np.float32), 20, params=selection.search_params(index))
+    assert sorted(found[0][found[0] >= 0]) == [1, 3, 9, 17]
+
+
+def test_filters_select_chunks_and_lexical_mask():
+    metadata = ChunkMetadata(CHUNKS, boosts={})
+    assert list(metadata.selection(SourceFilter(("dissertation",), ())).ids) == [0, 1]
+    assert list(metadata.selection(SourceFilter(("reference",), ("paper.pdf", "thesis.pdf"))).ids) == [2]
+
+    lexical = LexicalIndex.build(CHUNKS)
+    mask = metadata.selection(SourceFilter((), ("solver.pdf",))).lexical_mask(lexical)
+    assert list(lexical.search("kriging parallel", k=5, mask=mask)[0]) == [4]
+
+
+def test_alias_filters_select_canonical_chunks():
+    metadata = ChunkMetadata(CHUNKS, boosts={}, aliases=ALIASES)
+    assert list(metadata.selection(SourceFilter((), ("paper_v2.pdf",))).ids) == [2]
+    assert list(metadata.selection(SourceFilter(("reference",), ())).ids) == [2, 4]
+
+
+def test_catalog_counts_retrievable_chunks():
+    catalog = ChunkMetadata(CHUNKS, boosts={"dissertation": 0.03}, aliases=ALIASES).catalog()
+    assert catalog["source_types"] == {"dissertation": 2, "reference": 2}
+    assert catalog["sources"] == {"thesis.pdf": 2, "paper.pdf": 1, "paper_v2.pdf": 1, "solver.pdf": 1}
+    assert catalog["boosts"] == {"dissertation": pytest.approx(0.03)}
+
+
+def test_unknown_names_and_boosts():
+    metadata = ChunkMetadata(CHUNKS, boosts={"dissertation": 0.5})
+    assert metadata.unknown(SourceFilter(("book",), ("thesis.pdf", "nope.pdf"))) == ["book", "nope.pdf"]
+    np.testing.assert_allclose(metadata.boosts([0, 4]), [0.5, 0.0])
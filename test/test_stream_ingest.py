@@ -0,0 +1,229 @@
+# test/test_stream_ingest.py
+import json
+import zlib
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag_pipeline import data_ingestion, stream_ingest
+from rag_pipeline.chunk_store import ChunkStore, ChunkStoreAppender, open_chunks
+
+DIM = 8
+
+
+class Encoder:
+    """Deterministic vector per text; raises on call number `fail_on`."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("killed mid-run")
+        self.texts.extend(texts)
+        rows = [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM) for t in texts]
+        v = np.asarray(rows, dtype=np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def text(topic, n=4):
+    return "\n\n".join(f"{topic} section {i}. " + f"{topic} details that fill out the chunk. " * 30
+                       for i in range(n))
+
+
+@pytest.fixture
+def workspace(tmp_path_factory, monkeypatch):
+    """Returns make(name): an isolated docs folder + data dir holding the same three documents."""
+
+    def make(name):
+        root = tmp_path_factory.mktemp(name)
+        docs, data = root / "docs", root / "data"
+        docs.mkdir()
+        data.mkdir()
+        for topic in ("alpha", "beta", "gamma"):
+            (docs / f"{topic}.pdf").write_text(text(topic))
+        return SimpleNamespace(docs=docs, data=data, staging=data / "ingest_staging")
+
+    def use(ws):
+        chunk_dir = ws.data / "chunk_store"
+        for name, value in {
+            "CHUNK_STORE_DIR": chunk_dir,
+            "DATA_DIR": ws.data,
+            "EMBEDDINGS_FILE": ws.data / "embeddings.npy",
+            "EMBEDDING_IDS_FILE": ws.data / "embedding_ids.npy",
+            "FAISS_INDEX_FILE": ws.data / "faiss_index.bin",
+            "INDEX_CONFIG_FILE": ws.data / "faiss_index.json",
+            "LEXICAL_INDEX_DIR": ws.data / "lexical_index",
+            "EMBEDDING_CACHE_ENABLED": False,
+        }.items():
+            monkeypatch.setattr(stream_ingest, name, value)
+        monkeypatch.setattr(data_ingestion, "MANIFEST_PATH", ws.data / "manifest.json")
+        monkeypatch.setattr(stream_ingest, "chunk_store_exists", lambda: (chunk_dir / "meta.json").exists())
+        monkeypatch.setattr(stream_ingest, "open_chunks", lambda: open_chunks(chunk_dir))
+        monkeypatch.setattr(stream_ingest, "dedup_chunks", lambda items, n: {})
+        monkeypatch.setattr(stream_ingest, "extract_documents",
+                            lambda pdfs, digests, *args, **kwargs: {p.name: [p.read_text()] for p in pdfs})
+        return ws
+
+    return lambda name: use(make(name))
+
+
+def run(ws, encoder, **kwargs):
+    return stream_ingest.run(batch_size=4, workers=1, embedding_model=encoder, index_type="flat",
+                             docs_dir=ws.docs, staging=ws.staging, **kwargs)
+
+
+def snapshot(ws):
+    store = ChunkStore(ws.data / "chunk_store")
+    rows = [store[i] for i in store]
+    store.close()
+    with open(ws.data / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return rows, np.load(ws.data / "embeddings.npy"), np.load(ws.data / "embedding_ids.npy"), manifest
+
+
+def assert_same(a, b):
+    rows_a, emb_a, ids_a, manifest_a = a
+    rows_b, emb_b, ids_b, manifest_b = b
+    assert rows_a == rows_b
+    np.testing.assert_array_equal(ids_a, ids_b)
+    np.testing.assert_allclose(emb_a, emb_b, rtol=1e-6)
+    assert manifest_a == manifest_b
+
+
+def test_interrupted_runs_resume_to_the_same_result(workspace):
+    clean = workspace("clean")
+    run(clean, Encoder())
+    expected = snapshot(clean)
+
+    ws = workspace("crashed")
+    for fail_on in (3, 3):   # killed twice, each time after at least one document was checkpointed
+        with pytest.raises(RuntimeError, match="killed"):
+            run(ws, Encoder(fail_on=fail_on))
+        assert (ws.staging / stream_ingest.CHECKPOINT_FILE).exists()
+
+    resumed = Encoder()
+    run(ws, resumed)
+    assert_same(snapshot(ws), expected)
+    assert not ws.staging.exists()
+    # Documents finished before the crashes weren't encoded again
+    assert len(resumed.texts) < len(expected[0])
+
+
+def test_restart_ignores_the_checkpoint(workspace):
+    ws = workspace("restart")
+    with pytest.raises(RuntimeError):
+        run(ws, Encoder(fail_on=3))
+    fresh = Encoder()
+    run(ws, fresh, restart=True)
+    rows = snapshot(ws)[0]
+    assert len(fresh.texts) == len(rows)
+
+
+def test_unchanged_documents_keep_ids_and_embeddings(workspace):
+    ws = workspace("incremental")
+    run(ws, Encoder())
+    before = snapshot(ws)
+    (ws.docs / "beta.pdf").write_text(text("beta, revised"))
+    again = Encoder()
+    run(ws, again)
+    rows, embeddings, ids, manifest = snapshot(ws)
+
+    kept = [r for r in before[0] if r["source"] != "beta.pdf"]
+    assert [r for r in rows if r["source"] != "beta.pdf"] == kept
+    assert all("revised" in t for t in again.texts)
+    assert min(r["id"] for r in rows if r["source"] == "beta.pdf") > max(r["id"] for r in before[0])
+    pos = np.searchsorted(ids, [r["id"] for r in kept])
+    np.testing.assert_allclose(embeddings[pos], before[1][np.searchsorted(before[2], [r["id"] for r in kept])])
+
+
+
+def test_commit_replaces_files_under_a_mapped_reader(workspace):
+    ws = workspace("mapped")
+    run(ws, Encoder())
+    mapped_ids = np.load(ws.data / "embedding_ids.npy", mmap_mode="r")
+    before = mapped_ids.copy()
+    inodes = {name: (ws.data / name).stat().st_ino for name in ("embedding_ids.npy", "faiss_index.json")}
+
+    (ws.docs / "beta.pdf").write_text(text("beta, revised"))
+    run(ws, Encoder())
+    # Each file was renamed over, so the old mapping still reads the old ids
+    np.testing.assert_array_equal(mapped_ids, before)
+    assert all((ws.data / name).stat().st_ino != ino for name, ino in inodes.items())
+    assert not list(ws.data.glob("*.tmp"))
+
+
+class InlinePool:
+    """Stands in for ProcessPoolExecutor: runs tasks inline and records its lifecycle."""
+    created = []
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.tasks = 0
+        self.shut_down = False
+        InlinePool.created.append(self)
+
+    def submit(self, fn, *args):
+        self.tasks += 1
+        fut = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_extraction_shares_one_pool_across_the_run(tmp_path, monkeypatch):
+    InlinePool.created = []
+    monkeypatch.setattr(stream_ingest, "ProcessPoolExecutor", InlinePool)
+    monkeypatch.setattr(data_ingestion, "PAGE_CACHE_DIR", tmp_path / "page_cache")
+    monkeypatch.setattr(data_ingestion, "page_count", lambda pdf: 3)
+    monkeypatch.setattr(data_ingestion, "extract_page_range",
+                        lambda pdf, start=0, stop=None: [f"{pdf.stem} page {i}" for i in range(start, stop)])
+    pdfs = []
+    for topic in ("alpha", "beta", "gamma"):
+        pdf = tmp_path / f"{topic}.pdf"
+        pdf.write_text(topic)
+        pdfs.append(pdf)
+    digests = {pdf.name: data_ingestion.file_sha256(pdf) for pdf in pdfs}
+
+    out = list(stream_ingest.extract_stage(pdfs, digests, workers=4))
+    assert [pdf.name for pdf, _, _ in out] == ["alpha.pdf", "beta.pdf", "gamma.pdf"]
+    assert all(f"{pdf.stem} page 2" in body for pdf, _, body in out)
+    assert len(InlinePool.created) == 1
+    pool = InlinePool.created[0]
+    assert pool.max_workers == 4 and pool.tasks == 3 and pool.shut_down
+
+# --- Staging appenders ---
+def rows(start, n):
+    return [{"id": i, "source": "doc.pdf", "source_type": "reference", "text": f"chunk {i}"}
+            for i in range(start, start + n)]
+
+
+def test_reopening_truncates_rows_appended_after_the_checkpoint(tmp_path):
+    staging = tmp_path / "staging"
+    appender = ChunkStoreAppender(staging)
+    appender.append(rows(0, 3))
+    state = appender.state()
+    appender.append(rows(3, 2))        # written, but the checkpoint never recorded them
+    appender.state()
+
+    resumed = ChunkStoreAppender(staging, state)
+    assert resumed.rows == 3 and resumed.last_id == 2
+    resumed.append(rows(3, 1))
+    assert resumed.commit(tmp_path / "store") == 4
+    store = ChunkStore(tmp_path / "store")
+    assert [store[i]["text"] for i in store] == [f"chunk {i}" for i in range(4)]
+    store.close()
+
+
+def test_ids_must_ascend(tmp_path):
+    appender = ChunkStoreAppender(tmp_path)
+    appender.append(rows(5, 1))
+    with pytest.raises(ValueError):
+        appender.append(rows(5, 1))
@@ -0,0 +1,69 @@
+# test/test_telemetry.py
+import logging
+
+import pytest
+
+from rag_pipeline import telemetry
+from rag_pipeline.telemetry import Counter, Histogram, render_metrics, sampled, span
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Metrics made here stay out of the process-wide /metrics output
+    monkeypatch.setattr(telemetry, "REGISTRY", [])
+    return telemetry.REGISTRY
+
+
+def test_counter_renders_help_type_and_sorted_series(registry):
+    hits = Counter("test_lookups_total", "Lookups", ("result",))
+    hits.inc(result="miss")
+    hits.inc(result="hit")
+    hits.inc(2, result="hit")
+    assert render_metrics() == (
+        "# HELP test_lookups_total Lookups\n"
+        "# TYPE test_lookups_total counter\n"
+        'test_lookups_total{result="hit"} 3\n'
+        'test_lookups_total{result="miss"} 1\n'
+    )
+    assert hits.value(result="hit") == 3
+
+
+def test_unlabelled_counter_has_no_braces(registry):
+    Counter("test_plain_total", "Plain").inc()
+    assert render_metrics().splitlines()[-1] == "test_plain_total 1"
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count(registry):
+    latency = Histogram("test_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, stage="llm")
+    assert render_metrics().splitlines() == [
+        "# HELP test_seconds Latency",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="llm",le="0.1"} 1',
+        'test_seconds_bucket{stage="llm",le="1"} 3',
+        'test_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'test_seconds_sum{stage="llm"} 4.050000',
+        'test_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_span_times_the_block_into_its_stage():
+    def observed():
+        return sum(telemetry.STAGE_SECONDS._series.get(("test_stage",), [0])[:-1])
+
+    before = observed()
+    with span("test_stage"):
+        pass
+    assert observed() == before + 1
+
+
+def test_sampling_is_off_unless_debug_logging():
+    level = telemetry.logger.level
+    try:
+        telemetry.logger.setLevel(logging.INFO)
+        assert not sampled(1.0)
+        telemetry.logger.setLevel(logging.DEBUG)
+        assert sampled(1.0) and not sampled(0.0)
+    finally:
+        telemetry.logger.setLevel(level)